@@ -1,22 +1,168 @@
-from flask import Flask, render_template, send_file, request, redirect, url_for, flash, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, Response
+from werkzeug.http import http_date, dump_options_header
+from werkzeug.security import safe_join
+from jinja2 import FileSystemBytecodeCache, TemplateError
 import os
 from pathlib import Path
-import configparser
 from typing import Dict, List
 import shutil
-import subprocess
-import yaml
+import importlib
 import re
-import platform
 import time
 import json
 import hashlib
+import logging
+import base64
+import socket
+import select
+import threading
+import bisect
+import random
+import math
+import statistics
+from array import array
+import mmap
+import struct
+import zlib
+import mimetypes
+import errno
+import itertools
+from collections import deque, OrderedDict, Counter
+import uuid
+import unicodedata
+import urllib.parse
+import weakref
+import signal
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+class LazyModule:
+    """Stand-in for a module that is imported on first attribute access."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+# Only needed by camera routes, jobs and background work; importing them on
+# first use keeps them off the boot path
+yaml = LazyModule('yaml')
+subprocess = LazyModule('subprocess')
+shlex = LazyModule('shlex')
+gzip = LazyModule('gzip')
+
+
+def process_started():
+    """Return when this process started, on the time.time() clock, or None without /proc."""
+    try:
+        with open('/proc/self/stat') as f:
+            # Field 22; the command name in field 2 may itself contain spaces
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return time.time() - uptime + start_ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StartupTimer:
+    """
+    Milestones of the startup path, in seconds since the process started.
+
+    Each mark is recorded once: imports done, module loaded, socket
+    listening, templates compiled, caches warm and the first response
+    (time to first byte). The whole report is logged once the caches are
+    warm and the first response has gone out, and is served at /startup.
+    """
+
+    def __init__(self):
+        self.started = process_started() or time.time()
+        self._marks = {}
+        self._lock = threading.Lock()
+
+    def mark(self, name):
+        if name in self._marks:
+            return
+        with self._lock:
+            if name in self._marks:
+                return
+            self._marks[name] = time.time() - self.started
+            complete = {'warm', 'first_response'} <= self._marks.keys()
+        if complete:
+            logger.info('Startup: ' + ', '.join(f'{mark} {seconds * 1000:.0f} ms' for mark, seconds in self.marks().items()))
+
+    def marks(self):
+        with self._lock:
+            return dict(sorted(self._marks.items(), key=lambda item: item[1]))
+
+    def report(self):
+        return {
+            'process_started': self.started,
+            'marks_ms': {mark: round(seconds * 1000, 1) for mark, seconds in self.marks().items()}
+        }
+
+
+startup = StartupTimer()
+startup.mark('imports')
 
 app = Flask(__name__)
 app.secret_key = os.urandom(24)
 
-MEDIA_FOLDER = '/media'
+# Paths and addresses can be overridden from the environment, e.g. by benchmarks/bench.py
+MEDIA_FOLDER = os.environ.get('WEBUI_MEDIA_FOLDER', '/media')
+THUMBNAIL_FOLDER = os.environ.get('WEBUI_THUMBNAIL_FOLDER', '/etc/webUI/static/thumbnails')
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mkv', '.mov')
+MEDIA_PAGE_SIZE = 24
+# Recordings modified this recently may still be growing and are re-checked on every refresh
+MEDIA_GROWING_WINDOW = 30
+# Thumbnails are taken from the first keyframe after this many seconds
+THUMBNAIL_OFFSET = 5
+THUMBNAIL_WIDTH = 480
+THUMBNAIL_WORKERS = 1
+THUMBNAIL_TIMEOUT = 60
+THUMBNAIL_SCAN_INTERVAL = 60
+# Seconds before a failed thumbnail is tried again, doubling up to the maximum
+THUMBNAIL_RETRY_DELAY = (60, 24 * 3600)
+MEDIA_CONTENT_TYPES = {
+    '.mp4': 'video/mp4', '.mov': 'video/quicktime', '.mkv': 'video/x-matroska', '.avi': 'video/x-msvideo'
+}
+MEDIA_CHUNK_SIZE = 1024 * 1024
+MEDIA_MAX_RANGES = 16
+MEDIA_CODEC_NAMES = {
+    'avc1': 'h264', 'avc3': 'h264', 'hvc1': 'h265', 'hev1': 'h265',
+    'V_MPEG4/ISO/AVC': 'h264', 'V_MPEGH/ISO/HEVC': 'h265'
+}
+CLIP_EXTENSIONS = ('.mp4', '.mov', '.mkv')
+# Keyframe indexes hold every sample offset, so only the most recent few are kept
+KEYFRAME_INDEX_CACHE_SIZE = 4
+# Prune the oldest recordings when the free fraction of the media card drops
+# below the low watermark, until the high watermark is free again
+STORAGE_LOW_WATERMARK = 0.10
+STORAGE_HIGH_WATERMARK = 0.15
+# Off by default: pruning deletes recordings without asking
+STORAGE_AUTO_PRUNE = os.environ.get('WEBUI_STORAGE_AUTO_PRUNE') == '1'
+STORAGE_CHECK_INTERVAL = 15
+# Recordings are hashed in the background with large sequential reads
+FINGERPRINT_CHUNK_SIZE = 4 * 1024 * 1024
+FINGERPRINT_SCAN_INTERVAL = 60
+# The digest cache is written out at most this often while a scan runs, and once at its end
+FINGERPRINT_SAVE_INTERVAL = 60
+# Static text assets are served from memory, precompressed, under content-hashed names
+STATIC_COMPRESS_EXTENSIONS = ('.css', '.js', '.svg', '.ico', '.json', '.txt', '.map')
+# A compressed variant must be at least this fraction smaller than the original to be kept
+STATIC_MIN_SAVING = 0.1
+STATIC_IMMUTABLE = 'public, max-age=31536000, immutable'
 GS_KEY_PATH = '/etc/gs.key'
+ALINK_CONFIG = '/config/alink_gs.conf'
 CONFIG_WHITELIST = [
     '/etc/wifibroadcast.cfg',
     '/config/scripts/screen-mode',
@@ -24,6 +170,344 @@ CONFIG_WHITELIST = [
     '/config/scripts/rec-fps'
 ]
 COMMANDS_SCRIPT = os.path.join(os.path.dirname(__file__), 'commands.sh')
+CAMERA_HOST = os.environ.get('WEBUI_CAMERA_HOST', '10.5.0.10')
+CAMERA_USER = 'root'
+CAMERA_PASSWORD = os.environ.get('WEBUI_CAMERA_PASSWORD', '12345')
+# Private (0700) directory for the SSH control sockets; must match the ControlPath in commands.sh
+CAMERA_CONTROL_DIR = os.environ.get('WEBUI_SSH_CONTROL_DIR', '/run/webui')
+CAMERA_CONFIG_FILES = ['/etc/wfb.conf', '/etc/majestic.yaml']
+# Seconds a fetched camera config is served without re-checking the camera
+CAMERA_CONFIG_FRESH = 5
+# Editable camera settings: form field -> (file, key). Majestic keys live under video0
+CAMERA_FIELDS = {
+    'fps': ('/etc/majestic.yaml', 'fps'),
+    'size': ('/etc/majestic.yaml', 'size'),
+    'bitrate': ('/etc/majestic.yaml', 'bitrate'),
+    'gopSize': ('/etc/majestic.yaml', 'gopSize'),
+    'channel': ('/etc/wfb.conf', 'channel'),
+    'txpower_override': ('/etc/wfb.conf', 'driver_txpower_override'),
+    'stbc': ('/etc/wfb.conf', 'stbc'),
+    'ldpc': ('/etc/wfb.conf', 'ldpc'),
+    'mcs_index': ('/etc/wfb.conf', 'mcs_index'),
+    'fec_k': ('/etc/wfb.conf', 'fec_k'),
+    'fec_n': ('/etc/wfb.conf', 'fec_n'),
+    'bandwidth': ('/etc/wfb.conf', 'bandwidth')
+}
+WFB_STATS_HOST = os.environ.get('WEBUI_WFB_STATS_HOST', '10.5.0.1')
+WFB_STATS_PORT = int(os.environ.get('WEBUI_WFB_STATS_PORT', 8103))
+# Seconds without a fresh rx record before /rssi/data reports a timeout
+RSSI_STALE_AFTER = 5
+# Allowed ?rate= values for /rssi/stream, in frames per second (None = every update)
+RSSI_STREAM_RATES = {'native': None, '5': 5.0, '1': 1.0}
+# Seconds between SSE keepalive comments when no stats arrive
+RSSI_STREAM_KEEPALIVE = 15
+# waitress worker threads; every open event stream (RSSI, logs, replays) holds one
+SERVER_THREADS = 16
+# Event streams open at once, so the remaining threads always serve pages and API calls
+SSE_MAX_STREAMS = 10
+# Service logs shown by the log viewer: name -> ('journal', systemd units on the ground
+# station) or ('camera', syslog tag on the camera)
+LOG_SOURCES = {
+    'wifibroadcast': ('journal', ['wifibroadcast', 'wifibroadcast@gs']),
+    'alink_gs': ('journal', ['alink_gs']),
+    'majestic': ('camera', 'majestic')
+}
+# Syslog severities, most severe first; ?level= shows this level and everything above it
+LOG_LEVELS = ('emerg', 'alert', 'crit', 'err', 'warning', 'notice', 'info', 'debug')
+# Lines kept in memory per source
+LOG_TAIL_LINES = 1000
+# Lines of history sent to a viewer when it connects
+LOG_STREAM_BACKLOG = 200
+# Seconds a follower keeps running after its last viewer left
+LOG_IDLE_STOP = 120
+# Seconds before restarting a follower whose process exited, doubling up to the maximum
+LOG_RESTART_DELAY = (1, 60)
+LOG_FILTER_MAX_LENGTH = 200
+# History tiers as (bucket seconds, capacity); 0 seconds keeps every raw update
+RSSI_HISTORY_TIERS = [(0, 3000), (1, 3600), (10, 2160), (60, 1440)]
+RSSI_HISTORY_METRICS = ('rssi_avg', 'rssi_min', 'rssi_max', 'snr_avg', 'pkt_recv')
+RSSI_HISTORY_PACKETS = ('all', 'dec_ok', 'fec_rec', 'lost', 'bad')
+RSSI_HISTORY_MAX_POINTS = 2000
+# Rolling link analytics windows as (name, seconds), built from whole seconds of stats
+LINK_ANALYTICS_WINDOWS = (('5s', 5), ('30s', 30), ('5m', 300))
+LINK_ANALYTICS_PERCENTILES = (5, 50, 95)
+# System load is sampled on whole seconds, matching the 1 s RSSI tier timestamps
+SYSTEM_SAMPLE_INTERVAL = 1
+SYSTEM_HISTORY_TIERS = [(1, 3600), (10, 2160), (60, 1440)]
+# Seconds between rescans for disks, thermal zones and wireless interfaces
+SYSTEM_RESCAN_INTERVAL = 30
+# wfb-ng interfaces to watch; every wireless interface when unset
+SYSTEM_NICS = os.environ.get('WEBUI_WFB_NICS', '').split()
+TELEMETRY_FOLDER = os.path.join(MEDIA_FOLDER, 'telemetry')
+# A new recording session starts after this many seconds without stats
+TELEMETRY_SESSION_GAP = 60
+# Buffered records are written out when either limit is reached
+TELEMETRY_FLUSH_INTERVAL = 5
+TELEMETRY_FLUSH_BYTES = 64 * 1024
+# Seconds of telemetry between sparse index entries
+TELEMETRY_INDEX_INTERVAL = 5
+# Finished sessions are deleted, oldest first, beyond either limit; 0 disables a limit
+TELEMETRY_MAX_BYTES = int(os.environ.get('WEBUI_TELEMETRY_MAX_MB', 512)) * 1024 * 1024
+TELEMETRY_MAX_AGE_DAYS = int(os.environ.get('WEBUI_TELEMETRY_MAX_DAYS', 30))
+TELEMETRY_RETENTION_INTERVAL = 300
+TELEMETRY_MAX_RECORDS = 5000
+TELEMETRY_REPLAY_SPEEDS = (1, 4, 16)
+# Air unit link profiles as (lowest link score, MCS, bitrate in kbit/s), after the
+# default txprofiles.conf; used by the alink simulator
+ALINK_PROFILES = [(1000, 0, 2000), (1051, 1, 4000), (1501, 2, 7000), (1901, 3, 10000)]
+# Simulated link parameters that alink_gs.conf does not set; candidates may override them
+ALINK_SIM_DEFAULTS = {
+    'rssi_weight': 0.5,
+    'snr_weight': 0.5,
+    'smoothing_up': 0.1,
+    'smoothing_down': 1.0,
+    'hysteresis_up_pct': 5,
+    'hysteresis_down_pct': 5,
+    'min_between_changes_ms': 200
+}
+# Samples further apart than this many median sample intervals are a gap and not counted
+ALINK_SIM_GAP_FACTOR = 3
+# Samples scored at once per candidate by the NumPy engine
+ALINK_SIM_BLOCK = 2048
+# Candidates per simulation with NumPy and with the pure Python fallback
+ALINK_SIM_MAX_CANDIDATES = 1000
+ALINK_SIM_MAX_CANDIDATES_PYTHON = 25
+ALINK_SIM_SYNTHETIC_DURATION = 600
+# Hosts watched by the link monitor: name -> (address, TCP port used when ICMP is not permitted)
+LINK_HOSTS = {
+    'camera': (CAMERA_HOST, 22),
+    'wfb': (WFB_STATS_HOST, WFB_STATS_PORT)
+}
+LINK_PROBE_INTERVAL = 2
+LINK_PROBE_TIMEOUT = 1
+# Consecutive failed probes before a host is reported down
+LINK_DOWN_AFTER = 3
+# Probes kept for the loss ratio; any loss in this window marks a host degraded
+LINK_LOSS_WINDOW = 20
+# RTT EWMA above this many milliseconds marks a host degraded
+LINK_DEGRADED_RTT = 200
+JOB_WORKERS = 2
+# Finished jobs kept for /jobs/<id>
+JOB_HISTORY = 50
+# Extra cameras and ground receivers; the camera and wfb-ng endpoint above are always registered
+DEVICES_FILE = os.environ.get('WEBUI_DEVICES_FILE', '/etc/webUI/devices.json')
+DEVICE_ROLES = ('air', 'ground')
+# Air unit passwords referenced as 'file:NAME' live in this directory, 'env:NAME' must use the prefix
+DEVICE_CREDENTIALS_DIR = os.environ.get('WEBUI_CREDENTIALS_DIR', '/etc/webUI/credentials')
+DEVICE_CREDENTIALS_ENV_PREFIX = 'WEBUI_CRED_'
+# Devices contacted at once by a fan-out operation
+DEVICE_WORKERS = 4
+# Seconds after which a fan-out operation reports the devices that have not answered
+DEVICE_OP_TIMEOUT = 45
+# Seconds run() waits past the deadline for workers to report their own timeout
+DEVICE_OP_GRACE = 2
+# Histogram buckets in seconds, shared by HTTP, subprocess and SSH timings
+METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# Each logging call site may emit this many records per interval before being muted
+LOG_RATE_BURST = 5
+LOG_RATE_INTERVAL = 60
+# Compiled templates survive restarts here, so the first page after boot skips Jinja's compiler
+JINJA_CACHE_FOLDER = os.environ.get('WEBUI_JINJA_CACHE_FOLDER', '/var/cache/webui/jinja')
+# Seconds the startup warm-up waits for the server socket to accept connections
+STARTUP_LISTEN_TIMEOUT = 30
+
+class Metrics:
+    """
+    Prometheus counters, gauges and histograms without locks on the hot path.
+
+    Every thread records into its own shard, a plain dict only that thread
+    writes, so a sample costs a dict lookup and an integer add with no
+    contention. /metrics sums the shards when it is scraped. Shards of
+    finished threads are folded into one retired shard at scrape time, so
+    their counts are kept without the per-request threads of the
+    development server growing the list forever. Collectors
+    registered with add_collector add gauges computed at scrape time.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self._local = threading.local()
+        # (weak reference to the owning thread, shard)
+        self._shards = []
+        self._retired = {}
+        self._lock = threading.Lock()
+        self._descriptions = {}
+        self._collectors = []
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append((weakref.ref(threading.current_thread()), shard))
+        return shard
+
+    def describe(self, name, kind, text):
+        self._descriptions[name] = (kind, text)
+
+    def add_collector(self, collector):
+        """Register collector(), which returns a list of (name, labels, value) gauges."""
+        self._collectors.append(collector)
+
+    def inc(self, name, labels=(), amount=1):
+        """Add to a counter (or an up/down gauge); labels is a tuple of (name, value) pairs."""
+        shard = self._shard()
+        key = (name, labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    def observe(self, name, labels, value):
+        """Record one histogram sample."""
+        shard = self._shard()
+        entry = shard.get((name, labels))
+        if entry is None:
+            entry = shard[(name, labels)] = [0] * (len(self.buckets) + 1) + [0.0]
+        entry[bisect.bisect_left(self.buckets, value)] += 1
+        entry[-1] += value
+
+    @staticmethod
+    def _labels(labels, extra=()):
+        pairs = list(labels) + list(extra)
+        if not pairs:
+            return ''
+        escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+        return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+    @staticmethod
+    def _merge(totals, shard):
+        """Add a shard's counters and histograms into totals, keyed the same way."""
+        for key, value in shard.copy().items():
+            if isinstance(value, list):
+                total = totals.setdefault(key, [0] * len(value))
+                for i, count in enumerate(value):
+                    total[i] += count
+            else:
+                totals[key] = totals.get(key, 0) + value
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format."""
+        merged = {}
+        with self._lock:
+            live = []
+            for thread, shard in self._shards:
+                owner = thread()
+                if owner is None or not owner.is_alive():
+                    # Nothing writes to it any more
+                    self._merge(self._retired, shard)
+                else:
+                    live.append((thread, shard))
+            self._shards = live
+            self._merge(merged, self._retired)
+        for _, shard in live:
+            self._merge(merged, shard)
+        totals = {}
+        for (name, labels), value in merged.items():
+            totals.setdefault(name, {})[labels] = value
+        for collector in self._collectors:
+            try:
+                for name, labels, value in collector():
+                    if value is not None:
+                        totals.setdefault(name, {})[labels] = value
+            except Exception as e:
+                logger.warning(f"Metrics collector error: {str(e)}")
+
+        lines = []
+        for name in sorted(totals):
+            kind, text = self._descriptions.get(name, ('untyped', ''))
+            lines.append(f'# HELP {name} {text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in sorted(totals[name].items()):
+                if kind != 'histogram':
+                    lines.append(f'{name}{self._labels(labels)} {value}')
+                    continue
+                cumulative = 0
+                for bound, count in zip(self.buckets + ('+Inf',), value):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{self._labels(labels, [("le", bound)])} {cumulative}')
+                lines.append(f'{name}_sum{self._labels(labels)} {round(value[-1], 6)}')
+                lines.append(f'{name}_count{self._labels(labels)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+metrics = Metrics(METRICS_LATENCY_BUCKETS)
+for _name, _kind, _text in [
+    ('webui_http_request_duration_seconds', 'histogram', 'Time to produce a response, by route and method.'),
+    ('webui_http_responses_total', 'counter', 'Responses by route and status code.'),
+    ('webui_http_requests_in_flight', 'gauge', 'Requests currently being handled.'),
+    ('webui_sse_streams_open', 'gauge', 'Server-Sent Event streams currently open.'),
+    ('webui_sse_rejected_total', 'counter', 'Event streams refused because SSE_MAX_STREAMS were open.'),
+    ('webui_subprocess_duration_seconds', 'histogram', 'Wall time of external commands, by program.'),
+    ('webui_subprocess_calls_total', 'counter', 'External commands run, by program and outcome.'),
+    ('webui_ssh_duration_seconds', 'histogram', 'Wall time of camera SSH operations, including retries.'),
+    ('webui_ssh_calls_total', 'counter', 'Camera SSH operations, by operation and outcome.'),
+    ('webui_device_operations_total', 'counter', 'Per-device results of fan-out operations, by operation and outcome.'),
+    ('webui_errors_total', 'counter', 'Errors by exception type.'),
+    ('webui_log_follower_starts_total', 'counter', 'journalctl and logread processes started by the log viewer, by source.'),
+    ('webui_log_messages_total', 'counter', 'Log records by level, including rate-limited ones.'),
+    ('webui_wfb_connected', 'gauge', '1 while the wfb-ng stats stream is connected.'),
+    ('webui_wfb_rssi_dbm', 'gauge', 'Average RSSI of the last stats interval, per antenna.'),
+    ('webui_wfb_snr_db', 'gauge', 'Average SNR of the last stats interval, per antenna.'),
+    ('webui_wfb_packets_total', 'counter', 'wfb-ng packet counters since wfb-ng started, by type.'),
+    ('webui_wfb_packet_loss_ratio', 'gauge', 'Lost packets over all packets in the last stats interval.'),
+    ('webui_wfb_window_loss_ratio', 'gauge', 'Lost packets over all packets in each rolling analytics window.'),
+    ('webui_wfb_window_fec_recovered_rate', 'gauge', 'FEC-recovered packets per second in each rolling analytics window.'),
+    ('webui_link_up', 'gauge', '1 unless the link monitor reports the host down.'),
+    ('webui_link_rtt_seconds', 'gauge', 'Smoothed probe round trip time per host.'),
+    ('webui_link_loss_ratio', 'gauge', 'Probe loss over the link monitor window per host.'),
+    ('webui_system_sample', 'gauge', 'Latest ground station load sample (CPU, memory, disk, thermal, NIC) by source and metric.')
+]:
+    metrics.describe(_name, _kind, _text)
+
+def record_error(error):
+    metrics.inc('webui_errors_total', (('type', type(error).__name__),))
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets at most burst records per interval through from each logging call site.
+
+    The first record let through after a suppressed stretch says how many
+    were dropped. This keeps a failing background loop or a flapping link
+    from flooding the journal and wearing the SD card.
+    """
+
+    def __init__(self, burst, interval):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self._sites = {}
+
+    def filter(self, record):
+        metrics.inc('webui_log_messages_total', (('level', record.levelname.lower()),))
+        if record.exc_info and record.exc_info[1] is not None:
+            record_error(record.exc_info[1])
+        now = time.monotonic()
+        key = (record.pathname, record.lineno)
+        window = self._sites.get(key)
+        if window is None or now - window[0] >= self.interval:
+            suppressed = window[2] if window else 0
+            window = self._sites[key] = [now, 0, 0]
+            if suppressed:
+                record.msg = f'{record.msg} ({suppressed} similar messages suppressed)'
+        if window[1] >= self.burst:
+            window[2] += 1
+            return False
+        window[1] += 1
+        return True
+
+logger = logging.getLogger('webui')
+logger.addFilter(RateLimitFilter(LOG_RATE_BURST, LOG_RATE_INTERVAL))
+
+def template_bytecode_cache(folder):
+    """Return a Jinja bytecode cache kept in folder, or None if folder is not writable."""
+    try:
+        os.makedirs(folder, exist_ok=True)
+    except OSError as e:
+        logger.warning(f"Template bytecode cache disabled, cannot create {folder}: {e.strerror}")
+        return None
+    if not os.access(folder, os.W_OK):
+        logger.warning(f"Template bytecode cache disabled, {folder} is not writable")
+        return None
+    return FileSystemBytecodeCache(folder)
+
+app.jinja_options = {**app.jinja_options, 'bytecode_cache': template_bytecode_cache(JINJA_CACHE_FOLDER)}
 
 def calculate_md5(filepath):
     """
@@ -45,89 +529,4929 @@ def calculate_md5(filepath):
             md5_hash.update(chunk)
     return md5_hash.hexdigest()
 
-def ping_host(host, timeout=10):
+class IniDocument:
     """
-    Returns True if host responds to a ping request, False otherwise
-    
-    Args:
-        host (str): The host to ping
-        timeout (int): Timeout in seconds
+    INI file parsed for round-trip editing.
+
+    Reads like ConfigParser without interpolation: keys are case-insensitive
+    and reported in lower case, both '=' and ':' delimit values, and
+    indented lines continue the previous value. Unlike ConfigParser, the
+    original lines are kept, so comments, blank lines, ordering and the
+    spelling of keys survive a write; only the lines whose values change
+    are rewritten.
     """
-    param = '-n' if platform.system().lower() == 'windows' else '-c'
-    command = ['ping', param, '1', host]
-    
-    try:
-        subprocess.check_output(command, stderr=subprocess.STDOUT, timeout=timeout)
+
+    SECTION_PATTERN = re.compile(r'^\s*\[([^\]]+)\]')
+    OPTION_PATTERN = re.compile(r'^(\s*)([^=:\s][^=:]*?)(\s*[=:]\s*)(.*?)\s*$')
+
+    def __init__(self, text):
+        self.lines = text.splitlines()
+        self.trailing_newline = text.endswith('\n') or not text
+        self._parse()
+
+    def _parse(self):
+        # section -> {key: [line index, continuation line count, value]}
+        self.sections = {}
+        self._section_end = {}
+        section = None
+        last_option = None
+        for number, line in enumerate(self.lines):
+            stripped = line.strip()
+            if not stripped or stripped[0] in '#;':
+                continue
+            if last_option is not None and line[0].isspace():
+                last_option[1] += 1
+                last_option[2] += '\n' + stripped
+                self._section_end[section] = number + 1
+                continue
+            match = self.SECTION_PATTERN.match(line)
+            if match:
+                section = match.group(1)
+                self.sections.setdefault(section, {})
+                self._section_end[section] = number + 1
+                last_option = None
+                continue
+            match = self.OPTION_PATTERN.match(line)
+            if match and section is not None:
+                last_option = [number, 0, match.group(4)]
+                self.sections[section][match.group(2).lower()] = last_option
+                self._section_end[section] = number + 1
+            else:
+                last_option = None
+
+    def to_dict(self):
+        """Return {section: {key: value}} like read_ini_file always did."""
+        defaults = {key: option[2] for key, option in self.sections.get('DEFAULT', {}).items()}
+        return {
+            section: {**defaults, **{key: option[2] for key, option in options.items()}}
+            for section, options in self.sections.items() if section != 'DEFAULT'
+        }
+
+    def update(self, data):
+        """
+        Apply {section: {key: value}} in place.
+
+        Values are written on a single line, so line breaks are refused
+        rather than turned into new keys or sections.
+
+        Returns:
+            list: {'section', 'key', 'old', 'new'} for every value that changed
+
+        Raises:
+            ValueError: If a section, key or value contains a line break
+        """
+        for section, values in data.items():
+            for key, value in values.items():
+                if any(char in str(text) for text in (section, key, value) for char in '\r\n'):
+                    raise ValueError(f'Line breaks are not allowed in config values ({section!r}, {key!r})')
+        changes = []
+        for section, values in data.items():
+            for key, value in values.items():
+                value = str(value)
+                key_lower = key.lower()
+                option = self.sections.get(section, {}).get(key_lower)
+                old = option[2] if option else None
+                if old == value:
+                    continue
+                changes.append({'section': section, 'key': key_lower, 'old': old, 'new': value})
+                if option:
+                    number, continuations, _ = option
+                    prefix = self.OPTION_PATTERN.match(self.lines[number])
+                    self.lines[number:number + continuations + 1] = [prefix.group(1) + prefix.group(2) + prefix.group(3) + value]
+                elif section in self.sections:
+                    self.lines.insert(self._section_end[section], f'{key} = {value}')
+                else:
+                    if self.lines and self.lines[-1].strip():
+                        self.lines.append('')
+                    self.lines.extend([f'[{section}]', f'{key} = {value}'])
+                self._parse()
+        return changes
+
+    def text(self):
+        return '\n'.join(self.lines) + ('\n' if self.trailing_newline else '')
+
+
+class ConfigStore:
+    """
+    Cached, write-minimising access to the ground station config files.
+
+    Parsed documents are cached by (device, inode, size, mtime) so repeated
+    page loads do not re-read unchanged files. Writes are skipped when the
+    content is unchanged, which saves flash wear on the SD card, and
+    otherwise go to a temp file in the same directory that is fsynced and
+    renamed over the original, so a power cut never leaves a torn config.
+    """
+
+    def __init__(self):
+        self._documents = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def identity(path):
+        stat = os.stat(path)
+        return (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def document(self, path):
+        """Return the parsed IniDocument for path, re-reading only if it changed."""
+        identity = self.identity(path)
+        with self._lock:
+            cached = self._documents.get(path)
+            if cached is not None and cached[0] == identity:
+                return cached[1]
+        with open(path, encoding='utf-8') as f:
+            document = IniDocument(f.read())
+        with self._lock:
+            self._documents[path] = (identity, document)
+        return document
+
+    def read(self, path):
+        return self.document(path).to_dict()
+
+    def update(self, path, data):
+        """
+        Set values in an INI file, writing only if something changed.
+
+        Returns:
+            list: The changes made, see IniDocument.update
+        """
+        with open(path, encoding='utf-8') as f:
+            document = IniDocument(f.read())
+        changes = document.update(data)
+        if changes:
+            self.write(path, document.text().encode('utf-8'))
+        return changes
+
+    def write(self, path, content):
+        """
+        Atomically replace path with content unless it already holds it.
+
+        Returns:
+            bool: True if the file was written
+        """
+        try:
+            with open(path, 'rb') as f:
+                if f.read() == content:
+                    return False
+            mode = os.stat(path).st_mode & 0o7777
+        except FileNotFoundError:
+            mode = 0o644
+
+        directory = os.path.dirname(path) or '.'
+        # A fresh, exclusively created name, so concurrent writers or a planted symlink can't interfere
+        fd, tmp_path = tempfile.mkstemp(prefix=f'.{os.path.basename(path)}.', suffix='.webui-tmp', dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(tmp_path, mode)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+        with self._lock:
+            self._documents.pop(path, None)
         return True
-    except (subprocess.CalledProcessError, subprocess.TimeoutExpired):
-        return False
+
+config_store = ConfigStore()
 
 def read_ini_file(filepath: str) -> Dict:
-    config = configparser.ConfigParser()
     try:
-        config.read(filepath)
-        return {section: dict(config[section]) for section in config.sections()}
+        return config_store.read(filepath)
     except Exception as e:
-        print(f"Error reading config file: {str(e)}")
+        logger.error(f"Error reading config file: {str(e)}")
         return {}
 
 def write_ini_file(filepath: str, data: Dict) -> bool:
-    config = configparser.ConfigParser()
     try:
-        # Load existing file first to preserve structure
-        config.read(filepath)
-        
-        # Update with new values
-        for section, values in data.items():
-            if not config.has_section(section):
-                config.add_section(section)
-            for key, value in values.items():
-                config.set(section, key, value)
-        
-        # Write to file
-        with open(filepath, 'w') as f:
-            config.write(f)
+        config_store.update(filepath, data)
         return True
     except Exception as e:
-        print(f"Error writing config: {str(e)}")
+        logger.error(f"Error writing config: {str(e)}")
         return False
 
+def kill_process_group(process):
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except OSError:
+        pass
+
+def run_process(args, input=None, env=None, timeout=None, job=None, label=None):
+    """
+    Run a command and capture its text output, like subprocess.run.
+
+    When a job is given the process is attached to it, so cancelling the
+    job kills the process. Calls and durations are counted in the metrics
+    under label, which defaults to the program name.
+
+    Returns:
+        subprocess.CompletedProcess: Result with text stdout/stderr
+    """
+    labels = (('program', label or os.path.basename(args[0])),)
+    started = time.perf_counter()
+    outcome = 'error'
+    try:
+        result = _run_process(args, input, env, timeout, job)
+        outcome = 'ok' if result.returncode == 0 else 'failed'
+        return result
+    except subprocess.TimeoutExpired as e:
+        outcome = 'timeout'
+        record_error(e)
+        raise
+    except OSError as e:
+        record_error(e)
+        raise
+    finally:
+        metrics.observe('webui_subprocess_duration_seconds', labels, time.perf_counter() - started)
+        metrics.inc('webui_subprocess_calls_total', labels + (('outcome', outcome),))
+
+def _run_process(args, input, env, timeout, job):
+    process = subprocess.Popen(
+        args,
+        stdin=subprocess.PIPE if input is not None else subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        env=env,
+        # Own process group, so children of shell scripts are killed too
+        start_new_session=True
+    )
+    if job is not None:
+        job.attach(process)
+    try:
+        stdout, stderr = process.communicate(input, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        kill_process_group(process)
+        process.communicate()
+        raise
+    finally:
+        if job is not None:
+            job.attach(None)
+    if job is not None:
+        job.add_output(stdout, stderr)
+    return subprocess.CompletedProcess(args, process.returncode, stdout, stderr)
+
+class CameraSession:
+    """
+    Persistent, multiplexed SSH connection to the camera.
+
+    One OpenSSH control master is kept open in the background and every
+    operation runs as a new channel over it, so only the first call pays
+    for the key exchange. Keepalives tear the master down when the link
+    dies, and the next operation transparently reconnects. Per-operation
+    latency is tracked for /camera/session.
+
+    Args:
+        host (str): Camera address
+        user (str): SSH user
+        password (str): SSH password, passed to sshpass through the environment
+        port (int): SSH port
+        connect_timeout (int): Timeout for establishing the master in seconds
+        persist (int): Seconds an idle master is kept open
+    """
+
+    def __init__(self, host, user, password, port=22, connect_timeout=10, persist=600):
+        self.host = host
+        self.user = user
+        self.password = password
+        self.port = port
+        self.connect_timeout = connect_timeout
+        self.persist = persist
+        self.control_path = os.path.join(CAMERA_CONTROL_DIR, f'webui-ssh-{user}@{host}:{port}')
+        self._master_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {}
+
+    def _ssh_args(self, *extra):
+        return [
+            'sshpass', '-e', 'ssh',
+            '-o', 'StrictHostKeyChecking=no',
+            '-o', f'Port={self.port}',
+            '-o', f'ConnectTimeout={self.connect_timeout}',
+            '-o', 'ServerAliveInterval=5',
+            '-o', 'ServerAliveCountMax=3',
+            '-o', f'ControlPath={self.control_path}',
+            *extra,
+            f'{self.user}@{self.host}'
+        ]
+
+    def _env(self):
+        env = os.environ.copy()
+        env['SSHPASS'] = self.password
+        return env
+
+    def connected(self):
+        return os.path.exists(self.control_path)
+
+    @staticmethod
+    def _private_dir(path):
+        """
+        Create the control socket directory, readable by this user only.
+
+        Raises:
+            OSError: If it exists but is a symlink or belongs to someone else
+        """
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        stat = os.lstat(path)
+        if os.path.islink(path) or stat.st_uid != os.getuid():
+            raise PermissionError(errno.EPERM, 'SSH control directory is not private', path)
+        if stat.st_mode & 0o077:
+            os.chmod(path, 0o700)
+
+    def master_alive(self):
+        """Ask the control master whether it is still running."""
+        try:
+            result = subprocess.run(
+                ['ssh', '-o', f'ControlPath={self.control_path}', '-O', 'check', f'{self.user}@{self.host}'],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                timeout=5
+            )
+        except (OSError, subprocess.SubprocessError):
+            return False
+        return result.returncode == 0
+
+    def connect(self, timeout=None):
+        """Start the control master if it is not running, within timeout seconds if given."""
+        if self.connected():
+            return
+        with self._master_lock:
+            if self.connected():
+                return
+            started = time.monotonic()
+            self._private_dir(os.path.dirname(self.control_path))
+            # Detached master with no inherited pipes, so later captures never wait on it
+            subprocess.run(
+                self._ssh_args('-M', '-N', '-f', '-o', 'ControlMaster=yes', '-o', f'ControlPersist={self.persist}'),
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                env=self._env(),
+                timeout=self.connect_timeout + 5 if timeout is None else min(self.connect_timeout + 5, timeout),
+                check=True
+            )
+            self._record('connect', time.monotonic() - started, False)
+
+    def close(self):
+        """Stop the control master, e.g. after rebooting the camera."""
+        subprocess.run(
+            ['ssh', '-o', f'ControlPath={self.control_path}', '-O', 'exit', f'{self.user}@{self.host}'],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            timeout=5
+        )
+
+    def run(self, command, op='run', input=None, timeout=15, check=True, job=None, retry=True):
+        """
+        Run a command on the camera over the shared connection.
+
+        Args:
+            command (str): Remote shell command
+            op (str): Operation name used for latency statistics
+            input (str): Optional data written to the command's stdin
+            timeout (int): Timeout in seconds, covering connecting and the retry
+            check (bool): Raise CalledProcessError on a non-zero exit status
+            job (Job): Optional job the remote command runs for
+            retry (bool): Run the command again over a new master when ssh failed
+                          because the old one died; pass False for commands that
+                          must not run twice, such as reboot
+
+        Returns:
+            subprocess.CompletedProcess: Result with text stdout/stderr
+        """
+        started = time.monotonic()
+        failed = True
+        try:
+            for attempt in range(2):
+                remaining = started + timeout - time.monotonic()
+                if remaining <= 0:
+                    raise subprocess.TimeoutExpired(command, timeout)
+                self.connect(remaining)
+                result = run_process(
+                    self._ssh_args('-o', 'ControlMaster=no') + [command],
+                    input=input,
+                    env=self._env(),
+                    timeout=max(started + timeout - time.monotonic(), 0.1),
+                    job=job,
+                    label='ssh'
+                )
+                # 255 is either ssh's own failure or the remote command's exit status;
+                # only a master that is gone means the command never ran
+                if result.returncode != 255 or attempt or not retry or self.master_alive():
+                    break
+                self._drop_master()
+            if check and result.returncode != 0:
+                raise subprocess.CalledProcessError(result.returncode, command, result.stdout, result.stderr)
+            failed = result.returncode != 0
+            return result
+        except subprocess.TimeoutExpired:
+            self._drop_master()
+            raise
+        finally:
+            self._record(op, time.monotonic() - started, failed)
+
+    def popen(self, command):
+        """Start a long-running command on the camera, such as a log follower, with stdout on a pipe."""
+        self.connect()
+        return subprocess.Popen(
+            self._ssh_args('-o', 'ControlMaster=no') + [command],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            env=self._env(),
+            start_new_session=True
+        )
+
+    def read_file(self, path, timeout=15):
+        return self.run(f'cat {shlex.quote(path)}', op='read', timeout=timeout).stdout
+
+    def read_files(self, paths, timeout=15):
+        """
+        Read several files in one round trip.
+
+        Returns:
+            dict: {path: content}
+        """
+        marker = '==> webui-file-boundary <=='
+        command = '; '.join(f'echo {shlex.quote(marker)}; cat {shlex.quote(path)}' for path in paths)
+        output = self.run(command, op='read', timeout=timeout).stdout
+        parts = output.split(marker + '\n')[1:]
+        return dict(zip(paths, parts))
+
+    def write_file(self, path, content, timeout=15):
+        self.run(f'cat > {shlex.quote(path)}', op='write', input=content, timeout=timeout)
+
+    def _drop_master(self):
+        try:
+            self.close()
+        except (OSError, subprocess.SubprocessError):
+            pass
+        try:
+            os.remove(self.control_path)
+        except OSError:
+            pass
+
+    def _record(self, op, duration, failed):
+        metrics.observe('webui_ssh_duration_seconds', (('op', op),), duration)
+        metrics.inc('webui_ssh_calls_total', (('op', op), ('outcome', 'failed' if failed else 'ok')))
+        with self._stats_lock:
+            entry = self._stats.setdefault(op, {'count': 0, 'errors': 0, 'total': 0.0, 'max': 0.0, 'last': 0.0})
+            entry['count'] += 1
+            entry['errors'] += int(failed)
+            entry['total'] += duration
+            entry['max'] = max(entry['max'], duration)
+            entry['last'] = duration
+
+    def stats(self):
+        """Return per-operation latency statistics in milliseconds."""
+        with self._stats_lock:
+            return {
+                op: {
+                    'count': entry['count'],
+                    'errors': entry['errors'],
+                    'avg_ms': round(entry['total'] / entry['count'] * 1000, 1),
+                    'max_ms': round(entry['max'] * 1000, 1),
+                    'last_ms': round(entry['last'] * 1000, 1)
+                }
+                for op, entry in self._stats.items()
+            }
+
+camera_session = CameraSession(CAMERA_HOST, CAMERA_USER, CAMERA_PASSWORD)
+
+def load_yaml(content):
+    """Parse YAML with the libyaml-backed loader when PyYAML was built with it."""
+    return yaml.load(content, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
+
+def parse_wfb_conf(content):
+    """Parse the camera's key=value wfb.conf into a dict of strings."""
+    wfb_config = {}
+    for line in content.splitlines():
+        if '=' in line and not line.startswith('#'):
+            key, value = line.split('=', 1)
+            wfb_config[key.strip()] = value.strip()
+    return wfb_config
+
+def edit_wfb_conf(content, edits):
+    """
+    Replace key=value lines in wfb.conf, keeping every other line as is.
+
+    Args:
+        content (str): Current file content
+        edits (dict): {key: new value}
+
+    Returns:
+        tuple: (new content, set of keys that were found)
+    """
+    lines = content.splitlines(keepends=True)
+    found = set()
+    for i, line in enumerate(lines):
+        if '=' in line and not line.startswith('#'):
+            key = line.split('=', 1)[0].strip()
+            if key in edits:
+                ending = '\n' if line.endswith('\n') else ''
+                lines[i] = f'{key}={edits[key]}{ending}'
+                found.add(key)
+    return ''.join(lines), found
+
+def edit_majestic_video0(content, edits):
+    """
+    Replace values of direct children of the video0 section in majestic.yaml.
+
+    Indentation, trailing comments and all other lines are preserved.
+
+    Args:
+        content (str): Current file content
+        edits (dict): {key: new value}
+
+    Returns:
+        tuple: (new content, set of keys that were found)
+    """
+    lines = content.splitlines(keepends=True)
+    found = set()
+    in_video0 = False
+    child_indent = None
+    for i, line in enumerate(lines):
+        stripped = line.strip()
+        if not stripped or stripped.startswith('#'):
+            continue
+        indent = len(line) - len(line.lstrip())
+        if indent == 0:
+            in_video0 = stripped.startswith('video0:')
+            child_indent = None
+            continue
+        if not in_video0:
+            continue
+        if child_indent is None:
+            child_indent = indent
+        if indent != child_indent:
+            continue
+        match = re.match(r'^(\s*)([A-Za-z0-9_]+):(\s*)([^#\n]*?)(\s*#.*)?(\n?)$', line)
+        if match and match.group(2) in edits:
+            key = match.group(2)
+            lines[i] = f"{match.group(1)}{key}: {edits[key]}{match.group(5) or ''}{match.group(6)}"
+            found.add(key)
+    return ''.join(lines), found
+
+def apply_camera_changes(changes, session=None, cache=None, deadline=None):
+    """
+    Apply all changed camera settings as one transaction.
+
+    Both config files are fetched in one round trip and edited locally.
+    Each modified file is uploaded to a temp file next to the original and
+    checked against its MD5, then all temp files are renamed into place by
+    one final command, which also aborts if a file changed on the camera in
+    the meantime. A dropped link therefore never leaves a half-applied
+    config.
+
+    Args:
+        changes (dict): {form field: value}, fields must be in CAMERA_FIELDS
+        session (CameraSession): Camera to change, the default camera if omitted
+        cache (CameraConfigCache): Config cache of that camera, invalidated after a change
+        deadline (float): time.monotonic() by which everything must be done; every
+                          SSH call gets the time left and nothing is committed after it
+
+    Returns:
+        dict: {field: 'updated' | 'unchanged' | 'not_found'}
+
+    Raises:
+        subprocess.TimeoutExpired: If the deadline passed before the commit
+        TimeoutError: If the commit itself timed out and may have been applied
+    """
+    session = session or camera_session
+    cache = cache or camera_config_cache
+
+    def remaining(step):
+        if deadline is None:
+            return 15
+        left = deadline - time.monotonic()
+        if left <= 0:
+            raise subprocess.TimeoutExpired(step, 0)
+        return left
+
+    paths = sorted({CAMERA_FIELDS[field][0] for field in changes})
+    originals = session.read_files(paths, timeout=remaining('read'))
+
+    results = {}
+    new_contents = {}
+    for path in paths:
+        edits = {CAMERA_FIELDS[field][1]: str(value)
+                 for field, value in changes.items() if CAMERA_FIELDS[field][0] == path}
+        original = originals.get(path, '')
+        if path == '/etc/majestic.yaml':
+            current = (load_yaml(original) or {}).get('video0', {})
+            content, found = edit_majestic_video0(original, edits)
+            applied = (load_yaml(content) or {}).get('video0', {})
+        else:
+            current = parse_wfb_conf(original)
+            content, found = edit_wfb_conf(original, edits)
+            applied = parse_wfb_conf(content)
+
+        for field, value in changes.items():
+            file_path, key = CAMERA_FIELDS[field]
+            if file_path != path:
+                continue
+            if key not in found:
+                results[field] = 'not_found'
+            elif str(current.get(key)) == str(value):
+                results[field] = 'unchanged'
+            elif str(applied.get(key)) != str(value):
+                raise ValueError(f'Edited {path} does not contain {key}={value}')
+            else:
+                results[field] = 'updated'
+        if content != original:
+            new_contents[path] = (content, hashlib.md5(original.encode()).hexdigest())
+
+    if not new_contents:
+        return results
+
+    commit = []
+    for path, (content, original_md5) in new_contents.items():
+        tmp_path = shlex.quote(path + '.webui-tmp')
+        expected = hashlib.md5(content.encode()).hexdigest()
+        session.run(
+            f'cat > {tmp_path} && [ "$(md5sum < {tmp_path} | cut -d" " -f1)" = {expected} ]'
+            f' || {{ rm -f {tmp_path}; exit 1; }}',
+            op='write',
+            input=content,
+            timeout=remaining('write')
+        )
+        commit.append(f'[ "$(md5sum < {shlex.quote(path)} | cut -d" " -f1)" = {original_md5} ]')
+    renames = ' && '.join(f'mv {shlex.quote(path + ".webui-tmp")} {shlex.quote(path)}' for path in new_contents)
+    cleanup = '; '.join(f'rm -f {shlex.quote(path + ".webui-tmp")}' for path in new_contents)
+    timeout = remaining('commit')
+    try:
+        session.run(
+            f"{' && '.join(commit)} && sync && {renames} && sync || {{ {cleanup}; exit 1; }}",
+            op='commit',
+            timeout=timeout,
+            retry=False
+        )
+    except subprocess.TimeoutExpired:
+        cache.invalidate()
+        raise TimeoutError('Timed out while committing, the new settings may have been applied') from None
+    cache.invalidate()
+    return results
+
+def build_camera_config(wfb_output, majestic_output):
+    """Build the settings shown on the camera page from the raw config files."""
+    wfb_config = parse_wfb_conf(wfb_output)
+    try:
+        video_config = (load_yaml(majestic_output) or {}).get('video0', {})
+    except yaml.YAMLError as e:
+        logger.warning(f"YAML parsing error: {e}")
+        video_config = {}
+
+    # Build response with actual values, not defaults
+    return {
+        'fps': str(video_config.get('fps', '60')),
+        'size': str(video_config.get('size', '1920x1080')),
+        'bitrate': str(video_config.get('bitrate', '4096')),
+        'gopSize': str(video_config.get('gopSize', '1')),
+        'channel': wfb_config.get('channel', '161'),
+        'txpower_override': wfb_config.get('driver_txpower_override', '1'),
+        'stbc': wfb_config.get('stbc', '0'),
+        'ldpc': wfb_config.get('ldpc', '0'),
+        'mcs_index': wfb_config.get('mcs_index', '1'),
+        'fec_k': wfb_config.get('fec_k', '8'),
+        'fec_n': wfb_config.get('fec_n', '12'),
+        'bandwidth': wfb_config.get('bandwidth', '20')
+    }
+
+class CameraConfigCache:
+    """
+    Cache of the camera configuration keyed by a remote content fingerprint.
+
+    Revalidation is a single SSH round trip: the camera hashes its config
+    files and only sends them back when the hash differs from the cached
+    one. A result validated within CAMERA_CONFIG_FRESH seconds is served
+    without contacting the camera at all. Writes made by the webUI call
+    invalidate().
+    """
+
+    UNCHANGED = 'webui-config-unchanged'
+
+    def __init__(self, paths, session):
+        self.paths = paths
+        self.session = session
+        self.config = None
+        self.etag = None
+        self._fingerprint = ''
+        self._validated = 0.0
+        self._lock = threading.Lock()
+
+    def is_fresh(self):
+        return self.config is not None and time.monotonic() - self._validated < CAMERA_CONFIG_FRESH
+
+    def invalidate(self):
+        with self._lock:
+            self.config = None
+            self.etag = None
+            self._fingerprint = ''
+
+    def get(self, timeout=15):
+        """
+        Return the current config, fetching it only if it changed.
+
+        Returns:
+            tuple: (config dict, etag)
+        """
+        with self._lock:
+            if self.is_fresh():
+                return self.config, self.etag
+
+            files = ' '.join(shlex.quote(path) for path in self.paths)
+            marker = shlex.quote('==> webui-file-boundary <==')
+            cats = '; '.join(f'echo {marker}; cat {shlex.quote(path)}' for path in self.paths)
+            command = (
+                f'fp=$(cat {files} 2>/dev/null | md5sum | cut -d" " -f1); '
+                f'if [ "$fp" = {shlex.quote(self._fingerprint or "none")} ]; then echo {self.UNCHANGED}; '
+                f'else echo "$fp"; {cats}; fi'
+            )
+            output = self.session.run(command, op='read', timeout=timeout).stdout
+            fingerprint, _, body = output.partition('\n')
+            if fingerprint.strip() != self.UNCHANGED or self.config is None:
+                parts = dict(zip(self.paths, body.split('==> webui-file-boundary <==\n')[1:]))
+                self.config = build_camera_config(parts.get('/etc/wfb.conf', ''), parts.get('/etc/majestic.yaml', ''))
+                self.etag = hashlib.md5(json.dumps(self.config, sort_keys=True).encode()).hexdigest()
+                self._fingerprint = fingerprint.strip()
+            self._validated = time.monotonic()
+            return self.config, self.etag
+
+camera_config_cache = CameraConfigCache(CAMERA_CONFIG_FILES, camera_session)
+
+class LinkMonitor:
+    """
+    Background liveness monitor for the camera and the wfb-ng endpoint.
+
+    Probes run in one daemon thread: an ICMP echo over a ping socket (or a
+    raw socket when running as root), falling back to a TCP connect when
+    neither is permitted. A refused TCP connection still proves the host is
+    up. Every host has a small state machine (unknown, up, degraded, down)
+    with an RTT EWMA, jitter and loss over the last LINK_LOSS_WINDOW probes.
+    Routes read the cached state instead of probing inline.
+    """
+
+    def __init__(self, hosts):
+        self.hosts = hosts
+        self._states = {name: self._new_state(address) for name, (address, _) in hosts.items()}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._ident = os.getpid() & 0xffff
+        self._seq = itertools.count(1)
+        self.icmp_kind = self._detect_icmp()
+
+    @staticmethod
+    def _new_state(address):
+        return {
+            'address': address,
+            'state': 'unknown',
+            'rtt_ms': None,
+            'jitter_ms': None,
+            'loss': 0.0,
+            'failures': 0,
+            'last_seen': None,
+            'since': time.time(),
+            'method': None,
+            'history': deque(maxlen=LINK_LOSS_WINDOW)
+        }
+
+    @staticmethod
+    def _detect_icmp():
+        for kind in (socket.SOCK_DGRAM, socket.SOCK_RAW):
+            try:
+                socket.socket(socket.AF_INET, kind, socket.IPPROTO_ICMP).close()
+                return kind
+            except OSError:
+                continue
+        return None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='link-monitor', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            for name in list(self.hosts):
+                self.probe(name)
+            time.sleep(LINK_PROBE_INTERVAL)
+
+    def watch(self, name, address, port):
+        """Start probing another host, or follow a watched host to a new address."""
+        with self._lock:
+            if self.hosts.get(name) != (address, port):
+                self.hosts[name] = (address, port)
+                self._states[name] = self._new_state(address)
+
+    def unwatch(self, name):
+        with self._lock:
+            self.hosts.pop(name, None)
+            self._states.pop(name, None)
+
+    def probe(self, name):
+        """Probe one host now and update its state."""
+        target = self.hosts.get(name)
+        if target is None:
+            return
+        address, port = target
+        method = 'icmp' if self.icmp_kind is not None else 'tcp'
+        try:
+            if method == 'icmp':
+                rtt = self._icmp_probe(address)
+            else:
+                rtt = self._tcp_probe(address, port)
+        except OSError:
+            rtt = None
+        self._update(name, rtt, method)
+
+    def _tcp_probe(self, address, port):
+        started = time.monotonic()
+        try:
+            socket.create_connection((address, port), timeout=LINK_PROBE_TIMEOUT).close()
+        except OSError as e:
+            # A refused connection still means the host answered
+            if e.errno != errno.ECONNREFUSED:
+                return None
+        return time.monotonic() - started
+
+    @staticmethod
+    def _checksum(data):
+        if len(data) % 2:
+            data += b'\0'
+        total = sum(struct.unpack(f'!{len(data) // 2}H', data))
+        total = (total >> 16) + (total & 0xffff)
+        total += total >> 16
+        return ~total & 0xffff
+
+    def _icmp_probe(self, address):
+        seq = next(self._seq) & 0xffff
+        payload = b'webui-link-probe'
+        header = struct.pack('!BBHHH', 8, 0, 0, self._ident, seq)
+        packet = struct.pack('!BBHHH', 8, 0, self._checksum(header + payload), self._ident, seq) + payload
+
+        with socket.socket(socket.AF_INET, self.icmp_kind, socket.IPPROTO_ICMP) as sock:
+            started = time.monotonic()
+            deadline = started + LINK_PROBE_TIMEOUT
+            sock.sendto(packet, (address, 0))
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                sock.settimeout(remaining)
+                try:
+                    data, source = sock.recvfrom(1024)
+                except socket.timeout:
+                    return None
+                if self.icmp_kind == socket.SOCK_RAW:
+                    # Raw sockets see every ICMP packet, IP header included
+                    data = data[(data[0] & 0x0f) * 4:]
+                    if struct.unpack('!H', data[4:6])[0] != self._ident:
+                        continue
+                # The kernel rewrites the ident of ping sockets, so match on the sequence
+                if source[0] == address and data[0] == 0 and struct.unpack('!H', data[6:8])[0] == seq:
+                    return time.monotonic() - started
+
+    def _update(self, name, rtt, method):
+        with self._lock:
+            state = self._states.get(name)
+            if state is None:
+                return
+            state['method'] = method
+            state['history'].append(rtt is not None)
+            state['loss'] = round(1 - sum(state['history']) / len(state['history']), 3)
+            if rtt is None:
+                state['failures'] += 1
+            else:
+                rtt_ms = rtt * 1000
+                state['failures'] = 0
+                state['last_seen'] = time.time()
+                if state['rtt_ms'] is None:
+                    state['rtt_ms'] = rtt_ms
+                    state['jitter_ms'] = 0.0
+                else:
+                    state['jitter_ms'] += (abs(rtt_ms - state['rtt_ms']) - state['jitter_ms']) / 16
+                    state['rtt_ms'] += (rtt_ms - state['rtt_ms']) * 0.2
+
+            if state['failures'] >= LINK_DOWN_AFTER or state['last_seen'] is None:
+                new_state = 'down'
+            elif state['loss'] > 0 or state['rtt_ms'] > LINK_DEGRADED_RTT:
+                new_state = 'degraded'
+            else:
+                new_state = 'up'
+            if new_state != state['state']:
+                state['state'] = new_state
+                state['since'] = time.time()
+
+    def state(self, name):
+        with self._lock:
+            state = dict(self._states[name])
+        return self._public(state)
+
+    def states(self):
+        with self._lock:
+            states = {name: dict(state) for name, state in self._states.items()}
+        return {name: self._public(state) for name, state in states.items()}
+
+    @staticmethod
+    def _public(state):
+        del state['history']
+        for key in ('rtt_ms', 'jitter_ms'):
+            if state[key] is not None:
+                state[key] = round(state[key], 1)
+        return state
+
+    def reachable(self, name):
+        """
+        Return True unless the host is known to be down.
+
+        A host that has not been probed yet is probed once inline.
+
+        Raises:
+            LookupError: If the host is not watched (any more)
+        """
+        for attempt in range(2):
+            with self._lock:
+                state = self._states.get(name)
+                current = state['state'] if state is not None else None
+            if current is None:
+                raise LookupError('Unknown device')
+            if current != 'unknown' or attempt:
+                return current != 'down'
+            self.probe(name)
+
+link_monitor = LinkMonitor(LINK_HOSTS)
+
+class Job:
+    """A long-running action executed by the JobRunner."""
+
+    def __init__(self, key, name, timeout):
+        self.id = uuid.uuid4().hex[:12]
+        self.key = key
+        self.name = name
+        self.timeout = timeout
+        self.status = 'queued'
+        self.message = None
+        self.output = ''
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.cancel_requested = False
+        self.future = None
+        self._process = None
+        self._lock = threading.Lock()
+
+    @property
+    def done(self):
+        return self.status in ('succeeded', 'failed', 'cancelled', 'timeout')
+
+    def remaining(self):
+        """Seconds left before the job times out."""
+        if self.started is None:
+            return self.timeout
+        return max(self.timeout - (time.time() - self.started), 0.1)
+
+    def attach(self, process):
+        with self._lock:
+            self._process = process
+            if process is not None and self.cancel_requested:
+                kill_process_group(process)
+
+    def add_output(self, stdout, stderr):
+        with self._lock:
+            self.output += (stdout or '') + (stderr or '')
+
+    def cancel(self):
+        with self._lock:
+            self.cancel_requested = True
+            if self._process is not None:
+                kill_process_group(self._process)
+        if self.future is not None and self.future.cancel():
+            self._finish('cancelled', 'Cancelled before it started')
+
+    def _finish(self, status, message):
+        self.status = status
+        self.message = message
+        self.finished = time.time()
+
+    def to_dict(self):
+        end = self.finished or time.time()
+        return {
+            'id': self.id,
+            'name': self.name,
+            'status': self.status,
+            'message': self.message,
+            'output': self.output,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+            'duration': round(end - self.started, 3) if self.started else None
+        }
+
+
+class JobRunner:
+    """
+    Runs long camera and ground station actions on a bounded worker pool.
+
+    Submitting returns at once with a Job. A job with the same key that is
+    still queued or running is returned instead of starting a duplicate, so
+    two clicks on reboot make one reboot. Each job gets a timeout that is
+    enforced on the processes it starts, and can be cancelled.
+    """
+
+    def __init__(self, workers):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+        self._jobs = {}
+        self._active = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key, name, func, timeout=60):
+        """
+        Queue func(job) unless an equivalent job is already pending.
+
+        Returns:
+            tuple: (job, created)
+        """
+        with self._lock:
+            existing = self._active.get(key)
+            if existing is not None and not existing.done:
+                return existing, False
+            job = Job(key, name, timeout)
+            self._jobs[job.id] = job
+            self._active[key] = job
+            finished = [j for j in self._jobs.values() if j.done]
+            for old in finished[:max(len(finished) - JOB_HISTORY, 0)]:
+                del self._jobs[old.id]
+            job.future = self._executor.submit(self._execute, job, func)
+        return job, True
+
+    def _execute(self, job, func):
+        if job.cancel_requested:
+            job._finish('cancelled', 'Cancelled before it started')
+            return
+        job.status = 'running'
+        job.started = time.time()
+        try:
+            message = func(job)
+        except subprocess.TimeoutExpired:
+            job._finish('timeout', f'Timed out after {job.timeout} seconds')
+        except subprocess.CalledProcessError as e:
+            if job.cancel_requested:
+                job._finish('cancelled', 'Cancelled while running')
+            else:
+                job._finish('failed', f'Command failed with exit status {e.returncode}')
+        except Exception as e:
+            job._finish('failed', str(e))
+        else:
+            if job.cancel_requested:
+                job._finish('cancelled', 'Cancelled while running')
+            else:
+                job._finish('succeeded', message)
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def list(self):
+        return [job.to_dict() for job in self._jobs.values()]
+
+job_runner = JobRunner(JOB_WORKERS)
+
+class DeviceRegistry:
+    """
+    Cameras (air units) and wfb-ng ground receivers managed by this station.
+
+    A device has a name, a role, an address and, for air units, an SSH user
+    and a credentials reference instead of a password: 'default' for
+    CAMERA_PASSWORD, 'env:NAME' for an environment variable starting with
+    DEVICE_CREDENTIALS_ENV_PREFIX or 'file:NAME' for a file holding the
+    password in DEVICE_CREDENTIALS_DIR. References cannot point anywhere
+    else, so a registered device can't be used to read other secrets. The camera and wfb-ng endpoint this
+    station is configured for are built in; further devices are kept in
+    DEVICES_FILE. Every device is watched by the link monitor.
+
+    run() fans an operation out over a pool of its own and reports a
+    result per device. Devices known to be down fail at once, each SSH
+    command gets the time left before DEVICE_OP_TIMEOUT and is killed when
+    it runs out, and devices that have not answered by then are reported
+    as timed out, so one slow or dead unit never holds up the others or
+    later requests.
+    """
+
+    OPERATIONS = ('load-config', 'apply-settings', 'restart-majestic')
+
+    def __init__(self, path, builtin, workers, connections=()):
+        self.path = path
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._builtin = {device['name']: self.validate(device) for device in builtin}
+        self._devices = dict(self._builtin)
+        # (host, port, user, password) -> (CameraSession, CameraConfigCache)
+        self._connections = {}
+        for session, cache in connections:
+            self._connections[(session.host, session.port, session.user, session.password)] = (session, cache)
+        for device in self._load():
+            self._devices.setdefault(device['name'], device)
+        for device in self._devices.values():
+            link_monitor.watch(device['name'], device['host'], device['port'])
+
+    @staticmethod
+    def validate(entry):
+        """
+        Check a device entry and fill in defaults.
+
+        Raises:
+            ValueError: If a field is missing or invalid
+        """
+        name = str(entry.get('name', ''))
+        if not re.fullmatch(r'[A-Za-z0-9_-]{1,32}', name):
+            raise ValueError('Device names use 1-32 letters, digits, - or _')
+        role = entry.get('role', 'air')
+        if role not in DEVICE_ROLES:
+            raise ValueError(f'Role must be one of: {", ".join(DEVICE_ROLES)}')
+        host = str(entry.get('host', ''))
+        if not re.fullmatch(r'[A-Za-z0-9.:-]+', host):
+            raise ValueError('Invalid host address')
+        try:
+            port = int(entry.get('port', 22 if role == 'air' else WFB_STATS_PORT))
+        except (TypeError, ValueError):
+            raise ValueError('Invalid port') from None
+        if not 0 < port < 65536:
+            raise ValueError('Invalid port')
+        device = {'name': name, 'role': role, 'host': host, 'port': port}
+        if role == 'air':
+            user = str(entry.get('user', CAMERA_USER))
+            if not re.fullmatch(r'[a-z_][a-z0-9_-]{0,31}', user):
+                raise ValueError('Invalid SSH user')
+            credentials = str(entry.get('credentials', 'default'))
+            kind, _, target = credentials.partition(':')
+            if credentials != 'default' and not (
+                    (kind == 'env' and re.fullmatch(re.escape(DEVICE_CREDENTIALS_ENV_PREFIX) + r'[A-Za-z0-9_]+', target))
+                    or (kind == 'file' and re.fullmatch(r'[A-Za-z0-9_-][A-Za-z0-9._-]{0,63}', target))):
+                raise ValueError(f"Credentials must be 'default', 'env:{DEVICE_CREDENTIALS_ENV_PREFIX}NAME' "
+                                 f"or 'file:NAME' for a file in {DEVICE_CREDENTIALS_DIR}")
+            device['user'] = user
+            device['credentials'] = credentials
+        return device
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                entries = json.load(f).get('devices', [])
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError, AttributeError) as e:
+            logger.error(f"Error reading device registry {self.path}: {str(e)}")
+            return []
+        devices = []
+        for entry in entries:
+            try:
+                devices.append(self.validate(entry))
+            except (ValueError, AttributeError) as e:
+                logger.warning(f"Skipping device {entry!r} in {self.path}: {str(e)}")
+        return devices
+
+    def _save(self):
+        """Write the non built-in devices; raises OSError so callers can report it."""
+        devices = [device for name, device in self._devices.items() if name not in self._builtin]
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'devices': devices}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def list(self):
+        with self._lock:
+            devices = [dict(device) for device in self._devices.values()]
+        states = link_monitor.states()
+        for device in devices:
+            device['builtin'] = device['name'] in self._builtin
+            device['link'] = states.get(device['name'])
+        return devices
+
+    def put(self, entry):
+        """Add or replace a device and return it."""
+        device = self.validate(entry)
+        with self._lock:
+            if device['name'] in self._builtin:
+                raise ValueError(f"{device['name']} is built in and configured through the environment")
+            previous = self._devices.get(device['name'])
+            self._devices[device['name']] = device
+            try:
+                self._save()
+            except OSError:
+                if previous is None:
+                    del self._devices[device['name']]
+                else:
+                    self._devices[device['name']] = previous
+                raise
+        link_monitor.watch(device['name'], device['host'], device['port'])
+        return device
+
+    def remove(self, name):
+        """
+        Remove a device.
+
+        Returns:
+            bool: False if there is no such device
+        """
+        with self._lock:
+            if name in self._builtin:
+                raise ValueError(f'{name} is built in and cannot be removed')
+            device = self._devices.pop(name, None)
+            if device is None:
+                return False
+            try:
+                self._save()
+            except OSError:
+                self._devices[name] = device
+                raise
+        link_monitor.unwatch(name)
+        return True
+
+    @staticmethod
+    def password(device):
+        reference = device['credentials']
+        if reference == 'default':
+            return CAMERA_PASSWORD
+        kind, _, target = reference.partition(':')
+        if kind == 'env':
+            if target not in os.environ:
+                raise LookupError(f"Credentials for {device['name']} are not set")
+            return os.environ[target]
+        try:
+            with open(os.path.join(DEVICE_CREDENTIALS_DIR, target)) as f:
+                return f.read().rstrip('\n')
+        except OSError as e:
+            logger.warning(f"Cannot read credentials of device {device['name']}: {str(e)}")
+            raise LookupError(f"Cannot read credentials for {device['name']}") from None
+
+    def connection(self, device):
+        """Return the (CameraSession, CameraConfigCache) pair of an air unit."""
+        key = (device['host'], device['port'], device['user'], self.password(device))
+        with self._lock:
+            connection = self._connections.get(key)
+            if connection is None:
+                session = CameraSession(device['host'], device['user'], key[3], port=device['port'])
+                connection = (session, CameraConfigCache(CAMERA_CONFIG_FILES, session))
+                self._connections[key] = connection
+        return connection
+
+    def run(self, op, names=None, params=None):
+        """
+        Run an operation on several devices in parallel.
+
+        Args:
+            op (str): One of OPERATIONS
+            names (list): Device names, all air units if None
+            params: Operation argument, the validated changes for apply-settings
+
+        Returns:
+            dict: {name: {'success': bool, 'data' or 'message': ..., 'ms': float}}
+        """
+        with self._lock:
+            if names is None:
+                targets = {name: device for name, device in self._devices.items() if device['role'] == 'air'}
+            else:
+                targets = {name: self._devices.get(name) for name in dict.fromkeys(names)}
+        deadline = time.monotonic() + DEVICE_OP_TIMEOUT
+        results = {}
+        futures = {}
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='device')
+        for name, device in targets.items():
+            if device is None:
+                results[name] = {'success': False, 'message': 'Unknown device', 'ms': 0.0}
+            else:
+                futures[name] = executor.submit(self._run_one, op, device, params, deadline)
+        # Workers kill their SSH commands at the deadline; the grace lets them report it
+        wait(futures.values(), timeout=DEVICE_OP_TIMEOUT + DEVICE_OP_GRACE)
+        executor.shutdown(wait=False, cancel_futures=True)
+        for name, future in futures.items():
+            if future.done():
+                results[name] = future.result()
+            else:
+                results[name] = {'success': False, 'message': f'No answer within {DEVICE_OP_TIMEOUT} seconds',
+                                 'ms': round(DEVICE_OP_TIMEOUT * 1000, 1)}
+                metrics.inc('webui_device_operations_total', (('op', op), ('outcome', 'timeout')))
+        return results
+
+    def _run_one(self, op, device, params, deadline):
+        started = time.monotonic()
+        outcome = 'failed'
+        try:
+            if device['role'] != 'air':
+                outcome = 'skipped'
+                result = {'success': False, 'message': f"{op} is not supported on {device['role']} devices"}
+            elif not link_monitor.reachable(device['name']):
+                outcome = 'unreachable'
+                result = {'success': False, 'message': 'Device is not reachable'}
+            else:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    raise subprocess.TimeoutExpired(op, 0)
+                session, cache = self.connection(device)
+                if op == 'load-config':
+                    data = cache.get(timeout=timeout)[0]
+                elif op == 'apply-settings':
+                    data = {'fields': apply_camera_changes(params, session, cache, deadline)}
+                else:
+                    session.run('/etc/init.d/S95majestic restart', op='restart_majestic', timeout=timeout, retry=False)
+                    data = 'Majestic service restarted successfully'
+                outcome = 'ok'
+                result = {'success': True, 'data': data}
+        except subprocess.TimeoutExpired:
+            outcome = 'timeout'
+            result = {'success': False, 'message': 'Timed out'}
+        except TimeoutError as e:
+            outcome = 'timeout'
+            result = {'success': False, 'message': str(e)}
+        except subprocess.CalledProcessError as e:
+            result = {'success': False, 'message': f'Command failed with exit status {e.returncode}'}
+        except (LookupError, ValueError, OSError, yaml.YAMLError) as e:
+            record_error(e)
+            result = {'success': False, 'message': str(e)}
+        result['ms'] = round((time.monotonic() - started) * 1000, 1)
+        metrics.inc('webui_device_operations_total', (('op', op), ('outcome', outcome)))
+        return result
+
+device_registry = DeviceRegistry(
+    DEVICES_FILE,
+    [
+        {'name': 'camera', 'role': 'air', 'host': CAMERA_HOST, 'user': CAMERA_USER},
+        {'name': 'wfb', 'role': 'ground', 'host': WFB_STATS_HOST, 'port': WFB_STATS_PORT}
+    ],
+    DEVICE_WORKERS,
+    connections=[(camera_session, camera_config_cache)]
+)
+
+class StatsCollector:
+    """
+    Background reader for the wfb-ng JSON stats stream.
+
+    A single daemon thread keeps one TCP connection to the stats port open,
+    parses the newline-delimited JSON records as they arrive and remembers
+    the latest record of each message type. Routes read from memory instead
+    of opening their own connection. Listeners registered with
+    add_listener() are called from the collector thread for every record.
+
+    Args:
+        host (str): wfb-ng stats host
+        port (int): wfb-ng JSON stats port
+        connect_timeout (float): Timeout for the TCP connect in seconds
+        read_timeout (float): Socket is recycled after this long without data
+        max_backoff (float): Upper bound of the reconnect delay in seconds
+    """
+
+    def __init__(self, host, port, connect_timeout=2, read_timeout=10, max_backoff=10):
+        self.host = host
+        self.port = port
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_backoff = max_backoff
+        self.connected = False
+        self.last_error = None
+        self.last_rx_time = 0.0
+        self._latest = {}
+        self._latest_rx = None
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """Start the collector thread if it is not running yet."""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='wfb-stats', daemon=True)
+                self._thread.start()
+
+    def add_listener(self, callback):
+        """Register callback(record) to be called for every parsed record."""
+        with self._lock:
+            self._listeners.append(callback)
+
+    def latest(self, msg_type):
+        """Return the most recent record of the given type or None."""
+        return self._latest.get(msg_type)
+
+    def latest_rx(self):
+        """Return the most recent rx record that carried antenna stats."""
+        return self._latest_rx
+
+    def _run(self):
+        backoff = 0.5
+        while True:
+            try:
+                with socket.create_connection((self.host, self.port), timeout=self.connect_timeout) as sock:
+                    sock.settimeout(self.read_timeout)
+                    self.connected = True
+                    self.last_error = None
+                    backoff = 0.5
+                    self._read_stream(sock)
+                self.last_error = 'Connection closed by stats endpoint'
+            except OSError as e:
+                self.last_error = str(e)
+            self.connected = False
+            time.sleep(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    def _read_stream(self, sock):
+        stream = sock.makefile('rb')
+        for line in stream:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                logger.warning(f"Skipping invalid stats line: {line[:200]!r}")
+                continue
+            if isinstance(record, dict):
+                self._dispatch(record)
+
+    def _dispatch(self, record):
+        msg_type = record.get('type')
+        self._latest[msg_type] = record
+        if msg_type == 'rx' and record.get('rx_ant_stats'):
+            self._latest_rx = record
+            self.last_rx_time = time.time()
+        for callback in self._listeners:
+            try:
+                callback(record)
+            except Exception as e:
+                logger.exception(f"Stats listener error: {str(e)}")
+
+stats_collector = StatsCollector(WFB_STATS_HOST, WFB_STATS_PORT)
+
+class RssiBroadcaster:
+    """
+    Fans rx_ant_stats updates from the stats collector out to stream clients.
+
+    Only the newest rx record is kept; every client waits on a shared
+    condition and picks up whatever is current when it wakes, so slow or
+    rate-limited clients skip intermediate updates instead of queueing them.
+    """
+
+    ANTENNA_FIELDS = ('rssi_min', 'rssi_avg', 'rssi_max', 'snr_min', 'snr_avg', 'snr_max', 'pkt_recv', 'mcs', 'bw')
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._record = None
+        self._seq = 0
+
+    def publish(self, record):
+        if record.get('type') != 'rx' or not record.get('rx_ant_stats'):
+            return
+        with self._cond:
+            self._record = record
+            self._seq += 1
+            self._cond.notify_all()
+
+    def wait(self, last_seq, timeout):
+        """
+        Block until a record newer than last_seq is available.
+
+        Returns:
+            tuple: (seq, record), record is None on timeout
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq != last_seq, timeout=timeout):
+                return last_seq, None
+            return self._seq, self._record
+
+    @classmethod
+    def encode_delta(cls, state, record):
+        """
+        Build a compact frame holding only the antenna fields that changed.
+
+        A frame is produced for every update, even if no field changed, so
+        clients can still advance their time axis.
+
+        Args:
+            state (dict): Antenna values last sent to this client, updated in place
+            record (dict): wfb-ng rx record
+
+        Returns:
+            dict: Frame with timestamp 't', changed antennas 'a' and removed antennas 'r'
+        """
+        changed = {}
+        seen = set()
+        for ant in record.get('rx_ant_stats', []):
+            key = f"{ant.get('freq')}:{ant.get('ant')}"
+            seen.add(key)
+            previous = state.setdefault(key, {})
+            fields = {}
+            for field in cls.ANTENNA_FIELDS:
+                if field in ant and previous.get(field) != ant[field]:
+                    fields[field] = previous[field] = ant[field]
+            if fields:
+                changed[key] = fields
+        removed = [key for key in state if key not in seen]
+        for key in removed:
+            del state[key]
+
+        frame = {'t': round(record.get('timestamp') or time.time(), 3), 'a': changed}
+        if removed:
+            frame['r'] = removed
+        return frame
+
+    def stream(self, interval):
+        """
+        Generate Server-Sent Events for one client.
+
+        Args:
+            interval (float): Minimum seconds between frames, None for every update
+        """
+        state = {}
+        last_seq = 0
+        yield 'retry: 2000\n\n'
+        while True:
+            started = time.monotonic()
+            last_seq, record = self.wait(last_seq, RSSI_STREAM_KEEPALIVE)
+            if record is None:
+                yield ': keepalive\n\n'
+                continue
+            frame = self.encode_delta(state, record)
+            yield f"data: {json.dumps(frame, separators=(',', ':'))}\n\n"
+            if interval:
+                remaining = interval - (time.monotonic() - started)
+                if remaining > 0:
+                    time.sleep(remaining)
+
+rssi_broadcaster = RssiBroadcaster()
+stats_collector.add_listener(rssi_broadcaster.publish)
+
+class EventStreams:
+    """
+    Caps the number of Server-Sent Event streams open at once.
+
+    A stream holds a server thread for as long as its client stays
+    connected, so without a cap a few dashboards and log tabs would take
+    every thread and stall all other routes. A stream past the cap is
+    answered with 503 and Retry-After. The slot is given back when the
+    server closes the response, whether or not it was ever iterated.
+    """
+
+    class _Held:
+        def __init__(self, owner, generator):
+            self.owner = owner
+            self.generator = generator
+            self.released = False
+
+        def __iter__(self):
+            return self.generator
+
+        def close(self):
+            if not self.released:
+                self.released = True
+                self.owner._release()
+            self.generator.close()
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._open = 0
+        self._lock = threading.Lock()
+
+    def response(self, generator):
+        """Return a text/event-stream Response for generator, or a 503 if every slot is taken."""
+        with self._lock:
+            full = self._open >= self.limit
+            if not full:
+                self._open += 1
+        if full:
+            generator.close()
+            metrics.inc('webui_sse_rejected_total')
+            return jsonify({
+                'success': False,
+                'message': 'Too many live streams are open, close another tab and try again'
+            }), 503, {'Retry-After': '5'}
+        metrics.inc('webui_sse_streams_open')
+        return Response(
+            self._Held(self, generator),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+
+    def _release(self):
+        with self._lock:
+            self._open -= 1
+        metrics.inc('webui_sse_streams_open', amount=-1)
+
+event_streams = EventStreams(SSE_MAX_STREAMS)
+
+class LogFollower:
+    """
+    Shared follower of one service log, fanned out to every viewer.
+
+    Journal sources run one `journalctl -o json -f` on the ground station,
+    camera sources one `logread -f` over the camera's SSH connection. Only
+    new lines are read: a restarted journalctl resumes after the last
+    __CURSOR it delivered, and a restarted logread skips the lines of its
+    buffer replay that were already delivered, up to the first one that
+    was not. Camera timestamps are not compared, since the clock restarts
+    when the camera reboots. The newest LOG_TAIL_LINES entries
+    are kept in memory with increasing sequence numbers, and viewers wait
+    on a shared condition for entries past the last one they got. The
+    process runs while someone is watching and is stopped LOG_IDLE_STOP
+    seconds after the last viewer left.
+
+    Args:
+        name (str): Source name
+        kind (str): 'journal' or 'camera'
+        target: Unit names for journal sources, the syslog tag for camera sources
+    """
+
+    SYSLOG_LINE = re.compile(
+        r'^(?P<month>[A-Z][a-z]{2}) +(?P<day>\d+) (?P<time>\d\d:\d\d:\d\d) \S+ '
+        r'(?:\w+\.(?P<level>\w+) )?(?P<tag>[^:\[\s]+)(?:\[\d+\])?: ?(?P<message>.*)$'
+    )
+    # BusyBox syslogd spellings of some severities
+    LEVEL_ALIASES = {'warn': 'warning', 'error': 'err', 'panic': 'emerg'}
+
+    def __init__(self, name, kind, target):
+        self.name = name
+        self.kind = kind
+        self.target = target
+        self.state = 'stopped'
+        self.error = None
+        self._entries = deque(maxlen=LOG_TAIL_LINES)
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._thread = None
+        self._viewers = 0
+        self._last_used = 0.0
+        # journalctl __CURSOR of the last delivered entry
+        self._cursor = None
+        # Recently delivered camera lines, and whether logread is still replaying its buffer
+        self._recent = OrderedDict()
+        self._replaying = False
+
+    def _active(self):
+        return self._viewers > 0 or time.monotonic() - self._last_used < LOG_IDLE_STOP
+
+    def touch(self):
+        """Mark the source as in use and start following it if it is not already."""
+        with self._cond:
+            self._last_used = time.monotonic()
+            if self._thread is None:
+                self._set_state('starting')
+                self._thread = threading.Thread(target=self._run, name=f'log-{self.name}', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        delay = LOG_RESTART_DELAY[0]
+        while True:
+            with self._cond:
+                if not self._active():
+                    self._thread = None
+                    self._set_state('stopped')
+                    return
+            started = time.monotonic()
+            try:
+                self._follow()
+            except (OSError, subprocess.SubprocessError) as e:
+                self.error = str(e)
+                logger.warning(f"Log follower {self.name} failed: {str(e)}")
+            if time.monotonic() - started > LOG_RESTART_DELAY[1]:
+                delay = LOG_RESTART_DELAY[0]
+            with self._cond:
+                if self._active():
+                    self._set_state('restarting')
+            time.sleep(delay)
+            delay = min(delay * 2, LOG_RESTART_DELAY[1])
+
+    def _start(self):
+        if self.kind == 'journal':
+            args = ['journalctl', '--no-pager', '--output=json', '--follow']
+            for unit in self.target:
+                args += ['--unit', unit]
+            if self._cursor:
+                args.append(f'--after-cursor={self._cursor}')
+            else:
+                args.append(f'--lines={LOG_TAIL_LINES}')
+            return subprocess.Popen(args, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                    stderr=subprocess.DEVNULL, start_new_session=True)
+        self._replaying = True
+        return camera_session.popen('logread -f')
+
+    def _follow(self):
+        process = self._start()
+        metrics.inc('webui_log_follower_starts_total', (('source', self.name),))
+        with self._cond:
+            self._set_state('following')
+        self.error = None
+        fd = process.stdout.fileno()
+        pending = b''
+        try:
+            while True:
+                with self._cond:
+                    if not self._active():
+                        return
+                ready, _, _ = select.select([fd], [], [], 1.0)
+                if not ready:
+                    continue
+                chunk = os.read(fd, 65536)
+                if not chunk:
+                    break
+                *lines, pending = (pending + chunk).split(b'\n')
+                entries = [entry for entry in map(self._parse, lines) if entry is not None]
+                if entries:
+                    self._publish(entries)
+        finally:
+            kill_process_group(process)
+            process.stdout.close()
+            process.wait()
+        if process.returncode:
+            self.error = f'{os.path.basename(process.args[0])} exited with status {process.returncode}'
+            logger.warning(f"Log follower {self.name}: {self.error}")
+
+    def _parse(self, line):
+        line = line.decode('utf-8', 'replace').rstrip('\r')
+        if not line.strip():
+            return None
+        if self.kind == 'journal':
+            try:
+                record = json.loads(line)
+            except ValueError:
+                return None
+            self._cursor = record.get('__CURSOR', self._cursor)
+            message = record.get('MESSAGE', '')
+            if isinstance(message, list):
+                # Journald sends non-UTF-8 messages as a byte array
+                message = bytes(message).decode('utf-8', 'replace')
+            try:
+                priority = int(record.get('PRIORITY', 6))
+                timestamp = int(record['__REALTIME_TIMESTAMP']) / 1e6
+            except (KeyError, ValueError):
+                priority, timestamp = 6, time.time()
+            unit = record.get('_SYSTEMD_UNIT') or record.get('SYSLOG_IDENTIFIER')
+            return {'t': timestamp, 'priority': min(max(priority, 0), 7), 'unit': unit, 'message': message}
+
+        match = self.SYSLOG_LINE.match(line)
+        if match is None or not match.group('tag').startswith(self.target):
+            return None
+        # logread -f starts by printing its whole buffer; once a line in it was
+        # not delivered before, everything after it is new as well
+        if self._replaying and line in self._recent:
+            return None
+        self._replaying = False
+        self._recent[line] = None
+        self._recent.move_to_end(line)
+        if len(self._recent) > LOG_TAIL_LINES:
+            self._recent.popitem(last=False)
+        level = self.LEVEL_ALIASES.get(match.group('level'), match.group('level'))
+        priority = LOG_LEVELS.index(level) if level in LOG_LEVELS else 6
+        # The camera clock is often unset, so entries are stamped on arrival
+        return {'t': time.time(), 'priority': priority, 'unit': match.group('tag'), 'message': match.group('message')}
+
+    def _set_state(self, state):
+        """Change state and wake viewers; call with the condition held."""
+        if state != self.state:
+            self.state = state
+            self._cond.notify_all()
+
+    def _publish(self, entries):
+        with self._cond:
+            for entry in entries:
+                self._seq += 1
+                entry['seq'] = self._seq
+                entry['level'] = LOG_LEVELS[entry['priority']]
+                self._entries.append(entry)
+            self._cond.notify_all()
+
+    def _after(self, seq):
+        """Entries newer than seq and how many of them already left the tail; call with the condition held."""
+        first = self._seq - len(self._entries) + 1
+        skip = max(seq + 1 - first, 0)
+        return list(itertools.islice(self._entries, skip, None)), max(first - seq - 1, 0)
+
+    def tail(self, count):
+        self.touch()
+        with self._cond:
+            return list(self._entries)[-count:] if count else []
+
+    def stream(self, match, last_id=None, backlog=LOG_STREAM_BACKLOG):
+        """
+        Generate Server-Sent Events for one viewer.
+
+        Args:
+            match (callable): Filter applied to each entry
+            last_id (int): Last-Event-ID of a reconnecting viewer
+            backlog (int): Entries from the tail sent to a new viewer
+        """
+        self.touch()
+        with self._cond:
+            self._viewers += 1
+            if last_id is None or last_id > self._seq:
+                last_id = max(self._seq - backlog, self._seq - len(self._entries))
+        state = None
+        try:
+            yield 'retry: 2000\n\n'
+            last_write = time.monotonic()
+            while True:
+                with self._cond:
+                    self._cond.wait_for(lambda: self._seq != last_id or self.state != state,
+                                        timeout=RSSI_STREAM_KEEPALIVE)
+                    entries, dropped = self._after(last_id)
+                    last_id = self._seq
+                    current = (self.state, self.error)
+                events = []
+                if current[0] != state:
+                    state = current[0]
+                    events.append(f"event: status\ndata: {json.dumps({'state': current[0], 'error': current[1]})}\n\n")
+                if dropped:
+                    events.append(f"event: gap\ndata: {json.dumps({'dropped': dropped})}\n\n")
+                events.extend(f"id: {entry['seq']}\ndata: {json.dumps(entry, separators=(',', ':'))}\n\n"
+                              for entry in entries if match(entry))
+                # Filtered-out entries don't count, so a gone viewer is still noticed
+                if events:
+                    yield ''.join(events)
+                    last_write = time.monotonic()
+                elif time.monotonic() - last_write >= RSSI_STREAM_KEEPALIVE:
+                    yield ': keepalive\n\n'
+                    last_write = time.monotonic()
+        finally:
+            with self._cond:
+                self._viewers -= 1
+                self._last_used = time.monotonic()
+
+    def status(self):
+        with self._cond:
+            return {
+                'name': self.name,
+                'kind': self.kind,
+                'state': self.state,
+                'error': self.error,
+                'viewers': self._viewers,
+                'lines': len(self._entries),
+                'last_seq': self._seq
+            }
+
+log_followers = {name: LogFollower(name, kind, target) for name, (kind, target) in LOG_SOURCES.items()}
+
+def log_filter(args):
+    """
+    Build the entry filter for ?q= (regular expression) and ?level= (maximum severity).
+
+    Raises:
+        ValueError: If the expression or level is invalid
+    """
+    pattern = args.get('q', '')
+    level = args.get('level', 'debug')
+    if level not in LOG_LEVELS:
+        raise ValueError(f"Invalid level, expected one of: {', '.join(LOG_LEVELS)}")
+    if len(pattern) > LOG_FILTER_MAX_LENGTH:
+        raise ValueError(f'Filter is longer than {LOG_FILTER_MAX_LENGTH} characters')
+    try:
+        search = re.compile(pattern, re.IGNORECASE).search if pattern else None
+    except re.error as e:
+        raise ValueError(f'Invalid filter: {e}') from None
+    max_priority = LOG_LEVELS.index(level)
+    return lambda entry: entry['priority'] <= max_priority and (search is None or search(entry['message']) is not None)
+
+class HistoryTier:
+    """
+    Fixed-size ring buffer of samples at one resolution.
+
+    Timestamps live in an array('d') and every column (one per antenna and
+    metric) in its own array('f') of the same capacity, so memory use is
+    fixed once the set of antennas is known. Missing values are NaN.
+    """
+
+    def __init__(self, resolution, capacity):
+        self.resolution = resolution
+        self.capacity = capacity
+        self.times = array('d', [math.nan]) * capacity
+        self.columns = {}
+        self.pos = 0
+        self.count = 0
+        # Pending bucket for rolled-up tiers: column -> [aggregate, samples]
+        self._bucket_start = None
+        self._bucket = {}
+
+    def append(self, timestamp, values):
+        for column in values:
+            if column not in self.columns:
+                self.columns[column] = array('f', [math.nan]) * self.capacity
+        self.times[self.pos] = timestamp
+        for column, data in self.columns.items():
+            data[self.pos] = values.get(column, math.nan)
+        self.pos = (self.pos + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def add(self, timestamp, values):
+        """Add a raw sample, rolling it up into this tier's bucket size."""
+        if not self.resolution:
+            self.append(timestamp, values)
+            return
+
+        bucket_start = timestamp - timestamp % self.resolution
+        if self._bucket_start is not None and bucket_start != self._bucket_start:
+            self.flush()
+        self._bucket_start = bucket_start
+        for column, value in values.items():
+            kind = HistoryStore.aggregate_kind(column)
+            entry = self._bucket.get(column)
+            if entry is None:
+                self._bucket[column] = [value, 1]
+            elif kind == 'min':
+                entry[0] = min(entry[0], value)
+            elif kind == 'max':
+                entry[0] = max(entry[0], value)
+            else:
+                entry[0] += value
+                entry[1] += 1
+
+    def flush(self):
+        if self._bucket_start is None:
+            return
+        values = {}
+        for column, (aggregate, samples) in self._bucket.items():
+            if HistoryStore.aggregate_kind(column) == 'mean':
+                aggregate /= samples
+            values[column] = aggregate
+        self.append(self._bucket_start, values)
+        self._bucket_start = None
+        self._bucket = {}
+
+    def oldest(self):
+        if not self.count:
+            return None
+        return self.times[(self.pos - self.count) % self.capacity]
+
+    def _ordered(self, data):
+        """Return the column in chronological order."""
+        if self.count < self.capacity:
+            return data[:self.count]
+        return data[self.pos:] + data[:self.pos]
+
+    def window(self, start, end, columns):
+        """
+        Return timestamps and the requested columns between start and end.
+
+        Returns:
+            tuple: (times, {column: values}) as arrays
+        """
+        times = self._ordered(self.times)
+        lo = bisect.bisect_left(times, start)
+        hi = bisect.bisect_right(times, end)
+        result = {}
+        for column in columns:
+            if column in self.columns:
+                result[column] = self._ordered(self.columns[column])[lo:hi]
+        return times[lo:hi], result
+
+
+class HistoryStore:
+    """
+    Server-side RSSI/SNR history kept at several resolutions.
+
+    Every rx record is written to the raw tier and rolled up into the
+    coarser tiers (mean for averages and SNR, min/max for the extremes,
+    sum for packet counters). Queries pick the finest tier that still
+    covers the requested window and decimate it to the requested size.
+    """
+
+    def __init__(self, tiers):
+        self.tiers = [HistoryTier(resolution, capacity) for resolution, capacity in tiers]
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def aggregate_kind(column):
+        metric = column.rsplit('/', 1)[-1]
+        if metric.endswith('_min'):
+            return 'min'
+        if metric.endswith('_max'):
+            return 'max'
+        if column.startswith('packets/') or metric == 'pkt_recv':
+            return 'sum'
+        return 'mean'
+
+    @staticmethod
+    def record_values(record):
+        """Flatten an rx record into {column: value}."""
+        values = {}
+        for ant in record.get('rx_ant_stats', []):
+            key = f"{ant.get('freq')}:{ant.get('ant')}"
+            for metric in RSSI_HISTORY_METRICS:
+                if metric in ant:
+                    values[f'{key}/{metric}'] = ant[metric]
+        packets = record.get('packets') or {}
+        for counter in RSSI_HISTORY_PACKETS:
+            if counter in packets:
+                values[f'packets/{counter}'] = packets[counter][0]
+        return values
+
+    def add_record(self, record, timestamp=None):
+        if record.get('type') != 'rx' or not record.get('rx_ant_stats'):
+            return
+        self.add_values(time.time() if timestamp is None else timestamp, self.record_values(record))
+
+    def add_values(self, timestamp, values):
+        """Add one sample of {column: value}, columns named 'source/metric'."""
+        with self._lock:
+            for tier in self.tiers:
+                tier.add(timestamp, values)
+
+    def query(self, start, end, points, metrics, mode='lttb'):
+        """
+        Return decimated series for the given window.
+
+        Args:
+            start (float): Window start as unix time
+            end (float): Window end as unix time
+            points (int): Maximum points per series
+            metrics (list): Metric names, e.g. rssi_avg or packets/lost
+            mode (str): 'lttb' or 'minmax'
+
+        Returns:
+            dict: Resolution used and {metric: {source: [[t, v], ...]}}
+        """
+        with self._lock:
+            tier = self.tiers[-1]
+            for candidate in self.tiers:
+                oldest = candidate.oldest()
+                if oldest is not None and oldest <= start:
+                    tier = candidate
+                    break
+            columns = [column for column in tier.columns
+                       if column.split('/', 1)[1] in metrics or column in metrics]
+            times, data = tier.window(start, end, columns)
+
+        series = {}
+        for column, values in data.items():
+            source, metric = column.split('/', 1)
+            if source == 'packets':
+                source, metric = 'link', column
+            pairs = [(t, v) for t, v in zip(times, values) if not math.isnan(v)]
+            if mode == 'minmax':
+                pairs = decimate_minmax(pairs, points)
+            else:
+                pairs = decimate_lttb(pairs, points)
+            series.setdefault(metric, {})[source] = [[round(t, 3), round(v, 2)] for t, v in pairs]
+        return {'resolution': tier.resolution, 'series': series}
+
+
+def decimate_lttb(pairs, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+
+    Args:
+        pairs (list): (t, v) tuples in time order
+        threshold (int): Number of points to keep
+
+    Returns:
+        list: Selected (t, v) tuples
+    """
+    length = len(pairs)
+    if threshold >= length or threshold < 3:
+        return pairs
+
+    sampled = [pairs[0]]
+    every = (length - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # Average of the next bucket is the third triangle corner
+        avg_start = int((i + 1) * every) + 1
+        avg_end = min(int((i + 2) * every) + 1, length)
+        avg_t = avg_v = 0.0
+        for t, v in pairs[avg_start:avg_end]:
+            avg_t += t
+            avg_v += v
+        avg_len = max(avg_end - avg_start, 1)
+        avg_t /= avg_len
+        avg_v /= avg_len
+
+        range_start = int(i * every) + 1
+        range_end = int((i + 1) * every) + 1
+        a_t, a_v = pairs[a]
+        max_area = -1.0
+        next_a = range_start
+        for j in range(range_start, range_end):
+            t, v = pairs[j]
+            area = abs((a_t - avg_t) * (v - a_v) - (a_t - t) * (avg_v - a_v))
+            if area > max_area:
+                max_area = area
+                next_a = j
+        sampled.append(pairs[next_a])
+        a = next_a
+
+    sampled.append(pairs[-1])
+    return sampled
+
+
+def decimate_minmax(pairs, threshold):
+    """
+    Keep the minimum and maximum of each bucket, in time order.
+
+    Args:
+        pairs (list): (t, v) tuples in time order
+        threshold (int): Number of points to keep (two per bucket)
+
+    Returns:
+        list: Selected (t, v) tuples
+    """
+    length = len(pairs)
+    if threshold >= length or threshold < 2:
+        return pairs
+
+    buckets = threshold // 2
+    sampled = []
+    for i in range(buckets):
+        bucket = pairs[i * length // buckets:(i + 1) * length // buckets]
+        if not bucket:
+            continue
+        low = min(bucket, key=lambda p: p[1])
+        high = max(bucket, key=lambda p: p[1])
+        sampled.extend(sorted({low, high}))
+    return sampled
+
+rssi_history = HistoryStore(RSSI_HISTORY_TIERS)
+stats_collector.add_listener(rssi_history.add_record)
+
+def histogram_percentiles(histogram, percentiles):
+    """
+    Nearest-rank percentiles of a {value: count} histogram.
+
+    Returns:
+        dict: {'p<n>': value}, values are None for an empty histogram
+    """
+    total = sum(histogram.values())
+    result = {f'p{p}': None for p in percentiles}
+    if not total:
+        return result
+    ranks = sorted((max(math.ceil(p / 100 * total), 1), f'p{p}') for p in percentiles)
+    seen = 0
+    index = 0
+    for value in sorted(histogram):
+        seen += histogram[value]
+        while index < len(ranks) and ranks[index][0] <= seen:
+            result[ranks[index][1]] = value
+            index += 1
+    return result
+
+
+class LinkAnalytics:
+    """
+    Rolling link-quality aggregates over several time windows.
+
+    Every rx record is folded into the counters of the current second.
+    When a second closes its counters are added to each window, and the
+    second that dropped out of a window is subtracted again, so the work
+    per record depends on the number of antennas and never on the window
+    length. RSSI and SNR distributions are 1 dB histograms: unlike most
+    quantile sketches they can be subtracted when a second expires, and
+    wfb-ng reports whole dB anyway. Snapshots cover the completed seconds
+    and are built at most once per second, however many clients ask.
+
+    Args:
+        windows (tuple): (name, seconds) pairs
+        percentiles (tuple): Percentiles reported for RSSI and SNR
+    """
+
+    def __init__(self, windows, percentiles):
+        self.percentiles = percentiles
+        self._windows = [(name, seconds, deque(), Counter()) for name, seconds in windows]
+        self._first = None
+        self._second = None
+        self._slot = Counter()
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def add_record(self, record, timestamp=None):
+        if record.get('type') != 'rx' or not record.get('rx_ant_stats'):
+            return
+        second = int(time.time() if timestamp is None else timestamp)
+        with self._lock:
+            self._advance(second)
+            slot = self._slot
+            slot['records'] += 1
+            packets = record.get('packets') or {}
+            for counter in RSSI_HISTORY_PACKETS:
+                counts = packets.get(counter)
+                if isinstance(counts, list) and counts:
+                    slot[('packets', counter)] += counts[0]
+
+            best = None
+            for ant in record['rx_ant_stats']:
+                if ant.get('rssi_avg') is None:
+                    continue
+                key = f"{ant.get('freq')}:{ant.get('ant')}"
+                rssi = round(ant['rssi_avg'])
+                slot[('samples', key)] += 1
+                slot[('rssi_sum', key)] += rssi
+                slot[('rssi', key, rssi)] += 1
+                if ant.get('snr_avg') is not None:
+                    slot[('snr', key, round(ant['snr_avg']))] += 1
+                if best is None or rssi > best[1]:
+                    best = (key, rssi, ant.get('pkt_recv') or 0)
+            if best is not None:
+                key, rssi, received = best
+                slot[('best', key)] += received
+                slot['best_samples'] += 1
+                slot['best_rssi_sum'] += rssi
+                slot[('best_rssi', rssi)] += 1
+
+    def _advance(self, second):
+        """Close the current second once time has moved past it and expire old ones."""
+        if self._second is None:
+            self._first = self._second = second
+            return
+        if second <= self._second:
+            return
+        if self._slot:
+            for _, _, slots, totals in self._windows:
+                slots.append((self._second, self._slot))
+                totals.update(self._slot)
+        for _, seconds, slots, totals in self._windows:
+            while slots and slots[0][0] < second - seconds:
+                for key, value in slots.popleft()[1].items():
+                    remaining = totals[key] - value
+                    if remaining:
+                        totals[key] = remaining
+                    else:
+                        del totals[key]
+        self._second = second
+        self._slot = Counter()
+        self._snapshot = None
+
+    def snapshot(self, now=None):
+        """
+        Return the aggregates for every window, up to the last complete second.
+
+        Returns:
+            dict: 'time' of the end of the windows and 'windows' by name
+        """
+        with self._lock:
+            self._advance(int(time.time() if now is None else now))
+            if self._snapshot is None:
+                self._snapshot = {
+                    'time': self._second,
+                    'windows': {name: self._summarize(seconds, totals)
+                                for name, seconds, _, totals in self._windows}
+                }
+            return self._snapshot
+
+    def _summarize(self, seconds, totals):
+        span = min(seconds, self._second - self._first)
+        antennas = {}
+        best_rssi = {}
+        for key, value in totals.items():
+            if isinstance(key, str):
+                continue
+            if key[0] in ('rssi', 'snr'):
+                antennas.setdefault(key[1], {'rssi': {}, 'snr': {}})[key[0]][key[2]] = value
+            elif key[0] == 'best_rssi':
+                best_rssi[key[1]] = value
+            elif key[0] == 'samples':
+                antennas.setdefault(key[1], {'rssi': {}, 'snr': {}})
+
+        received = sum(totals[('best', key)] for key in antennas)
+        summary = {}
+        for key in sorted(antennas, key=lambda key: tuple(int(part) if part.isdigit() else 0 for part in key.split(':'))):
+            samples = totals[('samples', key)]
+            summary[key] = {
+                'samples': samples,
+                'rssi_mean': round(totals[('rssi_sum', key)] / samples, 2) if samples else None,
+                'best_share': round(totals[('best', key)] / received, 4) if received else None,
+                'rssi': histogram_percentiles(antennas[key]['rssi'], self.percentiles),
+                'snr': histogram_percentiles(antennas[key]['snr'], self.percentiles)
+            }
+
+        # Selection diversity gain: the best antenna per update versus the best single antenna
+        means = [entry['rssi_mean'] for entry in summary.values() if entry['rssi_mean'] is not None]
+        best_samples = totals['best_samples']
+        gain = None
+        if best_samples and means:
+            gain = round(totals['best_rssi_sum'] / best_samples - max(means), 2)
+
+        all_packets = totals[('packets', 'all')]
+        lost = totals[('packets', 'lost')]
+        fec_rec = totals[('packets', 'fec_rec')]
+        return {
+            'seconds': seconds,
+            'span': span,
+            'records': totals['records'],
+            'packets_per_s': round(all_packets / span, 2) if span else None,
+            'fec_rec_per_s': round(fec_rec / span, 2) if span else None,
+            'lost_per_s': round(lost / span, 2) if span else None,
+            'loss_ratio': round(lost / all_packets, 4) if all_packets else None,
+            'fec_ratio': round(fec_rec / all_packets, 4) if all_packets else None,
+            'best_rssi': histogram_percentiles(best_rssi, self.percentiles),
+            'diversity_gain_db': gain,
+            'antennas': summary
+        }
+
+link_analytics = LinkAnalytics(LINK_ANALYTICS_WINDOWS, LINK_ANALYTICS_PERCENTILES)
+stats_collector.add_listener(link_analytics.add_record)
+
+class SystemSampler:
+    """
+    Low-overhead sampler of ground station CPU, memory, disk, thermal and NIC load.
+
+    Everything is read straight from /proc and /sys with no subprocesses:
+    each file is opened once and re-read with pread() at offset 0, so a
+    sample is a handful of system calls and some parsing. Samples are
+    taken on whole wall-clock seconds, the same bucket boundaries as the
+    1 second RSSI tier, and stored in a HistoryStore so system load can be
+    overlaid on link quality point for point. Counters become rates over
+    the actual time between samples. Disks, thermal zones, CPU frequency
+    policies and wireless interfaces are rediscovered every
+    SYSTEM_RESCAN_INTERVAL seconds, which picks up USB adapters plugged in
+    after boot; only the files that appeared or went away are opened or
+    closed then.
+    """
+
+    PROC_FILES = ('/proc/stat', '/proc/meminfo', '/proc/diskstats')
+    NIC_COUNTERS = ('rx_bytes', 'tx_bytes', 'rx_dropped', 'rx_errors')
+
+    DISK_NAME = re.compile(r'^(mmcblk\d+|sd[a-z]+|nvme\d+n\d+)$')
+
+    def __init__(self, history, interval=SYSTEM_SAMPLE_INTERVAL):
+        self.history = history
+        self.interval = interval
+        self.latest = None
+        self.cpu_seconds = 0.0
+        self.samples = 0
+        self._fds = {}
+        self._previous = {}
+        self._previous_time = None
+        self._sources = {}
+        self._discovered = 0.0
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='system-sampler', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            # Wake on the next whole second so samples share the RSSI 1 s bucket timestamps
+            now = time.time()
+            due = math.floor(now / self.interval) * self.interval + self.interval
+            time.sleep(due - now)
+            started = time.thread_time()
+            try:
+                self.sample(due)
+            except Exception as e:
+                logger.exception(f"System sampler error: {str(e)}")
+            self.cpu_seconds += time.thread_time() - started
+            self.samples += 1
+
+    def _read(self, path):
+        """Return the current content of a /proc or /sys file, or None if it is gone."""
+        fd = self._fds.get(path)
+        try:
+            if fd is None:
+                fd = self._fds[path] = os.open(path, os.O_RDONLY)
+            return os.pread(fd, 65536, 0).decode('ascii', 'replace')
+        except OSError:
+            if fd is not None:
+                os.close(fd)
+                del self._fds[path]
+            return None
+
+    def _discover(self):
+        thermal = {}
+        for zone in sorted(Path('/sys/class/thermal').glob('thermal_zone*')):
+            try:
+                zone_type = (zone / 'type').read_text().strip()
+            except OSError:
+                zone_type = None
+            thermal[zone_type or zone.name] = str(zone / 'temp')
+        policies = {policy.name: str(policy / 'scaling_cur_freq')
+                    for policy in sorted(Path('/sys/devices/system/cpu/cpufreq').glob('policy*'))}
+        if SYSTEM_NICS:
+            nics = SYSTEM_NICS
+        else:
+            nics = sorted(nic.name for nic in Path('/sys/class/net').glob('*') if (nic / 'phy80211').exists())
+        self._sources = {'thermal': thermal, 'cpufreq': policies, 'nics': nics}
+        self._discovered = time.monotonic()
+
+        # Keep the descriptors of files that are still there; new ones are opened on first read
+        wanted = set(self.PROC_FILES) | set(thermal.values()) | set(policies.values())
+        wanted |= {f'/sys/class/net/{nic}/statistics/{counter}' for nic in nics for counter in self.NIC_COUNTERS}
+        for path in list(self._fds):
+            if path not in wanted or not os.path.exists(path):
+                os.close(self._fds.pop(path))
+
+    def _rate(self, key, value, elapsed):
+        """Per-second rate of a counter since the previous sample, None on the first one."""
+        previous = self._previous.get(key)
+        self._previous[key] = value
+        if previous is None or elapsed is None or value < previous:
+            return None
+        return (value - previous) / elapsed
+
+    def sample(self, timestamp):
+        if time.monotonic() - self._discovered > SYSTEM_RESCAN_INTERVAL:
+            self._discover()
+        monotonic = time.monotonic()
+        elapsed = monotonic - self._previous_time if self._previous_time is not None else None
+        self._previous_time = monotonic
+        values = {}
+
+        content = self._read('/proc/stat')
+        for line in (content or '').splitlines():
+            if not line.startswith('cpu'):
+                break
+            name, *fields = line.split()
+            # user nice system idle iowait irq softirq steal, in jiffies
+            ticks = [int(field) for field in fields[:8]]
+            total = self._rate(f'{name}/total', sum(ticks), elapsed)
+            idle = self._rate(f'{name}/idle', ticks[3] + ticks[4], elapsed)
+            iowait = self._rate(f'{name}/iowait', ticks[4], elapsed)
+            if total:
+                values[f'{name}/busy_pct'] = 100 * (1 - idle / total)
+                if name == 'cpu':
+                    values['cpu/iowait_pct'] = 100 * iowait / total
+
+        meminfo = {}
+        for line in (self._read('/proc/meminfo') or '').splitlines():
+            key, _, rest = line.partition(':')
+            meminfo[key] = int(rest.split()[0]) if rest.split() else 0
+        if meminfo.get('MemTotal'):
+            available = meminfo.get('MemAvailable', meminfo.get('MemFree', 0))
+            values['mem/available_mb'] = available / 1024
+            values['mem/used_pct'] = 100 * (1 - available / meminfo['MemTotal'])
+            if meminfo.get('SwapTotal'):
+                values['mem/swap_used_mb'] = (meminfo['SwapTotal'] - meminfo.get('SwapFree', 0)) / 1024
+
+        for line in (self._read('/proc/diskstats') or '').splitlines():
+            fields = line.split()
+            if len(fields) < 14 or not self.DISK_NAME.match(fields[2]):
+                continue
+            name = fields[2]
+            # Sectors are always 512 bytes here, io_ticks are milliseconds spent with I/O in flight
+            ios = int(fields[3]) + int(fields[7])
+            io_ms = int(fields[6]) + int(fields[10])
+            for metric, counter, scale in (('read_kbps', fields[5], 0.5), ('write_kbps', fields[9], 0.5),
+                                           ('busy_pct', fields[12], 0.1)):
+                rate = self._rate(f'{name}/{metric}', int(counter), elapsed)
+                if rate is not None:
+                    values[f'{name}/{metric}'] = rate * scale
+            ios_rate = self._rate(f'{name}/ios', ios, elapsed)
+            io_ms_rate = self._rate(f'{name}/io_ms', io_ms, elapsed)
+            if ios_rate:
+                values[f'{name}/await_ms'] = io_ms_rate / ios_rate
+
+        for zone, path in self._sources['thermal'].items():
+            content = self._read(path)
+            if content and content.strip().lstrip('-').isdigit():
+                values[f'{zone}/temp_c'] = int(content) / 1000
+        for policy, path in self._sources['cpufreq'].items():
+            content = self._read(path)
+            if content and content.strip().isdigit():
+                values[f'{policy}/freq_mhz'] = int(content) / 1000
+
+        for nic in self._sources['nics']:
+            for counter, metric, scale in zip(self.NIC_COUNTERS, ('rx_kbps', 'tx_kbps', 'rx_dropped_ps', 'rx_errors_ps'),
+                                              (8 / 1000, 8 / 1000, 1, 1)):
+                content = self._read(f'/sys/class/net/{nic}/statistics/{counter}')
+                if content is None:
+                    continue
+                rate = self._rate(f'{nic}/{counter}', int(content), elapsed)
+                if rate is not None:
+                    values[f'{nic}/{metric}'] = rate * scale
+
+        self.latest = {'t': timestamp, 'values': {column: round(value, 2) for column, value in values.items()}}
+        self.history.add_values(timestamp, values)
+
+    def status(self):
+        return {
+            'samples': self.samples,
+            'interval': self.interval,
+            # Share of one CPU the sampler itself uses
+            'cpu_pct': round(100 * self.cpu_seconds / (self.samples * self.interval), 4) if self.samples else None,
+            'sources': self._sources
+        }
+
+system_history = HistoryStore(SYSTEM_HISTORY_TIERS)
+system_sampler = SystemSampler(system_history)
+
+class TelemetryRecorder:
+    """
+    Appends every wfb-ng stats record to a per-session log on disk.
+
+    Each session is a pair of files in TELEMETRY_FOLDER:
+
+    - <session>.tlm: records as <float64 timestamp><uint32 length><json>
+    - <session>.idx: sparse (float64 timestamp, uint64 offset) entries
+
+    Records are buffered in memory and written in batches to limit SD card
+    wear. The index gets an entry every TELEMETRY_INDEX_INTERVAL seconds so
+    readers can seek close to a time without scanning the log. Whole
+    finished sessions are deleted, oldest first, once they exceed
+    TELEMETRY_MAX_BYTES in total or are older than TELEMETRY_MAX_AGE_DAYS.
+    """
+
+    RECORD_HEADER = struct.Struct('<dI')
+    INDEX_ENTRY = struct.Struct('<dQ')
+    SESSION_PATTERN = re.compile(r'^\d{8}-\d{6}$')
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.session = None
+        self._lock = threading.Lock()
+        self._buffer = bytearray()
+        self._index_buffer = bytearray()
+        self._offset = 0
+        self._last_record_time = 0.0
+        self._last_index_time = 0.0
+        self._last_flush = 0.0
+        self._last_retention = 0.0
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._flush_loop, name='telemetry-recorder', daemon=True)
+                self._thread.start()
+
+    def paths(self, session):
+        base = os.path.join(self.folder, session)
+        return base + '.tlm', base + '.idx'
+
+    def add_record(self, record, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+        payload = json.dumps(record, separators=(',', ':')).encode()
+        with self._lock:
+            if self.session is None or timestamp - self._last_record_time > TELEMETRY_SESSION_GAP:
+                self._flush_locked()
+                self.session = time.strftime('%Y%m%d-%H%M%S', time.localtime(timestamp))
+                self._offset = 0
+                self._last_index_time = 0.0
+            if timestamp - self._last_index_time >= TELEMETRY_INDEX_INTERVAL:
+                self._index_buffer += self.INDEX_ENTRY.pack(timestamp, self._offset + len(self._buffer))
+                self._last_index_time = timestamp
+            self._buffer += self.RECORD_HEADER.pack(timestamp, len(payload))
+            self._buffer += payload
+            self._last_record_time = timestamp
+            if len(self._buffer) >= TELEMETRY_FLUSH_BYTES:
+                self._flush_locked()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._buffer or self.session is None:
+            return
+        log_path, index_path = self.paths(self.session)
+        buffer, index_buffer = self._buffer, self._index_buffer
+        self._buffer = bytearray()
+        self._index_buffer = bytearray()
+        self._last_flush = time.monotonic()
+        # Log first, so the index never points past the end of the log. A
+        # failed write drops the batch and cuts the file back to where it
+        # ended, so the offsets of later records and index entries stay right.
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            with open(log_path, 'ab') as f:
+                f.write(buffer)
+                f.flush()
+                os.fsync(f.fileno())
+        except OSError as e:
+            logger.error(f"Error writing telemetry log, dropping {len(buffer)} bytes: {str(e)}")
+            self._truncate(log_path, self._offset)
+            return
+        self._offset += len(buffer)
+        if index_buffer:
+            end = None
+            try:
+                with open(index_path, 'ab') as f:
+                    end = f.tell()
+                    f.write(index_buffer)
+            except OSError as e:
+                logger.error(f"Error writing telemetry index: {str(e)}")
+                if end is not None:
+                    self._truncate(index_path, end)
+
+    def _truncate(self, path, size):
+        try:
+            if os.path.getsize(path) > size:
+                os.truncate(path, size)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            # The file can't be repaired, so the next record starts a new session
+            logger.error(f"Error truncating {path}, ending session {self.session}: {str(e)}")
+            self.session = None
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(TELEMETRY_FLUSH_INTERVAL)
+            if time.monotonic() - self._last_flush >= TELEMETRY_FLUSH_INTERVAL:
+                self.flush()
+            if time.monotonic() - self._last_retention >= TELEMETRY_RETENTION_INTERVAL:
+                self._last_retention = time.monotonic()
+                try:
+                    self.enforce_retention()
+                except OSError as e:
+                    logger.error(f"Error enforcing telemetry retention: {str(e)}")
+
+    def delete(self, session):
+        """
+        Delete a finished session.
+
+        Returns:
+            bool: False if the session is still being recorded
+        """
+        with self._lock:
+            if session == self.session:
+                return False
+            for path in self.paths(session):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        return True
+
+    def enforce_retention(self, max_bytes=TELEMETRY_MAX_BYTES, max_age_days=TELEMETRY_MAX_AGE_DAYS):
+        """
+        Delete the oldest finished sessions beyond the size or age limit.
+
+        Returns:
+            list: Names of the deleted sessions
+        """
+        deleted = []
+        total = 0
+        expired_before = time.time() - max_age_days * 86400
+        # Newest first, so the size budget goes to the most recent flights
+        for session in self.sessions():
+            total += session['size']
+            if session['recording']:
+                continue
+            if (max_bytes and total > max_bytes) or (max_age_days and session['mtime'] < expired_before):
+                if self.delete(session['session']):
+                    total -= session['size']
+                    deleted.append(session['session'])
+                    logger.info(f"Deleted telemetry session {session['session']}")
+        return deleted
+
+    def sessions(self):
+        """List recorded sessions with their size and time span."""
+        sessions = []
+        if not os.path.isdir(self.folder):
+            return sessions
+        for entry in os.scandir(self.folder):
+            name, ext = os.path.splitext(entry.name)
+            if ext != '.tlm' or not self.SESSION_PATTERN.match(name):
+                continue
+            index = self.read_index(name)
+            stat = entry.stat()
+            sessions.append({
+                'session': name,
+                'size': stat.st_size,
+                'mtime': stat.st_mtime,
+                'start': index[0][0] if index else None,
+                'recording': name == self.session
+            })
+        sessions.sort(key=lambda s: s['session'], reverse=True)
+        return sessions
+
+    def read_index(self, session):
+        _, index_path = self.paths(session)
+        try:
+            with open(index_path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return []
+        usable = len(data) - len(data) % self.INDEX_ENTRY.size
+        return list(self.INDEX_ENTRY.iter_unpack(data[:usable]))
+
+    def iter_records(self, session, t0=None, t1=None):
+        """
+        Yield (timestamp, record) pairs between t0 and t1.
+
+        The sparse index is used to find the last entry at or before t0 and
+        the log is read through mmap from that offset.
+        """
+        if session == self.session:
+            self.flush()
+        log_path, _ = self.paths(session)
+        index = self.read_index(session)
+        offset = 0
+        if t0 is not None and index:
+            position = bisect.bisect_right([entry[0] for entry in index], t0) - 1
+            if position >= 0:
+                offset = index[position][1]
+
+        with open(log_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                header_size = self.RECORD_HEADER.size
+                while offset + header_size <= len(data):
+                    timestamp, length = self.RECORD_HEADER.unpack_from(data, offset)
+                    start = offset + header_size
+                    offset = start + length
+                    if offset > len(data):
+                        break
+                    if t1 is not None and timestamp > t1:
+                        break
+                    if t0 is not None and timestamp < t0:
+                        continue
+                    yield timestamp, json.loads(data[start:offset])
+
+    def replay(self, session, speed, t0=None):
+        """
+        Generate Server-Sent Events re-playing a session in the same delta
+        format as /rssi/stream.
+
+        Args:
+            session (str): Session name
+            speed (int): Playback speed multiplier
+            t0 (float): Optional start time
+        """
+        state = {}
+        first_time = None
+        started = time.monotonic()
+        yield 'retry: 2000\n\n'
+        for timestamp, record in self.iter_records(session, t0):
+            if record.get('type') != 'rx' or not record.get('rx_ant_stats'):
+                continue
+            if first_time is None:
+                first_time = timestamp
+            delay = (timestamp - first_time) / speed - (time.monotonic() - started)
+            if delay > 0:
+                time.sleep(delay)
+            record = dict(record, timestamp=timestamp)
+            frame = RssiBroadcaster.encode_delta(state, record)
+            yield f"data: {json.dumps(frame, separators=(',', ':'))}\n\n"
+        yield 'event: end\ndata: {}\n\n'
+
+telemetry_recorder = TelemetryRecorder(TELEMETRY_FOLDER)
+stats_collector.add_listener(telemetry_recorder.add_record)
+
+def optional_numpy():
+    """Return the numpy module, or None when it is not installed."""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+def link_series_from_telemetry(session, t0=None, t1=None):
+    """
+    Best-antenna RSSI and SNR of a recorded session, as alink_gs sees them.
+
+    Returns:
+        tuple: (times, rssi, snr) lists
+    """
+    times, rssi, snr = [], [], []
+    for timestamp, record in telemetry_recorder.iter_records(session, t0, t1):
+        antennas = record.get('rx_ant_stats') if record.get('type') == 'rx' else None
+        if not antennas:
+            continue
+        times.append(timestamp)
+        rssi.append(max(ant.get('rssi_avg', -100) for ant in antennas))
+        snr.append(max(ant.get('snr_avg', 0) for ant in antennas))
+    return times, rssi, snr
+
+def synthetic_link_series(duration=600, rate=10, seed=1):
+    """
+    A reproducible flight-like series: RSSI random walk with distance drift and short fades.
+
+    Returns:
+        tuple: (times, rssi, snr) lists
+    """
+    rng = random.Random(seed)
+    times, rssi, snr = [], [], []
+    level = -45.0
+    fade = 0
+    for i in range(int(duration * rate)):
+        # Slow out-and-back drift, as when flying away and returning
+        drift = -25 * math.sin(math.pi * i / (duration * rate))
+        level = min(max(level + rng.gauss(0, 0.7), -60), -30)
+        if fade == 0 and rng.random() < 0.3 / rate:
+            fade = int(rng.uniform(0.2, 2) * rate)
+        depth = 15 if fade else 0
+        fade = max(fade - 1, 0)
+        value = level + drift - depth
+        times.append(i / rate)
+        rssi.append(round(value, 1))
+        snr.append(round(max(value + 75 + rng.gauss(0, 1.5), 0), 1))
+    return times, rssi, snr
+
+def alink_candidates(settings_list):
+    """
+    Check candidate settings and fill in the model parameters alink_gs.conf does not set.
+
+    Raises:
+        ValueError: If a threshold is missing, not a number or min is not below max
+    """
+    candidates = []
+    for settings in settings_list:
+        candidate = dict(ALINK_SIM_DEFAULTS)
+        for key in ('min_rssi', 'max_rssi', 'min_snr', 'max_snr', *ALINK_SIM_DEFAULTS):
+            if key in settings and settings[key] not in (None, ''):
+                try:
+                    candidate[key] = float(settings[key])
+                except (TypeError, ValueError):
+                    raise ValueError(f'{key} must be a number') from None
+            elif key not in candidate:
+                raise ValueError(f'{key} is required')
+        if candidate['min_rssi'] >= candidate['max_rssi'] or candidate['min_snr'] >= candidate['max_snr']:
+            raise ValueError('min_rssi and min_snr must be below max_rssi and max_snr')
+        candidates.append(candidate)
+    return candidates
+
+def simulate_alink(series, settings_list):
+    """
+    Replay a link series against candidate alink settings.
+
+    Models the adaptive link: each sample's best RSSI and SNR are scaled
+    between the candidate's min and max into a 1000-2000 link score
+    (weighted by snr_weight and rssi_weight). The air unit smooths it, fast
+    downwards and slowly upwards, and switches to the ALINK_PROFILES level
+    of the smoothed score once it moved more than the hysteresis and
+    min_between_changes_ms has passed. Time where the active level is above
+    what the unsmoothed score supports is counted as degraded, as that is
+    when the link runs an MCS or bitrate the radio conditions cannot carry.
+    Gaps longer than ALINK_SIM_GAP_FACTOR times the median sample interval
+    are not counted, whatever rate the stats were logged at.
+
+    Candidates are simulated together as NumPy vectors when NumPy is
+    installed, which makes sweeps of hundreds of candidates over an hour of
+    telemetry take seconds; otherwise a pure Python loop is used.
+
+    Args:
+        series (tuple): (times, rssi, snr) sequences
+        settings_list (list): Candidate settings, see alink_candidates
+
+    Returns:
+        list: One result dict per candidate, in order
+    """
+    candidates = alink_candidates(settings_list)
+    times, rssi, snr = series
+    intervals = [b - a for a, b in zip(times, times[1:]) if b > a]
+    max_gap = statistics.median(intervals) * ALINK_SIM_GAP_FACTOR if intervals else 0.0
+    numpy = optional_numpy()
+    if numpy is not None and candidates:
+        counts = _simulate_alink_numpy(numpy, times, rssi, snr, candidates, max_gap)
+    else:
+        counts = [_simulate_alink_python(times, rssi, snr, candidate, max_gap) for candidate in candidates]
+
+    results = []
+    for candidate, (switches, level_seconds, degraded) in zip(candidates, counts):
+        counted = sum(level_seconds)
+        results.append({
+            'settings': candidate,
+            'switches': switches,
+            'switches_per_min': round(switches / counted * 60, 2) if counted else 0.0,
+            'levels': [{
+                'mcs': mcs,
+                'bitrate': bitrate,
+                'seconds': round(seconds, 1),
+                'share': round(seconds / counted, 4) if counted else 0.0
+            } for (_, mcs, bitrate), seconds in zip(ALINK_PROFILES, level_seconds)],
+            'mean_bitrate': round(sum(bitrate * seconds for (_, _, bitrate), seconds
+                                      in zip(ALINK_PROFILES, level_seconds)) / counted) if counted else 0,
+            'degraded_seconds': round(degraded, 1),
+            'degraded_share': round(degraded / counted, 4) if counted else 0.0,
+            'duration': round(counted, 1)
+        })
+    return results
+
+def _simulate_alink_python(times, rssi, snr, candidate, max_gap):
+    lows = [low for low, _, _ in ALINK_PROFILES]
+    rssi_span = candidate['max_rssi'] - candidate['min_rssi']
+    snr_span = candidate['max_snr'] - candidate['min_snr']
+    smoothed = None
+    level = 0
+    changed_at = -math.inf
+    changed_score = lows[0]
+    switches = 0
+    level_seconds = [0.0] * len(lows)
+    degraded = 0.0
+    for i in range(len(times)):
+        rssi_norm = min(max((rssi[i] - candidate['min_rssi']) / rssi_span, 0.0), 1.0)
+        snr_norm = min(max((snr[i] - candidate['min_snr']) / snr_span, 0.0), 1.0)
+        score = 1000 + 1000 * (candidate['rssi_weight'] * rssi_norm + candidate['snr_weight'] * snr_norm)
+        if smoothed is None:
+            smoothed = score
+        else:
+            factor = candidate['smoothing_up'] if score > smoothed else candidate['smoothing_down']
+            smoothed += factor * (score - smoothed)
+        target = max(bisect.bisect_right(lows, smoothed) - 1, 0)
+        if target != level and times[i] - changed_at >= candidate['min_between_changes_ms'] / 1000:
+            hysteresis = candidate['hysteresis_up_pct'] if target > level else candidate['hysteresis_down_pct']
+            if abs(smoothed - changed_score) / changed_score * 100 > hysteresis:
+                level = target
+                changed_at = times[i]
+                changed_score = smoothed
+                switches += 1
+        if i + 1 < len(times):
+            dt = times[i + 1] - times[i]
+            if dt <= max_gap:
+                level_seconds[level] += dt
+                if level > max(bisect.bisect_right(lows, score) - 1, 0):
+                    degraded += dt
+    return switches, level_seconds, degraded
+
+def _simulate_alink_numpy(np, times, rssi, snr, candidates, max_gap):
+    """Vectorised form of _simulate_alink_python across candidates, stepping through time once."""
+    lows = np.array([low for low, _, _ in ALINK_PROFILES], dtype=float)
+    param = {key: np.array([candidate[key] for candidate in candidates], dtype=float)[:, None]
+             for key in candidates[0]}
+    times = np.asarray(times, dtype=float)
+    rssi = np.asarray(rssi, dtype=float)
+    snr = np.asarray(snr, dtype=float)
+    count = len(candidates)
+    dts = np.diff(times, append=times[-1:])
+    dts[dts > max_gap] = 0.0
+
+    smoothed = None
+    level = np.zeros(count, dtype=np.int64)
+    changed_at = np.full(count, -np.inf)
+    changed_score = np.full(count, lows[0])
+    switches = np.zeros(count, dtype=np.int64)
+    level_seconds = np.zeros((count, len(lows)))
+    degraded = np.zeros(count)
+    rows = np.arange(count)
+    min_between = param['min_between_changes_ms'][:, 0] / 1000
+    up, down = param['smoothing_up'][:, 0], param['smoothing_down'][:, 0]
+    hysteresis_up, hysteresis_down = param['hysteresis_up_pct'][:, 0], param['hysteresis_down_pct'][:, 0]
+    # Raw scores are computed a block of samples at a time, one row per candidate,
+    # which bounds memory while keeping the per-sample loop to a few vector operations
+    for block in range(0, len(times), ALINK_SIM_BLOCK):
+        window = slice(block, block + ALINK_SIM_BLOCK)
+        rssi_norm = np.clip((rssi[window] - param['min_rssi']) / (param['max_rssi'] - param['min_rssi']), 0, 1)
+        snr_norm = np.clip((snr[window] - param['min_snr']) / (param['max_snr'] - param['min_snr']), 0, 1)
+        scores = 1000 + 1000 * (param['rssi_weight'] * rssi_norm + param['snr_weight'] * snr_norm)
+        supported = np.maximum(np.searchsorted(lows, scores, side='right') - 1, 0)
+        for j in range(scores.shape[1]):
+            i = block + j
+            score = scores[:, j]
+            if smoothed is None:
+                smoothed = score.copy()
+            else:
+                smoothed += np.where(score > smoothed, up, down) * (score - smoothed)
+            target = np.maximum(np.searchsorted(lows, smoothed, side='right') - 1, 0)
+            hysteresis = np.where(target > level, hysteresis_up, hysteresis_down)
+            change = ((target != level) & (times[i] - changed_at >= min_between)
+                      & (np.abs(smoothed - changed_score) / changed_score * 100 > hysteresis))
+            if change.any():
+                level = np.where(change, target, level)
+                changed_at = np.where(change, times[i], changed_at)
+                changed_score = np.where(change, smoothed, changed_score)
+                switches += change
+            dt = dts[i]
+            if dt:
+                level_seconds[rows, level] += dt
+                degraded += (level > supported[:, j]) * dt
+    return [(int(switches[c]), level_seconds[c].tolist(), float(degraded[c])) for c in range(count)]
+
+def _mp4_boxes(f, start, end):
+    """Yield (type, payload start, box end) for the MP4 boxes in [start, end)."""
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        header = f.read(16)
+        if len(header) < 8:
+            return
+        size, kind = struct.unpack('>I4s', header[:8])
+        header_len = 8
+        if size == 1:
+            if len(header) < 16:
+                return
+            size = struct.unpack('>Q', header[8:16])[0]
+            header_len = 16
+        elif size == 0:
+            size = end - pos
+        if size < header_len:
+            return
+        yield kind, pos + header_len, min(pos + size, end)
+        pos += size
+
+def parse_mp4_metadata(path):
+    """
+    Read duration, resolution and codec from an MP4/MOV moov box.
+
+    Only box headers and the few small boxes needed are read; the sample
+    tables are skipped by seeking.
+
+    Returns:
+        dict: Any of duration (seconds), width, height and codec
+    """
+    metadata = {}
+    with open(path, 'rb') as f:
+        file_size = os.fstat(f.fileno()).st_size
+        moov = next(((s, e) for kind, s, e in _mp4_boxes(f, 0, file_size) if kind == b'moov'), None)
+        if moov is None:
+            return metadata
+
+        for kind, start, end in _mp4_boxes(f, *moov):
+            if kind == b'mvhd':
+                f.seek(start)
+                data = f.read(32)
+                if data[0] == 1:
+                    timescale, duration = struct.unpack('>IQ', data[20:32])
+                else:
+                    timescale, duration = struct.unpack('>II', data[12:20])
+                if timescale:
+                    metadata['duration'] = round(duration / timescale, 2)
+            elif kind == b'trak':
+                track = {}
+                for trak_kind, trak_start, trak_end in _mp4_boxes(f, start, end):
+                    if trak_kind == b'tkhd':
+                        f.seek(trak_start)
+                        data = f.read(96)
+                        offset = 88 if data[0] == 1 else 76
+                        width, height = struct.unpack('>II', data[offset:offset + 8])
+                        track['width'], track['height'] = width >> 16, height >> 16
+                    elif trak_kind == b'mdia':
+                        for mdia_kind, mdia_start, mdia_end in _mp4_boxes(f, trak_start, trak_end):
+                            if mdia_kind == b'hdlr':
+                                f.seek(mdia_start + 8)
+                                track['handler'] = f.read(4)
+                            elif mdia_kind == b'minf':
+                                stbl = next(((s, e) for k, s, e in _mp4_boxes(f, mdia_start, mdia_end) if k == b'stbl'), None)
+                                stsd = stbl and next(((s, e) for k, s, e in _mp4_boxes(f, *stbl) if k == b'stsd'), None)
+                                if stsd:
+                                    f.seek(stsd[0] + 12)
+                                    track['codec'] = f.read(4).decode('ascii', 'replace')
+                if track.get('handler') == b'vide':
+                    metadata['width'] = track.get('width')
+                    metadata['height'] = track.get('height')
+                    metadata['codec'] = MEDIA_CODEC_NAMES.get(track.get('codec'), track.get('codec'))
+    return metadata
+
+def _ebml_vint(data, pos, keep_marker=False):
+    """Decode an EBML variable-length integer, returning (value, length)."""
+    first = data[pos]
+    length = 1
+    mask = 0x80
+    while length <= 8 and not first & mask:
+        mask >>= 1
+        length += 1
+    if length > 8 or pos + length > len(data):
+        raise ValueError('Invalid EBML variable-length integer')
+    value = first if keep_marker else first & (mask - 1)
+    all_ones = value == mask - 1
+    for byte in data[pos + 1:pos + length]:
+        value = (value << 8) | byte
+        all_ones = all_ones and byte == 0xff
+    if not keep_marker and all_ones:
+        # Unknown size, used by live recordings for Segment and Cluster
+        return None, length
+    return value, length
+
+def _ebml_elements(data, start, end):
+    """Yield (id, payload start, payload end) for EBML elements in [start, end)."""
+    pos = start
+    while pos < end:
+        element_id, id_len = _ebml_vint(data, pos, keep_marker=True)
+        size, size_len = _ebml_vint(data, pos + id_len)
+        payload = pos + id_len + size_len
+        payload_end = end if size is None else min(payload + size, end)
+        yield element_id, payload, payload_end
+        pos = payload_end
+
+def parse_mkv_metadata(path, read_bytes=512 * 1024):
+    """
+    Read duration, resolution and codec from the Info and Tracks elements
+    at the start of a Matroska file.
+
+    Returns:
+        dict: Any of duration (seconds), width, height and codec
+    """
+    with open(path, 'rb') as f:
+        data = f.read(read_bytes)
+    metadata = {}
+    try:
+        for element_id, start, end in _ebml_elements(data, 0, len(data)):
+            if element_id != 0x18538067:  # Segment
+                continue
+            timecode_scale = 1000000
+            duration = None
+            for child_id, child_start, child_end in _ebml_elements(data, start, end):
+                if child_id == 0x1549A966:  # Info
+                    for info_id, info_start, info_end in _ebml_elements(data, child_start, child_end):
+                        if info_id == 0x2AD7B1:
+                            timecode_scale = int.from_bytes(data[info_start:info_end], 'big')
+                        elif info_id == 0x4489:
+                            duration = struct.unpack('>f' if info_end - info_start == 4 else '>d', data[info_start:info_end])[0]
+                elif child_id == 0x1654AE6B:  # Tracks
+                    for entry_id, entry_start, entry_end in _ebml_elements(data, child_start, child_end):
+                        if entry_id != 0xAE:  # TrackEntry
+                            continue
+                        track = {}
+                        for field_id, field_start, field_end in _ebml_elements(data, entry_start, entry_end):
+                            if field_id == 0x83:
+                                track['type'] = int.from_bytes(data[field_start:field_end], 'big')
+                            elif field_id == 0x86:
+                                track['codec'] = data[field_start:field_end].decode('ascii', 'replace')
+                            elif field_id == 0xE0:
+                                for video_id, video_start, video_end in _ebml_elements(data, field_start, field_end):
+                                    if video_id == 0xB0:
+                                        track['width'] = int.from_bytes(data[video_start:video_end], 'big')
+                                    elif video_id == 0xBA:
+                                        track['height'] = int.from_bytes(data[video_start:video_end], 'big')
+                        if track.get('type') == 1:
+                            metadata['width'] = track.get('width')
+                            metadata['height'] = track.get('height')
+                            metadata['codec'] = MEDIA_CODEC_NAMES.get(track.get('codec'), track.get('codec'))
+                elif child_id == 0x1F43B675:  # Cluster, media data starts here
+                    break
+            if duration is not None:
+                metadata['duration'] = round(duration * timecode_scale / 1e9, 2)
+            break
+    except (ValueError, IndexError, struct.error):
+        pass
+    return metadata
+
+def parse_media_metadata(path):
+    """Return container metadata for a recording, or {} if it cannot be parsed."""
+    ext = os.path.splitext(path)[1].lower()
+    try:
+        if ext in ('.mp4', '.mov'):
+            return parse_mp4_metadata(path)
+        if ext == '.mkv':
+            return parse_mkv_metadata(path)
+    except (OSError, ValueError, IndexError, struct.error) as e:
+        logger.warning(f"Error reading metadata of {path}: {str(e)}")
+    return {}
+
+
+class MediaIndex:
+    """
+    Incrementally maintained index of the recordings in MEDIA_FOLDER.
+
+    A refresh re-lists the folder only when its mtime changed. Listing uses
+    os.scandir and keeps the parsed metadata of every file whose size and
+    mtime are unchanged, so container headers are read once per file. Files
+    modified within MEDIA_GROWING_WINDOW seconds (recordings in progress)
+    are re-statted on every refresh until they settle, because appending to
+    a file does not change the folder mtime.
+    """
+
+    def __init__(self, folder, thumbnail_folder):
+        self.folder = folder
+        self.thumbnail_folder = thumbnail_folder
+        self._entries = {}
+        self._folder_mtime = None
+        self._thumbnail_mtime = None
+        self._thumbnails = set()
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        with self._lock:
+            try:
+                folder_mtime = os.stat(self.folder).st_mtime_ns
+            except OSError:
+                self._entries = {}
+                self._folder_mtime = None
+                return
+
+            if folder_mtime != self._folder_mtime:
+                entries = {}
+                for entry in os.scandir(self.folder):
+                    if not entry.name.lower().endswith(VIDEO_EXTENSIONS) or not entry.is_file():
+                        continue
+                    entries[entry.name] = self._indexed(entry.name, entry.stat())
+                self._entries = entries
+                self._folder_mtime = folder_mtime
+            else:
+                for name, item in list(self._entries.items()):
+                    if not item['parsed']:
+                        try:
+                            self._entries[name] = self._indexed(name, os.stat(os.path.join(self.folder, name)))
+                        except OSError:
+                            del self._entries[name]
+
+            self._refresh_thumbnails()
+
+    def _indexed(self, name, stat):
+        settled = stat.st_mtime < time.time() - MEDIA_GROWING_WINDOW
+        item = self._entries.get(name)
+        if (item is not None and item['size'] == stat.st_size and item['mtime_ns'] == stat.st_mtime_ns
+                and (item['parsed'] or not settled)):
+            return item
+        item = {
+            'name': name,
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'mtime_ns': stat.st_mtime_ns,
+            'ino': stat.st_ino,
+            'dev': stat.st_dev,
+            'parsed': settled
+        }
+        # A growing recording has no final header yet; parse it once it settles
+        if settled:
+            item.update(parse_media_metadata(os.path.join(self.folder, name)))
+        return item
+
+    def _refresh_thumbnails(self):
+        try:
+            thumbnail_mtime = os.stat(self.thumbnail_folder).st_mtime_ns
+        except OSError:
+            self._thumbnails = set()
+            return
+        if thumbnail_mtime != self._thumbnail_mtime:
+            self._thumbnails = {entry.name for entry in os.scandir(self.thumbnail_folder)}
+            self._thumbnail_mtime = thumbnail_mtime
+
+    def get(self, name):
+        return self._entries.get(name)
+
+    def entries(self):
+        return list(self._entries.values())
+
+    def thumbnail_url(self, name):
+        thumbnail_name = os.path.splitext(name)[0] + '.jpg'
+        if thumbnail_name in self._thumbnails:
+            return f'/static/thumbnails/{thumbnail_name}'
+        return None
+
+    def query(self, sort='date', order='desc', search='', page=1, per_page=MEDIA_PAGE_SIZE):
+        """
+        Return one page of recordings.
+
+        Args:
+            sort (str): 'date', 'name', 'size' or 'duration'
+            order (str): 'asc' or 'desc'
+            search (str): Case-insensitive substring filter on the file name
+            page (int): 1-based page number
+            per_page (int): Page size
+
+        Returns:
+            tuple: (list of file dicts, total matching files)
+        """
+        self.refresh()
+        items = self.entries()
+        if search:
+            search = search.lower()
+            items = [item for item in items if search in item['name'].lower()]
+        key = {
+            'date': lambda item: item['mtime'],
+            'name': lambda item: item['name'],
+            'size': lambda item: item['size'],
+            'duration': lambda item: item.get('duration') or 0
+        }[sort]
+        items.sort(key=key, reverse=order == 'desc')
+
+        start = (page - 1) * per_page
+        files = []
+        for item in items[start:start + per_page]:
+            files.append({
+                'name': item['name'],
+                'size': round(item['size'] / (1024 * 1024), 2),
+                'bytes': item['size'],
+                'modified': time.strftime('%Y-%m-%d %H:%M', time.localtime(item['mtime'])),
+                'mtime': item['mtime'],
+                'duration': item.get('duration'),
+                'width': item.get('width'),
+                'height': item.get('height'),
+                'codec': item.get('codec'),
+                'thumbnail': self.thumbnail_url(item['name'])
+            })
+        return files, len(items)
+
+media_index = MediaIndex(MEDIA_FOLDER, THUMBNAIL_FOLDER)
+
+class ThumbnailWorker:
+    """
+    Generates missing recording thumbnails in the background.
+
+    A scan thread looks for settled recordings in the media index that have
+    no thumbnail and queues them on a single worker thread. ffmpeg runs at
+    the lowest CPU priority and idle I/O class, decodes only keyframes and
+    seeks to THUMBNAIL_OFFSET seconds (capped to half the duration), so it
+    never competes with live decoding or DVR writes. Results are cached by
+    file identity, so a recording is processed again only when it is
+    replaced, its thumbnail was deleted, or, after a failure, once the
+    retry delay for that number of attempts has passed. CPU cost is taken
+    from ffmpeg's own resource usage, not from all children of the process.
+    """
+
+    def __init__(self, index, folder):
+        self.index = index
+        self.folder = folder
+        self.cache_path = os.path.join(folder, '.thumbnails.json')
+        self._executor = ThreadPoolExecutor(max_workers=THUMBNAIL_WORKERS, thread_name_prefix='thumbnail')
+        self._pending = set()
+        self._cache = None
+        self._costs = deque(maxlen=50)
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.last_error = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='thumbnail-scan', daemon=True)
+                self._thread.start()
+
+    def wakeup(self):
+        """Ask for a scan now, e.g. after the files page noticed new recordings."""
+        self._wakeup.set()
+
+    @staticmethod
+    def identity(item):
+        return f"{item['dev']}:{item['ino']}:{item['size']}:{item['mtime_ns']}"
+
+    def _load_cache(self):
+        if self._cache is None:
+            try:
+                with open(self.cache_path) as f:
+                    self._cache = json.load(f)
+            except (OSError, ValueError):
+                self._cache = {}
+        return self._cache
+
+    def _save_cache(self):
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            tmp_path = self.cache_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self._cache, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logger.error(f"Error saving thumbnail cache: {str(e)}")
+
+    def _run(self):
+        while True:
+            try:
+                self.scan()
+            except Exception as e:
+                logger.exception(f"Thumbnail scan error: {str(e)}")
+            self._wakeup.wait(THUMBNAIL_SCAN_INTERVAL)
+            self._wakeup.clear()
+
+    def scan(self):
+        self.index.refresh()
+        with self._lock:
+            cache = self._load_cache()
+            for item in self.index.entries():
+                # Unparsed entries are recordings that are still growing
+                if not item['parsed'] or item['name'] in self._pending:
+                    continue
+                cached = cache.get(item['name'])
+                exists = self.index.thumbnail_url(item['name']) is not None
+                if cached is None and exists:
+                    continue
+                if cached is not None and cached['identity'] == self.identity(item):
+                    if cached['ok'] and exists:
+                        continue
+                    if not cached['ok'] and time.time() < cached.get('retry_at', math.inf):
+                        continue
+                self._pending.add(item['name'])
+                self._executor.submit(self._generate, item)
+
+    def _generate(self, item):
+        name = item['name']
+        source = os.path.join(self.index.folder, name)
+        target = os.path.join(self.folder, os.path.splitext(name)[0] + '.jpg')
+        tmp_target = target + '.tmp.jpg'
+        offset = THUMBNAIL_OFFSET
+        if item.get('duration'):
+            offset = min(offset, item['duration'] / 2)
+
+        command = [
+            'nice', '-n', '19', 'ionice', '-c', '3',
+            'ffmpeg', '-nostdin', '-loglevel', 'error', '-y',
+            '-skip_frame', 'nokey', '-ss', str(offset), '-i', source,
+            '-frames:v', '1', '-vf', f'scale={THUMBNAIL_WIDTH}:-2', tmp_target
+        ]
+        started = time.monotonic()
+        cpu = None
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            returncode, stderr, cpu = self._run_ffmpeg(command)
+            ok = returncode == 0 and os.path.exists(tmp_target)
+            if ok:
+                os.replace(tmp_target, target)
+            else:
+                self.last_error = stderr.strip()[-200:] or f'ffmpeg exited with {returncode}'
+        except (OSError, subprocess.TimeoutExpired) as e:
+            ok = False
+            self.last_error = str(e)
+        finally:
+            if os.path.exists(tmp_target):
+                os.remove(tmp_target)
+
+        cost = {
+            'name': name,
+            'ok': ok,
+            'wall_ms': round((time.monotonic() - started) * 1000, 1),
+            'cpu_ms': round(cpu * 1000, 1) if cpu is not None else None
+        }
+        with self._lock:
+            self._costs.append(cost)
+            cache = self._load_cache()
+            entry = {'identity': self.identity(item), 'ok': ok}
+            if not ok:
+                previous = cache.get(name)
+                attempts = 1
+                if previous is not None and previous['identity'] == entry['identity'] and not previous['ok']:
+                    attempts = previous.get('attempts', 0) + 1
+                delay = min(THUMBNAIL_RETRY_DELAY[0] * 2 ** (attempts - 1), THUMBNAIL_RETRY_DELAY[1])
+                entry.update(attempts=attempts, retry_at=time.time() + delay)
+            cache[name] = entry
+            self._save_cache()
+            self._pending.discard(name)
+
+    @staticmethod
+    def _run_ffmpeg(command):
+        """
+        Run ffmpeg and reap it with wait4, so its own CPU time is measured.
+
+        Returns:
+            tuple: (exit status, stderr text, user + system CPU seconds)
+
+        Raises:
+            subprocess.TimeoutExpired: If it ran longer than THUMBNAIL_TIMEOUT
+        """
+        labels = (('program', 'ffmpeg'),)
+        started = time.perf_counter()
+        with tempfile.TemporaryFile() as stderr:
+            process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                       stderr=stderr, start_new_session=True)
+            expired = threading.Event()
+
+            def expire():
+                expired.set()
+                kill_process_group(process)
+
+            timer = threading.Timer(THUMBNAIL_TIMEOUT, expire)
+            timer.start()
+            try:
+                _, status, usage = os.wait4(process.pid, 0)
+            finally:
+                timer.cancel()
+            process.returncode = os.waitstatus_to_exitcode(status)
+            metrics.observe('webui_subprocess_duration_seconds', labels, time.perf_counter() - started)
+            if expired.is_set():
+                metrics.inc('webui_subprocess_calls_total', labels + (('outcome', 'timeout'),))
+                raise subprocess.TimeoutExpired(command, THUMBNAIL_TIMEOUT)
+            metrics.inc('webui_subprocess_calls_total',
+                        labels + (('outcome', 'ok' if process.returncode == 0 else 'failed'),))
+            stderr.seek(0)
+            return process.returncode, stderr.read().decode('utf-8', 'replace'), usage.ru_utime + usage.ru_stime
+
+    def status(self):
+        with self._lock:
+            costs = list(self._costs)
+            cache = self._load_cache()
+            done = [cost for cost in costs if cost['ok']]
+            return {
+                'queue_depth': len(self._pending),
+                'generated': sum(1 for entry in cache.values() if entry['ok']),
+                'failed': sum(1 for entry in cache.values() if not entry['ok']),
+                'avg_wall_ms': round(sum(cost['wall_ms'] for cost in done) / len(done), 1) if done else None,
+                'avg_cpu_ms': round(sum(cost['cpu_ms'] for cost in done) / len(done), 1) if done else None,
+                'recent': costs[-10:],
+                'last_error': self.last_error
+            }
+
+thumbnail_worker = ThumbnailWorker(media_index, THUMBNAIL_FOLDER)
+
+def _zip_dos_datetime(mtime):
+    t = time.localtime(mtime)
+    if t.tm_year < 1980:
+        return 0, (1 << 5) | 1
+    return (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2), ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+
+class ZipStream:
+    """
+    Uncompressed (store mode) ZIP64 archive generated on the fly.
+
+    Sizes are known up front, so the archive length is too. CRCs are
+    computed while the data streams and written in a data descriptor after
+    each member, which keeps memory constant and needs no temp file. Every
+    member carries ZIP64 fields, so recordings and archives over 4 GiB work.
+    Each file is read up to the size it had when the archive was planned,
+    which makes a recording that is still growing safe to include.
+    """
+
+    def __init__(self, files):
+        """
+        Args:
+            files (list): (archive name, path, size, mtime) tuples
+        """
+        self.files = files
+
+    @staticmethod
+    def _local_header(name, dos_time, dos_date):
+        extra = struct.pack('<HHQQ', 0x0001, 16, 0, 0)
+        return struct.pack('<IHHHHHIIIHH', 0x04034b50, 45, 0x0808, 0, dos_time, dos_date,
+                           0, 0xffffffff, 0xffffffff, len(name), len(extra)) + name + extra
+
+    @staticmethod
+    def _central_header(name, dos_time, dos_date, crc, size, offset):
+        extra = struct.pack('<HHQQQ', 0x0001, 24, size, size, offset)
+        return struct.pack('<IHHHHHHIIIHHHHHII', 0x02014b50, (3 << 8) | 45, 45, 0x0808, 0, dos_time, dos_date,
+                           crc, 0xffffffff, 0xffffffff, len(name), len(extra), 0, 0, 0,
+                           0o100644 << 16, 0xffffffff) + name + extra
+
+    def _end_records(self, count, directory_size, directory_offset):
+        zip64_end = struct.pack('<IQHHIIQQQQ', 0x06064b50, 44, 45, 45, 0, 0, count, count,
+                                directory_size, directory_offset)
+        locator = struct.pack('<IIQI', 0x07064b50, 0, directory_offset + directory_size, 1)
+        end = struct.pack('<IHHHHIIH', 0x06054b50, 0, 0, min(count, 0xffff), min(count, 0xffff),
+                          min(directory_size, 0xffffffff), min(directory_offset, 0xffffffff), 0)
+        return zip64_end + locator + end
+
+    def __len__(self):
+        length = 0
+        for name, _, size, _ in self.files:
+            name = name.encode()
+            # local header + data + descriptor, then the central directory entry
+            length += (30 + len(name) + 20) + size + 24 + (46 + len(name) + 28)
+        return length + 56 + 20 + 22
+
+    def __iter__(self):
+        offset = 0
+        directory = []
+        for name, path, size, mtime in self.files:
+            name = name.encode()
+            dos_time, dos_date = _zip_dos_datetime(mtime)
+            header = self._local_header(name, dos_time, dos_date)
+            yield header
+            crc = 0
+            with open(path, 'rb') as f:
+                fd = f.fileno()
+                position = 0
+                while position < size:
+                    chunk = os.pread(fd, min(MEDIA_CHUNK_SIZE, size - position), position)
+                    if not chunk:
+                        raise OSError(f'{path} shrank while it was being archived')
+                    crc = zlib.crc32(chunk, crc)
+                    position += len(chunk)
+                    yield chunk
+            yield struct.pack('<IIQQ', 0x08074b50, crc, size, size)
+            directory.append(self._central_header(name, dos_time, dos_date, crc, size, offset))
+            offset += len(header) + size + 24
+        yield from directory
+        yield self._end_records(len(directory), sum(len(entry) for entry in directory), offset)
+
+
+class StoragePolicy:
+    """
+    Keeps free space on the media card above a watermark while the DVR records.
+
+    Usage comes from statvfs, which is a single syscall. When auto-pruning
+    is enabled and the free fraction drops below STORAGE_LOW_WATERMARK, the
+    oldest recordings and finished telemetry sessions are deleted until
+    STORAGE_HIGH_WATERMARK is free again. Pinned recordings and recordings
+    that are still growing are never pruned or deleted. Pins are kept in a
+    small JSON file next to the recordings.
+    """
+
+    def __init__(self, index, folder, thumbnail_folder, telemetry=None):
+        self.index = index
+        self.folder = folder
+        self.thumbnail_folder = thumbnail_folder
+        self.telemetry = telemetry
+        self.pins_path = os.path.join(folder, '.pinned.json')
+        self._pins = None
+        self._pruned = deque(maxlen=50)
+        self._lock = threading.Lock()
+        self._thread = None
+        self.last_error = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='storage-policy', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                if STORAGE_AUTO_PRUNE:
+                    self.prune()
+            except Exception as e:
+                self.last_error = str(e)
+                logger.exception(f"Storage policy error: {str(e)}")
+            time.sleep(STORAGE_CHECK_INTERVAL)
+
+    def usage(self):
+        """Return total, used and free bytes of the media filesystem and its state."""
+        try:
+            stat = os.statvfs(self.folder)
+        except OSError:
+            return None
+        total = stat.f_blocks * stat.f_frsize
+        free = stat.f_bavail * stat.f_frsize
+        ratio = free / total if total else 0
+        if ratio < STORAGE_LOW_WATERMARK:
+            state = 'critical'
+        elif ratio < STORAGE_HIGH_WATERMARK:
+            state = 'low'
+        else:
+            state = 'ok'
+        return {
+            'total': total,
+            'used': total - stat.f_bfree * stat.f_frsize,
+            'free': free,
+            'free_ratio': round(ratio, 4),
+            'state': state
+        }
+
+    def _load_pins(self):
+        if self._pins is None:
+            try:
+                with open(self.pins_path) as f:
+                    self._pins = set(json.load(f))
+            except (OSError, ValueError):
+                self._pins = set()
+        return self._pins
+
+    def pinned(self):
+        with self._lock:
+            return set(self._load_pins())
+
+    def set_pinned(self, name, pinned):
+        with self._lock:
+            pins = self._load_pins()
+            if pinned:
+                pins.add(name)
+            else:
+                pins.discard(name)
+            tmp_path = self.pins_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(sorted(pins), f)
+            os.replace(tmp_path, self.pins_path)
+
+    def _delete(self, name):
+        os.remove(os.path.join(self.folder, name))
+        thumbnail = os.path.join(self.thumbnail_folder, os.path.splitext(name)[0] + '.jpg')
+        if os.path.exists(thumbnail):
+            os.remove(thumbnail)
+
+    def _growing(self, name, path):
+        """True while the DVR may still be writing the recording."""
+        item = self.index.get(name)
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return False
+        return item is None or not item['parsed'] or mtime >= time.time() - MEDIA_GROWING_WINDOW
+
+    def delete(self, names):
+        """
+        Delete recordings by name.
+
+        Returns:
+            dict: {name: 'deleted', 'pinned', 'growing', 'not_found' or an error message}
+        """
+        results = {}
+        self.index.refresh()
+        with self._lock:
+            pins = self._load_pins()
+            for name in names:
+                path = safe_join(self.folder, name)
+                if path is None or not name.lower().endswith(VIDEO_EXTENSIONS) or not os.path.isfile(path):
+                    results[name] = 'not_found'
+                elif name in pins:
+                    results[name] = 'pinned'
+                elif self._growing(name, path):
+                    results[name] = 'growing'
+                else:
+                    try:
+                        self._delete(name)
+                        results[name] = 'deleted'
+                    except OSError as e:
+                        results[name] = str(e)
+        return results
+
+    def prune(self):
+        """
+        Delete the oldest unpinned, settled recordings and finished telemetry
+        sessions while free space is below the low watermark.
+        """
+        usage = self.usage()
+        if usage is None or usage['free_ratio'] >= STORAGE_LOW_WATERMARK:
+            return []
+        target = usage['total'] * STORAGE_HIGH_WATERMARK
+        self.index.refresh()
+        pruned = []
+        with self._lock:
+            pins = self._load_pins()
+            settled_before = time.time() - MEDIA_GROWING_WINDOW
+            candidates = [
+                (item['mtime'], item['name'], item['size'], 'recording')
+                for item in self.index.entries()
+                if item['name'] not in pins and item['parsed'] and item['mtime'] < settled_before
+            ]
+            if self.telemetry is not None:
+                candidates += [
+                    (session['mtime'], session['session'], session['size'], 'telemetry')
+                    for session in self.telemetry.sessions() if not session['recording']
+                ]
+            candidates.sort()
+            free = usage['free']
+            for _, name, size, kind in candidates:
+                if free >= target:
+                    break
+                try:
+                    if kind == 'telemetry':
+                        if not self.telemetry.delete(name):
+                            continue
+                    else:
+                        self._delete(name)
+                except OSError as e:
+                    self.last_error = str(e)
+                    continue
+                free += size
+                entry = {'name': name, 'kind': kind, 'size': size, 'time': time.time()}
+                self._pruned.append(entry)
+                pruned.append(entry)
+                logger.warning(f"Pruned {kind} {name} to free space on {self.folder}")
+        return pruned
+
+    def status(self):
+        with self._lock:
+            pins = sorted(self._load_pins())
+            pruned = list(self._pruned)
+        return {
+            'usage': self.usage(),
+            'low_watermark': STORAGE_LOW_WATERMARK,
+            'high_watermark': STORAGE_HIGH_WATERMARK,
+            'auto_prune': STORAGE_AUTO_PRUNE,
+            'pinned': pins,
+            'pruned': pruned[-10:],
+            'last_error': self.last_error
+        }
+
+storage_policy = StoragePolicy(media_index, MEDIA_FOLDER, THUMBNAIL_FOLDER, telemetry_recorder)
+
+class FingerprintService:
+    """
+    Background content digests for config files, keys and recordings.
+
+    Digests are cached by (device, inode, size, mtime_ns), so a file is
+    hashed once and again only after it changes; the recording cache is
+    persisted next to the recordings because hashing a multi-GB file on the
+    SD card takes minutes. Hashing runs on one niced thread with large
+    sequential reads, and the pages it read are dropped from the page cache
+    afterwards so it does not evict what playback and the DVR need.
+    Recordings that are still growing are skipped until they settle.
+    Only recordings are serialized on the hash lock; the small whitelisted
+    files are hashed straight away so pages never wait behind a recording.
+    """
+
+    def __init__(self, index, paths, cache_path):
+        self.index = index
+        self.paths = paths
+        self.cache_path = cache_path
+        self._cache = None
+        self._dirty = False
+        self._saved = 0.0
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._hash_lock = threading.Lock()
+        self._thread = None
+        self.current = None
+        self.last_error = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='fingerprints', daemon=True)
+                self._thread.start()
+
+    def wakeup(self):
+        self._wakeup.set()
+
+    @staticmethod
+    def identity(stat):
+        return f'{stat.st_dev}:{stat.st_ino}:{stat.st_size}:{stat.st_mtime_ns}'
+
+    def _load_cache(self):
+        if self._cache is None:
+            try:
+                with open(self.cache_path) as f:
+                    self._cache = json.load(f)
+            except (OSError, ValueError):
+                self._cache = {}
+        return self._cache
+
+    def _save_cache(self):
+        self._dirty = False
+        self._saved = time.monotonic()
+        try:
+            tmp_path = self.cache_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self._cache, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logger.error(f"Error saving fingerprint cache: {str(e)}")
+
+    def _run(self):
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+        except (AttributeError, OSError):
+            pass
+        while True:
+            try:
+                self.scan()
+            except Exception as e:
+                self.last_error = str(e)
+                logger.exception(f"Fingerprint scan error: {str(e)}")
+            self._wakeup.wait(FINGERPRINT_SCAN_INTERVAL)
+            self._wakeup.clear()
+
+    @staticmethod
+    def _hash(path, algorithms):
+        hashes = {name: hashlib.new(name) for name in algorithms}
+        buffer = bytearray(FINGERPRINT_CHUNK_SIZE)
+        view = memoryview(buffer)
+        with open(path, 'rb', buffering=0) as f:
+            fd = f.fileno()
+            if hasattr(os, 'posix_fadvise'):
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            while True:
+                count = f.readinto(buffer)
+                if not count:
+                    break
+                for digest in hashes.values():
+                    digest.update(view[:count])
+            if hasattr(os, 'posix_fadvise'):
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        return {name: digest.hexdigest() for name, digest in hashes.items()}
+
+    def get(self, path, compute=False, algorithms=('sha256',)):
+        """
+        Return the cached digests of path, e.g. {'sha256': ..., 'identity': ...}.
+
+        Args:
+            compute (bool): Hash the file now if no current digest is cached
+            algorithms (tuple): hashlib names that must be present
+
+        Returns:
+            dict: The digests, or None if the file is missing or not hashed yet
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        identity = self.identity(stat)
+        with self._lock:
+            entry = self._load_cache().get(path)
+        if entry is None or entry['identity'] != identity:
+            entry = {'identity': identity, 'size': stat.st_size}
+        missing = [name for name in algorithms if name not in entry]
+        if not missing:
+            return entry
+        if not compute:
+            return None
+
+        if path in self.paths:
+            digests = self._hash(path, missing)
+        else:
+            with self._hash_lock:
+                digests = self._hash(path, missing)
+        try:
+            if self.identity(os.stat(path)) != identity:
+                # Changed while it was being read; the digest matches neither version
+                return None
+        except OSError:
+            return None
+        entry = {**entry, **digests}
+        with self._lock:
+            self._load_cache()[path] = entry
+            self._dirty = True
+        return entry
+
+    def md5(self, path):
+        """MD5 of a small file such as gs.key, or None if it doesn't exist."""
+        entry = self.get(path, compute=True, algorithms=('md5',))
+        return entry['md5'] if entry else None
+
+    def scan(self):
+        """Hash every whitelisted file and settled recording that has no current digest."""
+        self.index.refresh()
+        recordings = [
+            os.path.join(self.index.folder, item['name'])
+            for item in sorted(self.index.entries(), key=lambda item: item['mtime'], reverse=True)
+            if item['parsed']
+        ]
+        with self._lock:
+            cache = self._load_cache()
+            wanted = set(recordings) | set(self.paths)
+            stale = [path for path in cache if path not in wanted]
+            for path in stale:
+                del cache[path]
+            if stale:
+                self._dirty = True
+
+        for path in list(self.paths) + recordings:
+            self.current = path
+            try:
+                self.get(path, compute=True)
+            except OSError as e:
+                self.last_error = f'{path}: {str(e)}'
+            with self._lock:
+                if self._dirty and time.monotonic() - self._saved >= FINGERPRINT_SAVE_INTERVAL:
+                    self._save_cache()
+        self.current = None
+        with self._lock:
+            if self._dirty:
+                self._save_cache()
+
+    def checksums(self):
+        """
+        Return the SHA-256 of every recording and whitelisted file.
+
+        Returns:
+            dict: 'recordings' and 'files' lists; sha256 is None until hashed
+        """
+        self.index.refresh()
+        recordings = []
+        for item in sorted(self.index.entries(), key=lambda item: item['name']):
+            entry = self.get(os.path.join(self.index.folder, item['name']))
+            recordings.append({
+                'name': item['name'],
+                'size': item['size'],
+                'sha256': entry['sha256'] if entry else None
+            })
+        files = []
+        for path in self.paths:
+            if os.path.exists(path):
+                entry = self.get(path)
+                files.append({'path': path, 'sha256': entry['sha256'] if entry else None})
+        return {'recordings': recordings, 'files': files}
+
+    def status(self):
+        with self._lock:
+            hashed = len(self._load_cache())
+        return {
+            'hashed': hashed,
+            'current': self.current,
+            'last_error': self.last_error
+        }
+
+fingerprints = FingerprintService(media_index, CONFIG_WHITELIST + [GS_KEY_PATH],
+                                  os.path.join(MEDIA_FOLDER, '.fingerprints.json'))
+
+def parse_byte_ranges(header, size):
+    """
+    Parse a Range header into satisfiable (start, end) pairs, end inclusive.
+
+    Returns:
+        list: Byte ranges, [] if none is satisfiable, or None if the header
+        is malformed or not a bytes range (the Range is then ignored)
+    """
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or not spec:
+        return None
+    ranges = []
+    for part in spec.split(','):
+        first, sep, last = part.strip().partition('-')
+        if not sep:
+            return None
+        try:
+            if not first:
+                # Suffix range: the last N bytes
+                length = int(last)
+                if length <= 0:
+                    continue
+                start, end = max(size - length, 0), size - 1
+            else:
+                start = int(first)
+                end = int(last) if last else size - 1
+                if last and end < start:
+                    return None
+                end = min(end, size - 1)
+        except ValueError:
+            return None
+        if start < size:
+            ranges.append((start, end))
+    if len(ranges) > MEDIA_MAX_RANGES:
+        return None
+    return ranges
+
+def _file_chunks(path, ranges, boundary=None, content_type=None, size=None):
+    """Yield the bytes of the given ranges, as multipart/byteranges parts if boundary is set."""
+    with open(path, 'rb') as f:
+        fd = f.fileno()
+        for start, end in ranges:
+            if boundary:
+                yield (f'\r\n--{boundary}\r\nContent-Type: {content_type}\r\n'
+                       f'Content-Range: bytes {start}-{end}/{size}\r\n\r\n').encode()
+            offset = start
+            while offset <= end:
+                chunk = os.pread(fd, min(MEDIA_CHUNK_SIZE, end - offset + 1), offset)
+                if not chunk:
+                    return
+                offset += len(chunk)
+                yield chunk
+        if boundary:
+            yield f'\r\n--{boundary}--\r\n'.encode()
+
+def content_disposition(disposition, filename):
+    """
+    Build a Content-Disposition header value that survives any file name.
+
+    Quotes and backslashes are escaped, and names that are not ASCII get an
+    ASCII fallback plus an RFC 5987 filename* parameter, as send_file does.
+    """
+    try:
+        filename.encode('ascii')
+        options = {'filename': filename}
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', filename).encode('ascii', 'ignore').decode('ascii')
+        options = {'filename': simple, 'filename*': "UTF-8''" + urllib.parse.quote(filename, safe="!#$&+-.^_`|~")}
+    return dump_options_header(disposition, options)
+
+def send_media(path, as_attachment=False):
+    """
+    Serve a recording with HTTP range support.
+
+    Supports single and multiple byte ranges, If-Range, and conditional
+    requests against an ETag built from inode, mtime and size. Once the
+    fingerprint service has hashed the file, its SHA-256 is sent in
+    Repr-Digest and Digest headers for end-to-end verification. Whole files
+    and single ranges are handed to the server's wsgi.file_wrapper when it
+    provides one, which lets servers that implement it use sendfile.
+    """
+    stat = os.stat(path)
+    size = stat.st_size
+    etag = f'{stat.st_ino:x}-{stat.st_mtime_ns:x}-{size:x}'
+    content_type = MEDIA_CONTENT_TYPES.get(os.path.splitext(path)[1].lower(), 'application/octet-stream')
+
+    headers = {
+        'Accept-Ranges': 'bytes',
+        'Cache-Control': 'no-cache',
+        'Last-Modified': http_date(stat.st_mtime)
+    }
+    disposition = 'attachment' if as_attachment else 'inline'
+    headers['Content-Disposition'] = content_disposition(disposition, os.path.basename(path))
+    # Only already computed digests are sent; hashing a recording here would stall the response
+    fingerprint = fingerprints.get(path)
+    if fingerprint is not None:
+        digest = base64.b64encode(bytes.fromhex(fingerprint['sha256'])).decode()
+        headers['Repr-Digest'] = f'sha-256=:{digest}:'
+        headers['Digest'] = f'SHA-256={digest}'
+
+    if request.if_none_match.contains(etag):
+        response = Response(status=304, headers=headers)
+        response.set_etag(etag)
+        return response
+
+    ranges = None
+    range_header = request.headers.get('Range')
+    if range_header:
+        if_range = request.headers.get('If-Range')
+        if if_range is None or if_range.strip('"') == etag or if_range == headers['Last-Modified']:
+            ranges = parse_byte_ranges(range_header, size)
+
+    if ranges == []:
+        headers['Content-Range'] = f'bytes */{size}'
+        response = Response(status=416, headers=headers)
+        response.set_etag(etag)
+        return response
+
+    if ranges is None or len(ranges) == 1:
+        start, end = ranges[0] if ranges else (0, size - 1)
+        length = end - start + 1 if size else 0
+        file_wrapper = request.environ.get('wsgi.file_wrapper')
+        if file_wrapper is not None:
+            f = open(path, 'rb')
+            f.seek(start)
+            body = file_wrapper(f, MEDIA_CHUNK_SIZE)
+        else:
+            body = _file_chunks(path, [(start, end)] if size else [])
+        response = Response(body, status=206 if ranges else 200, mimetype=content_type,
+                            headers=headers, direct_passthrough=True)
+        response.content_length = length
+        if ranges:
+            response.headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+    else:
+        boundary = uuid.uuid4().hex
+        length = sum(
+            len((f'\r\n--{boundary}\r\nContent-Type: {content_type}\r\n'
+                 f'Content-Range: bytes {start}-{end}/{size}\r\n\r\n').encode()) + end - start + 1
+            for start, end in ranges
+        ) + len(f'\r\n--{boundary}--\r\n')
+        response = Response(_file_chunks(path, ranges, boundary, content_type, size), status=206,
+                            headers=headers, direct_passthrough=True)
+        response.content_type = f'multipart/byteranges; boundary={boundary}'
+        response.content_length = length
+    response.set_etag(etag)
+    return response
+
+class StaticAssets:
+    """
+    Text assets under static/, held in memory with precompressed variants.
+
+    Each asset gets a content hash, used both as its ETag and in a
+    fingerprinted URL (css/styles.<hash>.css) that can be cached forever.
+    Gzip, and Brotli when the brotli module is installed, are built once by
+    a background thread at maximum level; a variant is only kept when it
+    saves at least STATIC_MIN_SAVING of the original. Thumbnails and other
+    binary files are left to Flask's regular static handler.
+    """
+
+    def __init__(self, folder, extensions, exclude=()):
+        self.folder = folder
+        self.extensions = extensions
+        self.exclude = tuple(exclude)
+        self._lock = threading.Lock()
+        self._assets = {}
+        self._hashed = {}
+        self._scanned = False
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='static-assets', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        try:
+            for name in self.names():
+                self._compress(name)
+        except Exception:
+            logger.exception('Precompressing static assets failed')
+
+    def names(self):
+        self._scan()
+        with self._lock:
+            return list(self._assets)
+
+    def _scan(self):
+        if self._scanned:
+            return
+        for root, dirs, files in os.walk(self.folder):
+            dirs[:] = [d for d in dirs if os.path.join(root, d) not in self.exclude]
+            for filename in files:
+                if filename.lower().endswith(self.extensions):
+                    self._load(os.path.relpath(os.path.join(root, filename), self.folder).replace(os.sep, '/'))
+        self._scanned = True
+
+    def _load(self, name):
+        path = os.path.join(self.folder, name)
+        try:
+            mtime = os.stat(path).st_mtime
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        stem, ext = os.path.splitext(name)
+        asset = {
+            'name': name,
+            'hashed': f'{stem}.{digest}{ext}',
+            'etag': digest,
+            'mtime': mtime,
+            'mimetype': mimetypes.guess_type(name)[0] or 'application/octet-stream',
+            'variants': {'identity': data}
+        }
+        with self._lock:
+            old = self._assets.get(name)
+            if old is not None:
+                self._hashed.pop(old['hashed'], None)
+            self._assets[name] = asset
+            self._hashed[asset['hashed']] = name
+        return asset
+
+    def _compress(self, name):
+        with self._lock:
+            asset = self._assets.get(name)
+        if asset is None:
+            return
+        data = asset['variants']['identity']
+        variants = {'gzip': lambda: gzip.compress(data, 9, mtime=0)}
+        try:
+            import brotli
+        except ImportError:
+            pass
+        else:
+            variants['br'] = lambda: brotli.compress(data, quality=11)
+        for encoding, compress in variants.items():
+            compressed = compress()
+            if len(compressed) <= len(data) * (1 - STATIC_MIN_SAVING):
+                # Replaced rather than mutated so readers never see a half-built dict
+                with self._lock:
+                    asset['variants'] = {**asset['variants'], encoding: compressed}
+
+    def lookup(self, filename):
+        """Return (asset, fingerprinted) for a plain or fingerprinted name, or (None, False)."""
+        self._scan()
+        with self._lock:
+            name = self._hashed.get(filename)
+            asset = self._assets.get(name or filename)
+        if asset is not None and app.debug:
+            # Pick up edits while developing; deployed assets change only with a restart
+            try:
+                if os.stat(os.path.join(self.folder, asset['name'])).st_mtime != asset['mtime']:
+                    asset = self._load(asset['name'])
+                    name = None
+            except OSError:
+                return None, False
+        return asset, name is not None
+
+    def url_name(self, filename):
+        asset, _ = self.lookup(filename)
+        return asset['hashed'] if asset is not None else filename
+
+    def response(self, asset, fingerprinted):
+        variants = asset['variants']
+        encoding = 'identity'
+        for candidate in ('br', 'gzip'):
+            if candidate in variants and request.accept_encodings[candidate]:
+                encoding = candidate
+                break
+        etag = asset['etag'] if encoding == 'identity' else f"{asset['etag']}-{encoding}"
+        headers = {
+            'Cache-Control': STATIC_IMMUTABLE if fingerprinted else 'no-cache',
+            'Last-Modified': http_date(asset['mtime'])
+        }
+        if len(variants) > 1:
+            headers['Vary'] = 'Accept-Encoding'
+        if request.if_none_match.contains(etag):
+            response = Response(status=304, headers=headers)
+        else:
+            body = variants[encoding]
+            response = Response(body, mimetype=asset['mimetype'], headers=headers)
+            if encoding != 'identity':
+                response.headers['Content-Encoding'] = encoding
+            response.content_length = len(body)
+        response.set_etag(etag)
+        return response
+
+
+static_assets = StaticAssets(app.static_folder, STATIC_COMPRESS_EXTENSIONS, exclude=[THUMBNAIL_FOLDER])
+
+@app.url_defaults
+def fingerprint_static_url(endpoint, values):
+    """Point url_for('static', ...) at the fingerprinted name so browsers can cache it for good."""
+    if endpoint == 'static' and 'filename' in values and not app.debug:
+        values['filename'] = static_assets.url_name(values['filename'])
+
+def serve_static(filename):
+    asset, fingerprinted = static_assets.lookup(filename)
+    if asset is None:
+        return app.send_static_file(filename)
+    return static_assets.response(asset, fingerprinted)
+
+app.view_functions['static'] = serve_static
+
+def _mp4_box(kind, payload):
+    if len(payload) + 8 > 0xffffffff:
+        return struct.pack('>I4sQ', 1, kind, len(payload) + 16) + payload
+    return struct.pack('>I4s', len(payload) + 8, kind) + payload
+
+def _mp4_with_duration(payload, offset_v0, offset_v1, duration):
+    """Return an mvhd/tkhd/mdhd payload with its duration field replaced."""
+    data = bytearray(payload)
+    if data[0] == 1:
+        struct.pack_into('>Q', data, offset_v1, duration)
+    else:
+        struct.pack_into('>I', data, offset_v0, min(duration, 0xffffffff))
+    return bytes(data)
+
+
+class Mp4Track:
+    """Sample tables of one MP4 track, decoded for clipping."""
+
+    def __init__(self):
+        self.handler = b''
+        self.timescale = 1
+        self.tkhd = b''
+        self.mdhd = b''
+        self.hdlr = b''
+        self.minf_boxes = []
+        self.stsd = b''
+        self.sdi = 1
+        self.times = array('Q')
+        self.durations = array('L')
+        self.ctts = None
+        self.ctts_version = 0
+        self.sizes = array('L')
+        self.offsets = array('Q')
+        self.sync = None
+
+    def keyframes(self):
+        """Sample indexes that are sync samples."""
+        return self.sync if self.sync is not None else range(len(self.times))
+
+
+class Mp4KeyframeIndex:
+    """
+    Keyframe index and lossless clipper for a progressive (non-fragmented) MP4.
+
+    The sample tables (stts, ctts, stss, stsz, stsc, stco/co64) of every
+    audio and video track are decoded into compact arrays once. A clip is
+    a new ftyp/moov followed by one mdat that copies the original bytes
+    spanning the selected samples, so nothing is re-encoded.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.ftyp = b''
+        self.mvhd = b''
+        self.timescale = 1
+        self.tracks = []
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            moov = None
+            for kind, start, end in _mp4_boxes(f, 0, size):
+                if kind == b'ftyp':
+                    f.seek(start)
+                    self.ftyp = _mp4_box(kind, f.read(end - start))
+                elif kind == b'moov':
+                    moov = (start, end)
+            if moov is None:
+                raise ValueError('No moov box, the recording may be incomplete')
+            for kind, start, end in _mp4_boxes(f, *moov):
+                if kind == b'mvhd':
+                    f.seek(start)
+                    self.mvhd = f.read(end - start)
+                    self.timescale = struct.unpack_from('>I', self.mvhd, 20 if self.mvhd[0] == 1 else 12)[0]
+                elif kind == b'mvex':
+                    raise ValueError('Fragmented MP4 is not supported')
+                elif kind == b'trak':
+                    track = self._read_track(f, start, end)
+                    if track.handler in (b'vide', b'soun') and len(track.times):
+                        self.tracks.append(track)
+        self.video = next((track for track in self.tracks if track.handler == b'vide'), None)
+
+    @staticmethod
+    def _read_track(f, start, end):
+        track = Mp4Track()
+        tables = {}
+        for kind, s, e in _mp4_boxes(f, start, end):
+            if kind == b'tkhd':
+                f.seek(s)
+                track.tkhd = f.read(e - s)
+            elif kind == b'mdia':
+                for mdia_kind, ms, me in _mp4_boxes(f, s, e):
+                    f.seek(ms)
+                    if mdia_kind == b'mdhd':
+                        track.mdhd = f.read(me - ms)
+                        track.timescale = struct.unpack_from('>I', track.mdhd, 20 if track.mdhd[0] == 1 else 12)[0]
+                    elif mdia_kind == b'hdlr':
+                        track.hdlr = f.read(me - ms)
+                        track.handler = track.hdlr[8:12]
+                    elif mdia_kind == b'minf':
+                        for minf_kind, ns, ne in _mp4_boxes(f, ms, me):
+                            f.seek(ns)
+                            if minf_kind != b'stbl':
+                                track.minf_boxes.append(_mp4_box(minf_kind, f.read(ne - ns)))
+                                continue
+                            for stbl_kind, ts, te in _mp4_boxes(f, ns, ne):
+                                f.seek(ts)
+                                tables[stbl_kind] = f.read(te - ts)
+
+        if b'stsd' not in tables or b'stts' not in tables or b'stsz' not in tables:
+            return track
+        track.stsd = _mp4_box(b'stsd', tables[b'stsd'])
+
+        data = tables[b'stts']
+        count = struct.unpack_from('>I', data, 4)[0]
+        entries = struct.unpack_from(f'>{count * 2}I', data, 8)
+        elapsed = 0
+        for sample_count, delta in zip(entries[::2], entries[1::2]):
+            for _ in range(sample_count):
+                track.times.append(elapsed)
+                track.durations.append(delta)
+                elapsed += delta
+
+        data = tables[b'stsz']
+        sample_size, sample_count = struct.unpack_from('>II', data, 4)
+        if sample_size:
+            track.sizes = array('L', [sample_size]) * sample_count
+        else:
+            track.sizes = array('L', struct.unpack_from(f'>{sample_count}I', data, 12))
+
+        if b'ctts' in tables:
+            data = tables[b'ctts']
+            track.ctts_version = data[0]
+            count = struct.unpack_from('>I', data, 4)[0]
+            entries = struct.unpack_from(f">{count * 2}{'i' if data[0] == 1 else 'I'}", data, 8)
+            track.ctts = array('l')
+            for sample_count, offset in zip(entries[::2], entries[1::2]):
+                track.ctts.extend([offset] * sample_count)
+
+        if b'stss' in tables:
+            data = tables[b'stss']
+            count = struct.unpack_from('>I', data, 4)[0]
+            track.sync = array('L', (number - 1 for number in struct.unpack_from(f'>{count}I', data, 8)))
+
+        if b'co64' in tables:
+            data = tables[b'co64']
+            count = struct.unpack_from('>I', data, 4)[0]
+            chunk_offsets = struct.unpack_from(f'>{count}Q', data, 8)
+        else:
+            data = tables[b'stco']
+            count = struct.unpack_from('>I', data, 4)[0]
+            chunk_offsets = struct.unpack_from(f'>{count}I', data, 8)
+
+        data = tables[b'stsc']
+        count = struct.unpack_from('>I', data, 4)[0]
+        stsc = struct.unpack_from(f'>{count * 3}I', data, 8)
+        runs = list(zip(stsc[::3], stsc[1::3], stsc[2::3]))
+        track.sdi = runs[0][2] if runs else 1
+        sample = 0
+        total = min(len(track.times), len(track.sizes))
+        for i, (first_chunk, samples_per_chunk, _) in enumerate(runs):
+            last_chunk = runs[i + 1][0] - 1 if i + 1 < len(runs) else len(chunk_offsets)
+            for chunk in range(first_chunk, last_chunk + 1):
+                offset = chunk_offsets[chunk - 1]
+                for _ in range(samples_per_chunk):
+                    if sample >= total:
+                        break
+                    track.offsets.append(offset)
+                    offset += track.sizes[sample]
+                    sample += 1
+        del track.times[sample:]
+        del track.durations[sample:]
+        del track.sizes[sample:]
+        return track
+
+    @property
+    def duration(self):
+        return max((track.times[-1] + track.durations[-1]) / track.timescale for track in self.tracks) if self.tracks else 0
+
+    def keyframes(self):
+        """Return [(seconds, byte offset)] of the video keyframes."""
+        track = self.video
+        if track is None:
+            return []
+        return [(round(track.times[i] / track.timescale, 3), track.offsets[i]) for i in track.keyframes()]
+
+    def clip(self, start, end):
+        """
+        Plan a keyframe-aligned clip between start and end seconds.
+
+        The clip starts at the last keyframe at or before start and ends
+        at the first keyframe at or after end.
+
+        Returns:
+            tuple: (header bytes, file offset, byte count, clip start, clip end)
+        """
+        reference = self.video or self.tracks[0]
+        keyframes = list(reference.keyframes())
+        key_times = [reference.times[i] / reference.timescale for i in keyframes]
+        first = keyframes[max(bisect.bisect_right(key_times, start) - 1, 0)]
+        last_position = bisect.bisect_left(key_times, end)
+        clip_start = reference.times[first] / reference.timescale
+        if last_position < len(keyframes):
+            clip_end = reference.times[keyframes[last_position]] / reference.timescale
+        else:
+            clip_end = self.duration
+        if clip_end <= clip_start:
+            raise ValueError('Clip range is empty')
+
+        selections = []
+        for track in self.tracks:
+            low = bisect.bisect_left(track.times, math.ceil(clip_start * track.timescale))
+            high = bisect.bisect_left(track.times, math.ceil(clip_end * track.timescale))
+            if track is reference:
+                low = first
+            if high > low:
+                selections.append((track, low, high))
+
+        span_start = min(min(track.offsets[low:high]) for track, low, high in selections)
+        span_end = max(max(o + s for o, s in zip(track.offsets[low:high], track.sizes[low:high]))
+                       for track, low, high in selections)
+
+        # co64 entries have a fixed size, so the moov size does not depend on the offsets
+        moov = self._build_moov(selections, 0, span_start)
+        data_start = len(self.ftyp) + len(moov) + 16
+        moov = self._build_moov(selections, data_start, span_start)
+        header = self.ftyp + moov + struct.pack('>I4sQ', 1, b'mdat', span_end - span_start + 16)
+        return header, span_start, span_end - span_start, clip_start, clip_end
+
+    def _build_moov(self, selections, data_start, span_start):
+        traks = []
+        movie_duration = 0
+        for track, low, high in selections:
+            durations = track.durations[low:high]
+            media_duration = sum(durations)
+            track_duration = media_duration * self.timescale // track.timescale
+            movie_duration = max(movie_duration, track_duration)
+
+            stts = []
+            for delta, group in itertools.groupby(durations):
+                stts.append((len(list(group)), delta))
+            stbl = [
+                track.stsd,
+                _mp4_box(b'stts', struct.pack(f'>II{len(stts) * 2}I', 0, len(stts), *itertools.chain.from_iterable(stts)))
+            ]
+            if track.ctts is not None:
+                ctts = [(len(list(group)), offset) for offset, group in itertools.groupby(track.ctts[low:high])]
+                code = 'i' if track.ctts_version == 1 else 'I'
+                stbl.append(_mp4_box(b'ctts', struct.pack(f'>BxxxI{len(ctts) * 2}{code}', track.ctts_version, len(ctts),
+                                                          *itertools.chain.from_iterable(ctts))))
+            if track.sync is not None:
+                sync = [i - low + 1 for i in track.sync if low <= i < high]
+                stbl.append(_mp4_box(b'stss', struct.pack(f'>II{len(sync)}I', 0, len(sync), *sync)))
+            count = high - low
+            stbl.append(_mp4_box(b'stsz', struct.pack(f'>III{count}I', 0, 0, count, *track.sizes[low:high])))
+            # One sample per chunk keeps the offsets independent of the original interleaving
+            stbl.append(_mp4_box(b'stsc', struct.pack('>IIIII', 0, 1, 1, 1, track.sdi)))
+            offsets = [offset - span_start + data_start for offset in track.offsets[low:high]]
+            stbl.append(_mp4_box(b'co64', struct.pack(f'>II{count}Q', 0, count, *offsets)))
+
+            minf = _mp4_box(b'minf', b''.join(track.minf_boxes) + _mp4_box(b'stbl', b''.join(stbl)))
+            mdia = _mp4_box(b'mdia', _mp4_box(b'mdhd', _mp4_with_duration(track.mdhd, 16, 24, media_duration))
+                            + _mp4_box(b'hdlr', track.hdlr) + minf)
+            traks.append(_mp4_box(b'trak', _mp4_box(b'tkhd', _mp4_with_duration(track.tkhd, 20, 28, track_duration)) + mdia))
+        mvhd = _mp4_box(b'mvhd', _mp4_with_duration(self.mvhd, 16, 24, movie_duration))
+        return _mp4_box(b'moov', mvhd + b''.join(traks))
+
+
+def _ebml_element(element_id, payload):
+    """Encode an EBML element with an 8-byte size field."""
+    return element_id.to_bytes((element_id.bit_length() + 7) // 8, 'big') + (len(payload) | 1 << 56).to_bytes(8, 'big') + payload
+
+class MkvKeyframeIndex:
+    """
+    Keyframe index and lossless clipper for Matroska recordings.
+
+    Keyframe positions come from the Cues element, located through the
+    SeekHead; files without Cues fall back to walking the Cluster headers.
+    A clip is the original EBML header, an unknown-size Segment with the
+    original Info (minus Duration) and Tracks, and the original Clusters
+    between the chosen cue points, copied byte for byte.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.keyframe_list = []
+        self.duration = 0
+        self.ebml_header = b''
+        self.info = b''
+        self.tracks = b''
+        self.video_track = None
+        with open(path, 'rb') as f:
+            self.file_size = os.fstat(f.fileno()).st_size
+            self._parse(f)
+
+    @staticmethod
+    def _element(f, pos, end):
+        """Read the element header at pos, returning (id, payload start, payload end)."""
+        f.seek(pos)
+        header = f.read(12)
+        element_id, id_len = _ebml_vint(header, 0, keep_marker=True)
+        size, size_len = _ebml_vint(header, id_len)
+        payload = pos + id_len + size_len
+        return element_id, payload, end if size is None else min(payload + size, end)
+
+    def _parse(self, f):
+        element_id, start, end = self._element(f, 0, self.file_size)
+        if element_id == 0x1A45DFA3:  # EBML header
+            f.seek(0)
+            self.ebml_header = f.read(end)
+            element_id, start, end = self._element(f, end, self.file_size)
+        if element_id != 0x18538067:  # Segment
+            raise ValueError('No Matroska Segment found')
+        self.segment_start = start
+        self.segment_end = end
+
+        first_cluster = None
+        cues_position = None
+        timecode_scale = 1000000
+        pos = start
+        while pos < end:
+            element_id, payload, payload_end = self._element(f, pos, end)
+            if element_id == 0x1F43B675:  # Cluster
+                first_cluster = pos
+                break
+            f.seek(payload)
+            data = f.read(payload_end - payload)
+            if element_id == 0x114D9B74:  # SeekHead
+                for _, seek_start, seek_end in _ebml_elements(data, 0, len(data)):
+                    seek = {i: data[s:e] for i, s, e in _ebml_elements(data, seek_start, seek_end)}
+                    if seek.get(0x53AB) == b'\x1c\x53\xbb\x6b':
+                        cues_position = start + int.from_bytes(seek.get(0x53AC, b''), 'big')
+            elif element_id == 0x1549A966:  # Info
+                children = []
+                for info_id, info_start, info_end in _ebml_elements(data, 0, len(data)):
+                    if info_id == 0x2AD7B1:
+                        timecode_scale = int.from_bytes(data[info_start:info_end], 'big')
+                    if info_id == 0x4489:
+                        self.duration = struct.unpack('>f' if info_end - info_start == 4 else '>d', data[info_start:info_end])[0]
+                    else:
+                        children.append(_ebml_element(info_id, data[info_start:info_end]))
+                # The clip is shorter than the recording, so Duration is left out
+                self.info = _ebml_element(element_id, b''.join(children))
+            elif element_id == 0x1654AE6B:  # Tracks
+                self.tracks = _ebml_element(element_id, data)
+                for _, entry_start, entry_end in _ebml_elements(data, 0, len(data)):
+                    fields = {i: data[s:e] for i, s, e in _ebml_elements(data, entry_start, entry_end)}
+                    if int.from_bytes(fields.get(0x83, b''), 'big') == 1 and self.video_track is None:
+                        self.video_track = int.from_bytes(fields.get(0xD7, b''), 'big')
+            elif element_id == 0x1C53BB6B:  # Cues
+                cues_position = pos
+            pos = payload_end
+
+        self.scale = timecode_scale / 1e9
+        self.duration *= self.scale
+        if cues_position is not None:
+            self._read_cues(f, cues_position)
+        if not self.keyframe_list and first_cluster is not None:
+            self.keyframe_list = [(t, offset) for t, offset, _ in self._walk_clusters(f, first_cluster)]
+        self.keyframe_list.sort()
+
+    def _read_cues(self, f, position):
+        element_id, payload, payload_end = self._element(f, position, self.segment_end)
+        if element_id != 0x1C53BB6B:
+            return
+        f.seek(payload)
+        data = f.read(payload_end - payload)
+        for point_id, point_start, point_end in _ebml_elements(data, 0, len(data)):
+            if point_id != 0xBB:  # CuePoint
+                continue
+            cue_time = None
+            for child_id, child_start, child_end in _ebml_elements(data, point_start, point_end):
+                if child_id == 0xB3:  # CueTime
+                    cue_time = int.from_bytes(data[child_start:child_end], 'big')
+                elif child_id == 0xB7 and cue_time is not None:  # CueTrackPositions
+                    fields = {i: data[s:e] for i, s, e in _ebml_elements(data, child_start, child_end)}
+                    track = int.from_bytes(fields.get(0xF7, b''), 'big')
+                    if self.video_track is None or track == self.video_track:
+                        offset = self.segment_start + int.from_bytes(fields.get(0xF1, b''), 'big')
+                        self.keyframe_list.append((round(cue_time * self.scale, 3), offset))
+
+    def _walk_clusters(self, f, pos):
+        """Yield (seconds, offset, end) for consecutive Clusters starting at pos."""
+        while pos < self.segment_end:
+            try:
+                element_id, payload, payload_end = self._element(f, pos, self.segment_end)
+            except (ValueError, IndexError):
+                # Truncated while the recording was still being written
+                return
+            if element_id != 0x1F43B675:
+                return
+            f.seek(payload)
+            data = f.read(min(payload_end - payload, 16))
+            timecode = 0
+            for child_id, child_start, child_end in _ebml_elements(data, 0, len(data)):
+                if child_id == 0xE7:  # Timestamp
+                    timecode = int.from_bytes(data[child_start:child_end], 'big')
+                break
+            yield round(timecode * self.scale, 3), pos, payload_end
+            pos = payload_end
+
+    def keyframes(self):
+        """Return [(seconds, byte offset)] of the cue points."""
+        return self.keyframe_list
+
+    def clip(self, start, end):
+        """
+        Plan a cue-aligned clip between start and end seconds.
+
+        Returns:
+            tuple: (header bytes, file offset, byte count, clip start, clip end)
+        """
+        if not self.keyframe_list:
+            raise ValueError('Recording has no keyframe index')
+        times = [t for t, _ in self.keyframe_list]
+        first = max(bisect.bisect_right(times, start) - 1, 0)
+        last = bisect.bisect_left(times, end)
+        clip_start, span_start = self.keyframe_list[first]
+        if last < len(self.keyframe_list):
+            clip_end, span_end = self.keyframe_list[last]
+        else:
+            clip_end = self.duration or times[-1]
+            span_end = span_start
+            with open(self.path, 'rb') as f:
+                for _, _, cluster_end in self._walk_clusters(f, self.keyframe_list[-1][1]):
+                    span_end = cluster_end
+        if span_end <= span_start:
+            raise ValueError('Clip range is empty')
+        segment = b'\x18\x53\x80\x67\x01\xff\xff\xff\xff\xff\xff\xff'
+        return self.ebml_header + segment + self.info + self.tracks, span_start, span_end - span_start, clip_start, clip_end
+
+
+class KeyframeIndexCache:
+    """Small LRU of keyframe indexes keyed by file identity."""
+
+    def __init__(self, size):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        stat = os.stat(path)
+        key = (path, stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        ext = os.path.splitext(path)[1].lower()
+        if ext not in CLIP_EXTENSIONS:
+            raise ValueError('Only MP4, MOV and MKV recordings can be indexed')
+        index = MkvKeyframeIndex(path) if ext == '.mkv' else Mp4KeyframeIndex(path)
+        with self._lock:
+            self._entries[key] = index
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return index
+
+keyframe_indexes = KeyframeIndexCache(KEYFRAME_INDEX_CACHE_SIZE)
+
+def start_background_services():
+    """Start the shared background threads; safe to call on every request."""
+    stats_collector.start()
+    telemetry_recorder.start()
+    link_monitor.start()
+    thumbnail_worker.start()
+    storage_policy.start()
+    fingerprints.start()
+    static_assets.start()
+    system_sampler.start()
+
+def warm_up(port):
+    """
+    Fill the caches the first pages need, once the server accepts connections.
+
+    Runs in the background so it never delays the socket: templates are
+    compiled (from the bytecode cache when possible), static assets
+    loaded, the media index and config files read and the camera config
+    fetched, before the background services start.
+    """
+    deadline = time.monotonic() + STARTUP_LISTEN_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            break
+        except OSError:
+            time.sleep(0.05)
+    startup.mark('listening')
+
+    for name in app.jinja_env.list_templates():
+        try:
+            app.jinja_env.get_template(name)
+        except TemplateError as e:
+            logger.error(f"Error compiling template {name}: {str(e)}")
+    startup.mark('templates')
+
+    static_assets.names()
+    media_index.refresh()
+    for path in CONFIG_WHITELIST + [ALINK_CONFIG]:
+        try:
+            config_store.document(path)
+        except OSError:
+            pass
+    fingerprints.md5(GS_KEY_PATH)
+    try:
+        if link_monitor.reachable('camera'):
+            camera_config_cache.get()
+    except (subprocess.SubprocessError, OSError, yaml.YAMLError) as e:
+        logger.info(f"Camera config not prefetched: {str(e)}")
+    startup.mark('warm')
+    start_background_services()
+
+def link_gauges():
+    """Gauges from the latest wfb-ng record and the link monitor, computed at scrape time."""
+    gauges = [('webui_wfb_connected', (), int(stats_collector.connected))]
+    record = stats_collector.latest_rx()
+    if record is not None:
+        for ant in record.get('rx_ant_stats', []):
+            labels = (('ant', ant.get('ant')), ('freq', ant.get('freq')))
+            gauges.append(('webui_wfb_rssi_dbm', labels, ant.get('rssi_avg')))
+            gauges.append(('webui_wfb_snr_db', labels, ant.get('snr_avg')))
+        packets = record.get('packets', {})
+        for kind, counts in packets.items():
+            if isinstance(counts, list) and len(counts) == 2:
+                gauges.append(('webui_wfb_packets_total', (('type', kind),), counts[1]))
+        interval_all = (packets.get('all') or [0])[0]
+        if interval_all:
+            gauges.append(('webui_wfb_packet_loss_ratio', (), round((packets.get('lost') or [0])[0] / interval_all, 4)))
+    for name, window in link_analytics.snapshot()['windows'].items():
+        labels = (('window', name),)
+        if window['loss_ratio'] is not None:
+            gauges.append(('webui_wfb_window_loss_ratio', labels, window['loss_ratio']))
+        if window['fec_rec_per_s'] is not None:
+            gauges.append(('webui_wfb_window_fec_recovered_rate', labels, window['fec_rec_per_s']))
+    for name, state in link_monitor.states().items():
+        labels = (('host', name),)
+        gauges.append(('webui_link_up', labels, int(state['state'] != 'down')))
+        if state['rtt_ms'] is not None:
+            gauges.append(('webui_link_rtt_seconds', labels, round(state['rtt_ms'] / 1000, 4)))
+        gauges.append(('webui_link_loss_ratio', labels, state['loss']))
+    return gauges
+
+metrics.add_collector(link_gauges)
+
+def system_gauges():
+    """The latest system sample, one gauge per source and metric."""
+    latest = system_sampler.latest
+    if latest is None:
+        return []
+    gauges = []
+    for column, value in latest['values'].items():
+        source, metric = column.split('/', 1)
+        gauges.append(('webui_system_sample', (('source', source), ('metric', metric)), value))
+    return gauges
+
+metrics.add_collector(system_gauges)
+
+@app.before_request
+def start_request_timer():
+    request.environ['webui.started'] = time.perf_counter()
+    metrics.inc('webui_http_requests_in_flight')
+
+@app.after_request
+def observe_request(response):
+    started = request.environ.get('webui.started')
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.observe('webui_http_request_duration_seconds', (('route', route), ('method', request.method)),
+                        time.perf_counter() - started)
+        metrics.inc('webui_http_responses_total', (('route', route), ('status', str(response.status_code))))
+    startup.mark('first_response')
+    return response
+
+@app.teardown_request
+def finish_request(error):
+    if 'webui.started' in request.environ:
+        metrics.inc('webui_http_requests_in_flight', amount=-1)
+    if error is not None:
+        record_error(error)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    start_background_services()
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/startup')
+def startup_report():
+    return jsonify({
+        'success': True,
+        'data': startup.report()
+    })
+
 @app.route('/')
 def index():
     return render_template('index.html')
 
 @app.route('/files')
 def files():
-    video_files = []
-    thumbnail_dir = '/etc/webUI/static/thumbnails'
-    
-    if os.path.exists(MEDIA_FOLDER):
-        for file in os.listdir(MEDIA_FOLDER):
-            if file.lower().endswith(('.mp4', '.avi', '.mkv', '.mov')):
-                file_path = os.path.join(MEDIA_FOLDER, file)
-                size = os.path.getsize(file_path)
-                size_mb = round(size / (1024 * 1024), 2)
-                
-                # Check for matching thumbnail
-                thumbnail_name = os.path.splitext(file)[0] + '.jpg'
-                thumbnail_path = os.path.join(thumbnail_dir, thumbnail_name)
-                
-                # Create relative URL for thumbnail if it exists
-                thumbnail_url = None
-                if os.path.exists(thumbnail_path):
-                    # Convert absolute path to relative URL
-                    thumbnail_url = f'/static/thumbnails/{thumbnail_name}'
-                
-                video_files.append({
-                    'name': file,
-                    'size': size_mb,
-                    'thumbnail': thumbnail_url
-                })
-    
-    # Sort files by name in descending order (newest first, assuming timestamp in filename)
-    video_files.sort(key=lambda x: x['name'], reverse=True)
-    return render_template('files.html', files=video_files)
+    sort = request.args.get('sort', 'date')
+    order = request.args.get('order', 'desc')
+    search = request.args.get('q', '').strip()
+    try:
+        page = max(int(request.args.get('page', 1)), 1)
+        per_page = min(max(int(request.args.get('per_page', MEDIA_PAGE_SIZE)), 1), 500)
+    except ValueError:
+        page, per_page = 1, MEDIA_PAGE_SIZE
+    if sort not in ('date', 'name', 'size', 'duration'):
+        sort = 'date'
+    if order not in ('asc', 'desc'):
+        order = 'desc'
+
+    video_files, total = media_index.query(sort, order, search, page, per_page)
+    start_background_services()
+    pinned = storage_policy.pinned()
+    for item in video_files:
+        item['pinned'] = item['name'] in pinned
+    if any(item['thumbnail'] is None for item in video_files):
+        thumbnail_worker.wakeup()
+    pages = max((total + per_page - 1) // per_page, 1)
+
+    if request.args.get('format') == 'json':
+        return jsonify({
+            'success': True,
+            'data': video_files,
+            'total': total,
+            'page': page,
+            'pages': pages
+        })
+    return render_template('files.html', files=video_files, total=total, page=page, pages=pages,
+                           sort=sort, order=order, search=search, per_page=per_page,
+                           clip_extensions=CLIP_EXTENSIONS, storage=storage_policy.usage())
     
+@app.route('/thumbnails/status')
+def thumbnails_status():
+    return jsonify({
+        'success': True,
+        'data': thumbnail_worker.status()
+    })
+
 @app.route('/config')
 def config():
     # List available config files
@@ -145,7 +5469,7 @@ def config():
         gs_key_size = os.path.getsize(GS_KEY_PATH)
         
         # Calculate MD5 hash and check if it's the stock key
-        gs_key_md5 = calculate_md5(GS_KEY_PATH)
+        gs_key_md5 = fingerprints.md5(GS_KEY_PATH)
         is_stock_key = gs_key_md5 == "24767056dc165963fe6db7794aee12cd"
     else:
         gs_key_size = 0
@@ -157,6 +5481,21 @@ def config():
                          gs_key_size=gs_key_size,
                          is_stock_key=is_stock_key)
 
+def flash_config_changes(filepath, data, success_message, error_message):
+    """Write form values through the config store and flash what changed."""
+    try:
+        changes = config_store.update(filepath, data)
+    except Exception as e:
+        logger.error(f"Error writing config: {str(e)}")
+        flash(f'{error_message}: {str(e)}', 'error')
+        return None
+    if changes:
+        summary = ', '.join(f"{change['key']}: {change['old']} \u2192 {change['new']}" for change in changes)
+        flash(f'{success_message} ({summary})', 'success')
+    else:
+        flash('No changes to save', 'info')
+    return changes
+
 @app.route('/config/edit/<path:filepath>', methods=['GET', 'POST'])
 def edit_config(filepath):
     # Normalize the filepath to handle URL encoding
@@ -164,7 +5503,7 @@ def edit_config(filepath):
     
     # Validate filepath is in whitelist
     if filepath not in CONFIG_WHITELIST:
-        print(f"Access denied. Filepath '{filepath}' not in whitelist: {CONFIG_WHITELIST}")
+        logger.warning(f"Access denied. Filepath '{filepath}' not in whitelist: {CONFIG_WHITELIST}")
         return "Access denied", 403
     
     if request.method == 'POST':
@@ -179,10 +5518,7 @@ def edit_config(filepath):
                 new_config[section][option] = request.form[key]
         
         # Write updated config
-        if write_ini_file(filepath, new_config):
-            flash('Configuration saved successfully!', 'success')
-        else:
-            flash('Error saving configuration', 'error')
+        flash_config_changes(filepath, new_config, 'Configuration saved successfully!', 'Error saving configuration')
         
         return redirect(url_for('edit_config', filepath=filepath))
     
@@ -205,13 +5541,18 @@ def upload_gskey():
         return redirect(url_for('config'))
     
     try:
+        content = file.read()
+        if hashlib.md5(content).hexdigest() == fingerprints.md5(GS_KEY_PATH):
+            flash('gs.key is unchanged', 'info')
+            return redirect(url_for('config'))
+
         # Create a backup of the existing key if it exists
         if os.path.exists(GS_KEY_PATH):
             backup_path = GS_KEY_PATH + '.backup'
             shutil.copy2(GS_KEY_PATH, backup_path)
         
-        # Save the new key file
-        file.save(GS_KEY_PATH)
+        # Save the new key file atomically
+        config_store.write(GS_KEY_PATH, content)
         # Set appropriate permissions
         os.chmod(GS_KEY_PATH, 0o644)
         
@@ -223,19 +5564,165 @@ def upload_gskey():
 
 @app.route('/download/<filename>')
 def download_file(filename):
+    return serve_recording(filename, as_attachment=True)
+
+@app.route('/play/<filename>')
+def play_file(filename):
+    return serve_recording(filename, as_attachment=False)
+
+def serve_recording(filename, as_attachment):
+    file_path = safe_join(MEDIA_FOLDER, filename)
+    if file_path is None or not os.path.isfile(file_path):
+        return "File not found", 404
     try:
-        return send_file(os.path.join(MEDIA_FOLDER, filename), as_attachment=True)
+        return send_media(file_path, as_attachment=as_attachment)
     except Exception as e:
         return f"Error downloading file: {str(e)}", 400
 
+@app.route('/seekmap/<filename>')
+def seek_map(filename):
+    file_path = safe_join(MEDIA_FOLDER, filename)
+    if file_path is None or not os.path.isfile(file_path):
+        return jsonify({'success': False, 'message': 'File not found'}), 404
+    try:
+        index = keyframe_indexes.get(file_path)
+    except (ValueError, struct.error, IndexError, KeyError) as e:
+        return jsonify({'success': False, 'message': f'Cannot index recording: {str(e)}'}), 400
+    return jsonify({
+        'success': True,
+        'data': {
+            'duration': round(index.duration, 3),
+            'keyframes': index.keyframes()
+        }
+    })
+
+@app.route('/clip/<filename>')
+def clip_recording(filename):
+    """Stream a keyframe-aligned copy of part of a recording without re-encoding."""
+    file_path = safe_join(MEDIA_FOLDER, filename)
+    if file_path is None or not os.path.isfile(file_path):
+        return "File not found", 404
+    start = request.args.get('start', 0, type=float)
+    end = request.args.get('end', type=float)
+    try:
+        index = keyframe_indexes.get(file_path)
+        if end is None:
+            end = index.duration
+        if end <= start:
+            return "End must be after start", 400
+        header, offset, length, clip_start, clip_end = index.clip(start, end)
+    except (ValueError, struct.error, IndexError, KeyError) as e:
+        return f"Error clipping file: {str(e)}", 400
+
+    base, ext = os.path.splitext(filename)
+    name = f'{base}_{clip_start:.0f}-{clip_end:.0f}{ext}'
+    body = itertools.chain([header], _file_chunks(file_path, [(offset, offset + length - 1)]))
+    response = Response(body, mimetype=MEDIA_CONTENT_TYPES.get(ext.lower()), direct_passthrough=True, headers={
+        'Content-Disposition': content_disposition('attachment', name),
+        'X-Clip-Start': f'{clip_start:.3f}',
+        'X-Clip-End': f'{clip_end:.3f}'
+    })
+    response.content_length = len(header) + length
+    return response
+
 @app.route('/delete/<filename>', methods=['POST'])
 def delete_file(filename):
-    try:
-        file_path = os.path.join(MEDIA_FOLDER, filename)
-        os.remove(file_path)
+    result = storage_policy.delete([filename])[filename]
+    if result == 'deleted':
         return redirect(url_for('files'))
-    except Exception as e:
-        return f"Error deleting file: {str(e)}", 400
+    if result == 'pinned':
+        return "Error deleting file: recording is pinned, unpin it first", 400
+    if result == 'growing':
+        return "Error deleting file: recording is still being written", 409
+    if result == 'not_found':
+        return "File not found", 404
+    return f"Error deleting file: {result}", 400
+
+def selected_recordings():
+    """Return the existing recordings named in the request's 'names' values."""
+    media_index.refresh()
+    selected = []
+    for name in dict.fromkeys(request.values.getlist('names')):
+        item = media_index.get(name)
+        if item is not None:
+            selected.append(item)
+    return selected
+
+@app.route('/files/archive', methods=['GET', 'POST'])
+def archive_files():
+    """Stream the selected recordings as one uncompressed ZIP."""
+    files = []
+    for item in selected_recordings():
+        path = os.path.join(MEDIA_FOLDER, item['name'])
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        files.append((item['name'], path, stat.st_size, stat.st_mtime))
+    if not files:
+        return "No recordings selected", 400
+
+    archive = ZipStream(files)
+    name = time.strftime('recordings-%Y%m%d-%H%M%S.zip')
+    response = Response(iter(archive), mimetype='application/zip', direct_passthrough=True, headers={
+        'Content-Disposition': content_disposition('attachment', name),
+        'Cache-Control': 'no-store'
+    })
+    response.content_length = len(archive)
+    return response
+
+@app.route('/files/delete', methods=['POST'])
+def delete_files():
+    names = request.values.getlist('names')
+    if request.is_json:
+        names = (request.get_json(silent=True) or {}).get('names', [])
+    results = storage_policy.delete(names)
+    deleted = sum(1 for result in results.values() if result == 'deleted')
+    if request.is_json or request.args.get('format') == 'json':
+        return jsonify({'success': True, 'deleted': deleted, 'results': results})
+
+    skipped = [name for name, result in results.items() if result != 'deleted']
+    flash(f'Deleted {deleted} recording(s)', 'success')
+    if skipped:
+        flash(f"Skipped: {', '.join(f'{name} ({results[name]})' for name in skipped)}", 'error')
+    return redirect(request.referrer or url_for('files'))
+
+@app.route('/files/<filename>/pin', methods=['POST'])
+def pin_file(filename):
+    if media_index.get(filename) is None:
+        media_index.refresh()
+        if media_index.get(filename) is None:
+            return "File not found", 404
+    pinned = request.values.get('pinned', '1') not in ('0', 'false')
+    try:
+        storage_policy.set_pinned(filename, pinned)
+    except OSError as e:
+        return f"Error pinning file: {str(e)}", 400
+    if request.args.get('format') == 'json':
+        return jsonify({'success': True, 'pinned': pinned})
+    return redirect(request.referrer or url_for('files'))
+
+@app.route('/files/checksums')
+def file_checksums():
+    start_background_services()
+    fingerprints.wakeup()
+    checksums = fingerprints.checksums()
+    if request.args.get('format') == 'sha256sum':
+        lines = [f"{item['sha256']}  {item['name']}" for item in checksums['recordings'] if item['sha256']]
+        return Response('\n'.join(lines) + '\n', mimetype='text/plain')
+    return jsonify({
+        'success': True,
+        'data': checksums,
+        'status': fingerprints.status()
+    })
+
+@app.route('/storage')
+def storage_status():
+    start_background_services()
+    return jsonify({
+        'success': True,
+        'data': storage_policy.status()
+    })
 
 @app.route('/rssi')
 def rssi_grapher():
@@ -243,118 +5730,195 @@ def rssi_grapher():
 
 @app.route('/rssi/data')
 def rssi_data():
-    try:
-        print("Starting rssi_data request...")
-        # Check if the API endpoint is reachable with shorter timeout
-        if not ping_host('10.5.0.1', timeout=2):
-            print("API endpoint ping failed")
+    start_background_services()
+    data = stats_collector.latest_rx()
+
+    if data is None:
+        if not stats_collector.connected:
             return jsonify({
                 'success': False,
                 'message': 'API endpoint is not reachable'
             }), 404
-            
-        try:
-            print("Starting netcat process...")
-            # Use popen to handle streaming output
-            process = subprocess.Popen(
-                ['nc', '10.5.0.1', '8103'],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-            
-            print("Reading netcat output...")
-            # Read for up to 2 seconds
-            import select
-            readable, _, _ = select.select([process.stdout], [], [], 2)
-            
-            if not readable:
-                process.kill()
-                print("No data received within timeout")
-                return jsonify({
-                    'success': False,
-                    'message': 'No data received from API endpoint'
-                }), 504
-                
-            # Read the available output
-            output = process.stdout.readline()
-            print(f"Raw output received: {output[:200]}...")
-            
-            if not output.strip():
-                process.kill()
-                print("Empty output received")
-                return jsonify({
-                    'success': False,
-                    'message': 'Empty response from API endpoint'
-                }), 504
-            
-            # Parse the received JSON data
-            try:
-                data = json.loads(output)
-                print(f"Parsed JSON: {str(data)[:200]}...")
-                print(f"Data type: {data.get('type')}")
-                print(f"Has rx_ant_stats: {'rx_ant_stats' in data}")
-                
-                if (data.get('type') == 'rx' and 
-                    'rx_ant_stats' in data and 
-                    data['rx_ant_stats']):
-                    print("Found valid rx stats in first object")
-                    process.kill()
-                    return jsonify({
-                        'success': True,
-                        'data': data
-                    })
-                
-                # If first object wasn't rx stats, try a few more times
-                for _ in range(5):  # Try up to 5 more lines
-                    output = process.stdout.readline()
-                    if not output.strip():
-                        continue
-                        
-                    print(f"Trying next line: {output[:200]}...")
-                    data = json.loads(output)
-                    
-                    if (data.get('type') == 'rx' and 
-                        'rx_ant_stats' in data and 
-                        data['rx_ant_stats']):
-                        print("Found valid rx stats in subsequent object")
-                        process.kill()
-                        return jsonify({
-                            'success': True,
-                            'data': data
-                        })
-                
-                process.kill()
-                print("No valid rx stats found in response")
-                return jsonify({
-                    'success': False,
-                    'message': 'No RSSI data found in response'
-                }), 404
-                
-            except json.JSONDecodeError as e:
-                process.kill()
-                print(f"JSON decode error: {str(e)}")
-                print(f"Raw output: {output[:200]}...")
-                return jsonify({
-                    'success': False,
-                    'message': 'Invalid JSON response from API'
-                }), 500
-                
-        except Exception as e:
-            if process:
-                process.kill()
-            print(f"Error reading from netcat: {str(e)}")
-            return jsonify({
-                'success': False,
-                'message': f'Error reading from netcat: {str(e)}'
-            }), 500
-            
-    except Exception as e:
-        print(f"Unexpected error in rssi_data: {str(e)}")
         return jsonify({
             'success': False,
-            'message': f'Unexpected error: {str(e)}'
-        }), 500
+            'message': 'No RSSI data found in response'
+        }), 404
+
+    if time.time() - stats_collector.last_rx_time > RSSI_STALE_AFTER:
+        return jsonify({
+            'success': False,
+            'message': 'No data received from API endpoint'
+        }), 504
+
+    return jsonify({
+        'success': True,
+        'data': data
+    })
+
+@app.route('/rssi/analytics')
+def rssi_analytics():
+    start_background_services()
+    return jsonify({
+        'success': True,
+        'data': {
+            'connected': stats_collector.connected,
+            **link_analytics.snapshot()
+        }
+    })
+
+@app.route('/rssi/stream')
+def rssi_stream():
+    rate = request.args.get('rate', 'native')
+    if rate not in RSSI_STREAM_RATES:
+        return jsonify({
+            'success': False,
+            'message': f"Invalid rate, expected one of: {', '.join(RSSI_STREAM_RATES)}"
+        }), 400
+
+    start_background_services()
+    interval = RSSI_STREAM_RATES[rate]
+    return event_streams.response(rssi_broadcaster.stream(1.0 / interval if interval else None))
+
+@app.route('/logs')
+def logs_viewer():
+    return render_template('logs.html', sources=list(log_followers), levels=LOG_LEVELS)
+
+@app.route('/logs/<source>')
+def log_tail(source):
+    follower = log_followers.get(source)
+    if follower is None:
+        return jsonify({'success': False, 'message': 'Unknown log source'}), 404
+    try:
+        match = log_filter(request.args)
+        count = min(max(int(request.args.get('tail', LOG_STREAM_BACKLOG)), 0), LOG_TAIL_LINES)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    entries = [entry for entry in follower.tail(LOG_TAIL_LINES) if match(entry)]
+    return jsonify({
+        'success': True,
+        'data': {
+            'status': follower.status(),
+            'entries': entries[-count:] if count else []
+        }
+    })
+
+@app.route('/logs/<source>/stream')
+def log_stream(source):
+    follower = log_followers.get(source)
+    if follower is None:
+        return jsonify({'success': False, 'message': 'Unknown log source'}), 404
+    try:
+        match = log_filter(request.args)
+        backlog = min(max(int(request.args.get('tail', LOG_STREAM_BACKLOG)), 0), LOG_TAIL_LINES)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    # Sent by EventSource when it reconnects, so no line is shown twice
+    last_id = request.headers.get('Last-Event-ID', '')
+    return event_streams.response(follower.stream(match, int(last_id) if last_id.isdigit() else None, backlog))
+
+@app.route('/rssi/history')
+def rssi_history_data():
+    return history_response(rssi_history, 'rssi_avg')
+
+@app.route('/system')
+def system_data():
+    start_background_services()
+    return jsonify({
+        'success': True,
+        'data': {
+            'latest': system_sampler.latest,
+            'sampler': system_sampler.status()
+        }
+    })
+
+@app.route('/system/history')
+def system_history_data():
+    # Takes the same parameters as /rssi/history and returns the same timestamps at 1 s resolution
+    return history_response(system_history, 'busy_pct,temp_c')
+
+def history_response(store, default_metrics):
+    try:
+        end = float(request.args.get('to', time.time()))
+        start = float(request.args.get('from', end - 1800))
+        points = int(request.args.get('points', 300))
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'message': 'from, to and points must be numbers'
+        }), 400
+
+    mode = request.args.get('mode', 'lttb')
+    if mode not in ('lttb', 'minmax') or start > end or points < 3:
+        return jsonify({
+            'success': False,
+            'message': 'Invalid history query'
+        }), 400
+
+    start_background_services()
+    series = request.args.get('metrics', default_metrics).split(',')
+    data = store.query(start, end, min(points, RSSI_HISTORY_MAX_POINTS), series, mode)
+    return jsonify({
+        'success': True,
+        'data': data
+    })
+
+@app.route('/telemetry')
+def telemetry_sessions():
+    return jsonify({
+        'success': True,
+        'data': telemetry_recorder.sessions()
+    })
+
+@app.route('/telemetry/<session>')
+def telemetry_window(session):
+    if not TelemetryRecorder.SESSION_PATTERN.match(session):
+        return jsonify({'success': False, 'message': 'Invalid session'}), 400
+    if not os.path.exists(telemetry_recorder.paths(session)[0]):
+        return jsonify({'success': False, 'message': 'Session not found'}), 404
+    try:
+        t0 = float(request.args['t0']) if 't0' in request.args else None
+        t1 = float(request.args['t1']) if 't1' in request.args else None
+        limit = min(int(request.args.get('limit', TELEMETRY_MAX_RECORDS)), TELEMETRY_MAX_RECORDS)
+    except ValueError:
+        return jsonify({'success': False, 'message': 't0, t1 and limit must be numbers'}), 400
+
+    records = []
+    for timestamp, record in telemetry_recorder.iter_records(session, t0, t1):
+        if len(records) >= limit:
+            break
+        records.append({'t': timestamp, 'record': record})
+    return jsonify({
+        'success': True,
+        'data': records,
+        'truncated': len(records) >= limit
+    })
+
+@app.route('/telemetry/<session>/replay')
+def telemetry_replay(session):
+    if not TelemetryRecorder.SESSION_PATTERN.match(session):
+        return jsonify({'success': False, 'message': 'Invalid session'}), 400
+    if not os.path.exists(telemetry_recorder.paths(session)[0]):
+        return jsonify({'success': False, 'message': 'Session not found'}), 404
+    try:
+        speed = int(request.args.get('speed', 1))
+        t0 = float(request.args['t0']) if 't0' in request.args else None
+    except ValueError:
+        speed = None
+    if speed not in TELEMETRY_REPLAY_SPEEDS:
+        return jsonify({
+            'success': False,
+            'message': f"Invalid speed, expected one of: {', '.join(map(str, TELEMETRY_REPLAY_SPEEDS))}"
+        }), 400
+
+    return event_streams.response(telemetry_recorder.replay(session, speed, t0))
+
+@app.route('/health/links')
+def health_links():
+    start_background_services()
+    return jsonify({
+        'success': True,
+        'data': link_monitor.states()
+    })
 
 @app.route('/camera')
 def camera_settings():
@@ -363,70 +5927,23 @@ def camera_settings():
 @app.route('/camera/load-config')
 def load_camera_config():
     try:
-        # Increase timeout and attempts for more reliable connection
-        max_retries = 3
+        # Serve a recently validated config without touching the link
+        if camera_config_cache.is_fresh():
+            return camera_config_response(*camera_config_cache.get())
+
+        start_background_services()
+        if not link_monitor.reachable('camera'):
+            return jsonify({
+                'success': False,
+                'message': 'Camera is not reachable. Please check the connection.'
+            }), 404
+
+        # Retry once on a timeout, the SSH master reconnects in between
+        max_retries = 2
         for attempt in range(max_retries):
             try:
-                # Check if camera is reachable with longer timeout
-                if not ping_host('10.5.0.10', timeout=10):
-                    if attempt == max_retries - 1:
-                        return jsonify({
-                            'success': False,
-                            'message': 'Camera is not reachable after multiple attempts. Please check the connection.'
-                        }), 404
-                    continue
-                
-                # If ping successful, proceed with config reading
-                wfb_output = subprocess.check_output(
-                    ['bash', '-c', f'source {COMMANDS_SCRIPT} && read_wfb_config'], 
-                    stderr=subprocess.STDOUT,
-                    text=True,
-                    timeout=15  # Increase SSH command timeout
-                )
-                
-                majestic_output = subprocess.check_output(
-                    ['bash', '-c', f'source {COMMANDS_SCRIPT} && read_majestic_config'],
-                    stderr=subprocess.STDOUT,
-                    text=True,
-                    timeout=15  # Increase SSH command timeout
-                )
-                
-                # Parse WFB config
-                wfb_config = {}
-                for line in wfb_output.splitlines():
-                    if '=' in line and not line.startswith('#'):
-                        key, value = line.split('=', 1)
-                        wfb_config[key.strip()] = value.strip()
-                
-                # Parse Majestic YAML config
-                try:
-                    yaml_content = majestic_output.replace("Reading majestic configuration", "").strip()
-                    majestic_config = yaml.safe_load(yaml_content)
-                    video_config = majestic_config.get('video0', {})
-                except yaml.YAMLError as e:
-                    print(f"YAML parsing error: {e}")
-                    video_config = {}
-                
-                # Build response with actual values, not defaults
-                config = {
-                    'fps': str(video_config.get('fps', '60')),
-                    'size': str(video_config.get('size', '1920x1080')),
-                    'bitrate': str(video_config.get('bitrate', '4096')),
-                    'gopSize': str(video_config.get('gopSize', '1')),
-                    'channel': wfb_config.get('channel', '161'),
-                    'txpower_override': wfb_config.get('driver_txpower_override', '1'),
-                    'stbc': wfb_config.get('stbc', '0'),
-                    'ldpc': wfb_config.get('ldpc', '0'),
-                    'mcs_index': wfb_config.get('mcs_index', '1'),
-                    'fec_k': wfb_config.get('fec_k', '8'),
-                    'fec_n': wfb_config.get('fec_n', '12'),
-                    'bandwidth': wfb_config.get('bandwidth', '20')
-                }
-                
-                return jsonify({
-                    'success': True,
-                    'data': config
-                })
+                # Fetches the config files only if they changed on the camera
+                return camera_config_response(*camera_config_cache.get())
                 
             except subprocess.TimeoutExpired:
                 if attempt == max_retries - 1:
@@ -444,189 +5961,217 @@ def load_camera_config():
             'message': f'Unexpected error: {str(e)}'
         }), 500
 
+def camera_config_response(config, etag):
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = jsonify({
+            'success': True,
+            'data': config
+        })
+    response.set_etag(etag)
+    # Let the browser keep the body but always revalidate it
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/camera/session')
+def camera_session_status():
+    return jsonify({
+        'success': True,
+        'data': {
+            'connected': camera_session.connected(),
+            'operations': camera_session.stats()
+        }
+    })
+
+def validate_camera_changes(changes):
+    """
+    Keep the known camera fields of a change request and check their values.
+
+    Returns:
+        tuple: (changes, None) or (None, error message)
+    """
+    if not changes or not isinstance(changes, dict):
+        return None, 'No changes detected'
+    # Only process fields that were actually changed
+    valid_changes = {field: str(value) for field, value in changes.items() if field in CAMERA_FIELDS}
+    if not valid_changes:
+        return None, 'No valid changes detected'
+    for field, value in valid_changes.items():
+        if not re.fullmatch(r'[0-9A-Za-z.]+', value):
+            return None, f'Invalid value for {field}'
+    return valid_changes, None
+
 @app.route('/camera/update', methods=['POST'])
 def update_camera_settings():
     try:
-        changes = request.json
-        if not changes:
-            return jsonify({'success': False, 'message': 'No changes detected'}), 400
-            
-        # Map frontend field names to environment variables and function names
-        field_mapping = {
-            # Majestic config fields
-            'fps': {'env': 'FPS', 'func': 'update_fps'},
-            'size': {'env': 'SIZE', 'func': 'update_size'},
-            'bitrate': {'env': 'BITRATE', 'func': 'update_bitrate'},
-            'gopSize': {'env': 'GOPSIZE', 'func': 'update_gopSize'},
-            # WFB config fields
-            'channel': {'env': 'CHANNEL', 'func': 'update_channel'},
-            'txpower_override': {'env': 'TXPOWER_OVERRIDE', 'func': 'update_txpower_override'},
-            'stbc': {'env': 'STBC', 'func': 'update_stbc'},
-            'ldpc': {'env': 'LDPC', 'func': 'update_ldpc'},
-            'mcs_index': {'env': 'MCS_INDEX', 'func': 'update_mcs_index'},
-            'fec_k': {'env': 'FEC_K', 'func': 'update_fec_k'},
-            'fec_n': {'env': 'FEC_N', 'func': 'update_fec_n'}
-        }
-        
-        # Only process fields that were actually changed
-        changed_fields = set(changes.keys())
-        if not changed_fields:
-            return jsonify({'success': False, 'message': 'No valid changes detected'}), 400
+        valid_changes, error = validate_camera_changes(request.json)
+        if error:
+            return jsonify({'success': False, 'message': error}), 400
 
-        updated_fields = []
-        for field, value in changes.items():
-            if field in field_mapping:
-                # Create a new environment with all current env vars
-                env = os.environ.copy()
-                # Set the specific environment variable for this field
-                env[field_mapping[field]['env']] = str(value)
-                
-                print(f"Updating {field} to {value} using {field_mapping[field]['env']}")
-                
-                try:
-                    # Run only the update function for this specific changed field
-                    result = subprocess.run(
-                        ['bash', '-c', f'source {COMMANDS_SCRIPT} && {field_mapping[field]["func"]}'],
-                        env=env,
-                        check=True,
-                        text=True,
-                        capture_output=True
-                    )
-                    print(f"Command output: {result.stdout}")
-                    if result.stderr:
-                        print(f"Command error: {result.stderr}")
-                    updated_fields.append(field)
-                except subprocess.CalledProcessError as e:
-                    print(f"Error updating {field}: {str(e)}")
-                    return jsonify({
-                        'success': False, 
-                        'message': f'Error updating {field}',
-                        'updated_fields': updated_fields
-                    }), 500
-        
+        logger.info(f"Applying camera changes: {valid_changes}")
+        started = time.monotonic()
+        try:
+            results = apply_camera_changes(valid_changes)
+        except TimeoutError as e:
+            record_error(e)
+            logger.error(f"Error applying camera changes: {str(e)}")
+            return jsonify({
+                'success': False,
+                'message': str(e),
+                'apply_ms': round((time.monotonic() - started) * 1000, 1)
+            }), 504
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired, ValueError, yaml.YAMLError) as e:
+            record_error(e)
+            logger.error(f"Error applying camera changes: {str(e)}")
+            return jsonify({
+                'success': False,
+                'message': 'Error applying settings, camera configuration was left unchanged',
+                'apply_ms': round((time.monotonic() - started) * 1000, 1)
+            }), 500
+
+        updated_fields = [field for field, result in results.items() if result == 'updated']
         return jsonify({
             'success': True,
-            'message': f'Successfully updated: {", ".join(updated_fields)}'
+            'message': f'Successfully updated: {", ".join(updated_fields) or "nothing changed"}',
+            'fields': results,
+            'apply_ms': round((time.monotonic() - started) * 1000, 1)
         })
     except Exception as e:
-        print(f"Error in update_camera_settings: {str(e)}")
+        logger.exception(f"Error in update_camera_settings: {str(e)}")
         return jsonify({'success': False, 'message': str(e)}), 500
 
 @app.route('/camera/reboot', methods=['POST'])
 def reboot_camera():
-    try:
-        # Check if camera is reachable
-        if not ping_host('10.5.0.10'):
-            return jsonify({
-                'success': False,
-                'message': 'Camera is not reachable. Please check the connection.'
-            }), 404
-            
-        # Execute the reboot command
-        result = subprocess.run(
-            ['bash', '-c', f'source {COMMANDS_SCRIPT} && update_reboot'],
-            check=True,
-            text=True,
-            capture_output=True
-        )
-        
-        return jsonify({
-            'success': True,
-            'message': 'Camera reboot initiated successfully'
-        })
-        
-    except subprocess.CalledProcessError as e:
-        return jsonify({
-            'success': False,
-            'message': f'Error rebooting camera: {str(e)}'
-        }), 500
-    except Exception as e:
+    # Check if camera is reachable
+    start_background_services()
+    if not link_monitor.reachable('camera'):
         return jsonify({
             'success': False,
-            'message': f'Unexpected error: {str(e)}'
-        }), 500
+            'message': 'Camera is not reachable. Please check the connection.'
+        }), 404
+
+    def reboot(job):
+        # The connection drops with the camera, which ssh reports as 255
+        result = camera_session.run('reboot', op='reboot', timeout=job.remaining(), job=job,
+                                    check=False, retry=False)
+        if result.returncode not in (0, 255):
+            raise subprocess.CalledProcessError(result.returncode, 'reboot', result.stdout, result.stderr)
+        camera_session.close()
+        return 'Camera reboot initiated successfully'
+
+    job, _ = job_runner.submit('camera-reboot', 'Reboot camera', reboot, timeout=30)
+    return job_response(job)
 
 @app.route('/camera/restart-majestic', methods=['POST'])
 def restart_majestic():
-    try:
-        # Check if camera is reachable
-        if not ping_host('10.5.0.10'):
-            return jsonify({
-                'success': False,
-                'message': 'Camera is not reachable. Please check the connection.'
-            }), 404
-            
-        # Execute the restart majestic command
-        result = subprocess.run(
-            ['bash', '-c', f'source {COMMANDS_SCRIPT} && update_restart_majestic'],
-            check=True,
-            text=True,
-            capture_output=True
-        )
-        
-        return jsonify({
-            'success': True,
-            'message': 'Majestic service restarted successfully'
-        })
-        
-    except subprocess.CalledProcessError as e:
-        return jsonify({
-            'success': False,
-            'message': f'Error restarting Majestic: {str(e)}'
-        }), 500
-    except Exception as e:
+    # Check if camera is reachable
+    start_background_services()
+    if not link_monitor.reachable('camera'):
         return jsonify({
             'success': False,
-            'message': f'Unexpected error: {str(e)}'
-        }), 500
+            'message': 'Camera is not reachable. Please check the connection.'
+        }), 404
+
+    def restart(job):
+        camera_session.run('/etc/init.d/S95majestic restart', op='restart_majestic', timeout=job.remaining(),
+                           job=job, retry=False)
+        return 'Majestic service restarted successfully'
+
+    job, _ = job_runner.submit('camera-restart-majestic', 'Restart Majestic', restart, timeout=60)
+    return job_response(job)
+
+@app.route('/devices')
+def devices_list():
+    start_background_services()
+    return jsonify({
+        'success': True,
+        'data': device_registry.list()
+    })
+
+@app.route('/devices', methods=['POST'])
+def put_device():
+    entry = request.get_json(silent=True)
+    if not isinstance(entry, dict):
+        return jsonify({'success': False, 'message': 'Expected a JSON device entry'}), 400
+    try:
+        device = device_registry.put(entry)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except OSError as e:
+        logger.error(f"Error saving device registry: {str(e)}")
+        return jsonify({'success': False, 'message': f'Error saving device registry: {e.strerror}'}), 500
+    return jsonify({'success': True, 'data': device})
+
+@app.route('/devices/<name>', methods=['DELETE'])
+def remove_device(name):
+    try:
+        removed = device_registry.remove(name)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except OSError as e:
+        logger.error(f"Error saving device registry: {str(e)}")
+        return jsonify({'success': False, 'message': f'Error saving device registry: {e.strerror}'}), 500
+    if not removed:
+        return jsonify({'success': False, 'message': 'Device not found'}), 404
+    return jsonify({'success': True})
+
+@app.route('/devices/run/<op>', methods=['POST'])
+def run_device_operation(op):
+    """
+    Run load-config, apply-settings or restart-majestic on several devices at once.
+
+    The JSON body may name the devices ({"devices": ["camera", "air2"]},
+    all air units otherwise) and carries the settings for apply-settings
+    ({"changes": {"fps": "90"}}). Results are reported per device.
+    """
+    if op not in DeviceRegistry.OPERATIONS:
+        return jsonify({'success': False, 'message': f'Unknown operation {op}'}), 404
+    body = request.get_json(silent=True) or {}
+    names = body.get('devices')
+    if names is not None and (not isinstance(names, list) or not all(isinstance(name, str) for name in names)):
+        return jsonify({'success': False, 'message': 'devices must be a list of device names'}), 400
+    changes = None
+    if op == 'apply-settings':
+        changes, error = validate_camera_changes(body.get('changes'))
+        if error:
+            return jsonify({'success': False, 'message': error}), 400
+        logger.info(f"Applying camera changes {changes} to {', '.join(names) if names is not None else 'all cameras'}")
+
+    start_background_services()
+    results = device_registry.run(op, names, changes)
+    return jsonify({
+        'success': bool(results) and all(result['success'] for result in results.values()),
+        'results': results
+    })
 
 @app.route('/config/restart-gs-wfb', methods=['POST'])
 def restart_gs_wfb():
-    try:
-        result = subprocess.run(
+    def restart(job):
+        result = run_process(
             ['bash', '-c', f'source {COMMANDS_SCRIPT} && update_restart_gs_wfb'],
-            check=True,
-            text=True,
-            capture_output=True
+            timeout=job.remaining(),
+            job=job,
+            label='commands.sh'
         )
-        
-        return jsonify({
-            'success': True,
-            'message': 'WFB Ground Station services restarted successfully'
-        })
-        
-    except subprocess.CalledProcessError as e:
-        return jsonify({
-            'success': False,
-            'message': f'Error restarting WFB services: {str(e)}'
-        }), 500
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'message': f'Unexpected error: {str(e)}'
-        }), 500
+        if result.returncode != 0:
+            raise subprocess.CalledProcessError(result.returncode, result.args, result.stdout, result.stderr)
+        return 'WFB Ground Station services restarted successfully'
+
+    job, _ = job_runner.submit('gs-restart-wfb', 'Restart WFB ground station', restart, timeout=60)
+    return job_response(job)
 
 @app.route('/config/edit_alink', methods=['GET', 'POST'])
 def edit_alink():
-    filepath = '/config/alink_gs.conf'
+    filepath = ALINK_CONFIG
     
     if request.method == 'POST':
-        # Get current config
-        current_config = read_ini_file(filepath)
-        
         # Update only the allowed fields
         allowed_fields = ['min_rssi', 'max_rssi', 'min_snr', 'max_snr']
-        new_config = current_config.copy()
-        
-        for field in allowed_fields:
-            if field in request.form:
-                new_config['Settings'][field] = request.form[field]
+        new_config = {'Settings': {field: request.form[field] for field in allowed_fields if field in request.form}}
         
         # Write updated config
-        if write_ini_file(filepath, new_config):
-            flash('ALink settings updated successfully!', 'success')
-        else:
-            flash('Error saving ALink settings', 'error')
+        flash_config_changes(filepath, new_config, 'ALink settings updated successfully!', 'Error saving ALink settings')
         
         return redirect(url_for('edit_alink'))
     
@@ -636,35 +6181,146 @@ def edit_alink():
                          filepath=filepath,
                          filename='alink_gs.conf',
                          config=config_data,
-                         editable_fields=['min_rssi', 'max_rssi', 'min_snr', 'max_snr'])
+                         editable_fields=['min_rssi', 'max_rssi', 'min_snr', 'max_snr'],
+                         sessions=[session['session'] for session in telemetry_recorder.sessions()])
+
+@app.route('/config/alink/simulate', methods=['POST'])
+def simulate_alink_settings():
+    """
+    Predict alink switching for candidate settings over recorded or synthetic telemetry.
+
+    JSON body:
+        source: 'latest' (default), a telemetry session name or 'synthetic'
+        candidates: list of settings dicts (min_rssi, max_rssi, min_snr, max_snr, ...)
+        sweep: {field: [values]} to try every combination on top of 'settings',
+               results are then ranked by degraded time, mean bitrate and switches
+    """
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({'success': False, 'message': 'Expected a JSON body'}), 400
+    numpy = optional_numpy()
+    limit = ALINK_SIM_MAX_CANDIDATES if numpy is not None else ALINK_SIM_MAX_CANDIDATES_PYTHON
+
+    sweep = body.get('sweep')
+    if sweep is not None:
+        if not isinstance(sweep, dict) or not all(isinstance(values, list) and values for values in sweep.values()):
+            return jsonify({'success': False, 'message': 'sweep must map fields to lists of values'}), 400
+        if math.prod(len(values) for values in sweep.values()) > limit:
+            return jsonify({'success': False, 'message': f'At most {limit} combinations can be simulated at once'}), 400
+        base = body.get('settings') or {}
+        candidates = [{**base, **dict(zip(sweep, values))} for values in itertools.product(*sweep.values())]
+    else:
+        candidates = body.get('candidates')
+        if not isinstance(candidates, list) or not candidates or not all(isinstance(c, dict) for c in candidates):
+            return jsonify({'success': False, 'message': 'candidates must be a list of settings'}), 400
+        if len(candidates) > limit:
+            return jsonify({'success': False, 'message': f'At most {limit} candidates can be simulated at once'}), 400
+
+    source = body.get('source', 'latest')
+    if source == 'latest':
+        sessions = telemetry_recorder.sessions()
+        source = sessions[0]['session'] if sessions else 'synthetic'
+    if source == 'synthetic':
+        try:
+            seed = int(body.get('seed', 1))
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'message': 'seed must be a number'}), 400
+        series = synthetic_link_series(ALINK_SIM_SYNTHETIC_DURATION, seed=seed)
+    elif not isinstance(source, str) or not TelemetryRecorder.SESSION_PATTERN.match(source):
+        return jsonify({'success': False, 'message': 'Invalid session'}), 400
+    elif not os.path.exists(telemetry_recorder.paths(source)[0]):
+        return jsonify({'success': False, 'message': 'Session not found'}), 404
+    else:
+        series = link_series_from_telemetry(source)
+        if len(series[0]) < 2:
+            return jsonify({'success': False, 'message': 'Session has no antenna statistics'}), 404
+
+    started = time.monotonic()
+    try:
+        results = simulate_alink(series, candidates)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    if sweep is not None:
+        results.sort(key=lambda result: (result['degraded_seconds'], -result['mean_bitrate'], result['switches']))
+    return jsonify({
+        'success': True,
+        'data': {
+            'source': source,
+            'samples': len(series[0]),
+            'engine': 'numpy' if numpy is not None else 'python',
+            'elapsed_ms': round((time.monotonic() - started) * 1000, 1),
+            'profiles': [{'score': score, 'mcs': mcs, 'bitrate': bitrate} for score, mcs, bitrate in ALINK_PROFILES],
+            'results': results
+        }
+    })
 
 # Add this new route to app.py
 @app.route('/config/restart-alink', methods=['POST'])
 def restart_alink_service():
-    try:
-        # Execute the restart command
-        result = subprocess.run(
+    def restart(job):
+        result = run_process(
             ['sudo', 'systemctl', 'restart', 'alink_gs.service'],
-            check=True,
-            text=True,
-            capture_output=True
+            timeout=job.remaining(),
+            job=job,
+            label='systemctl'
         )
-        
-        return jsonify({
-            'success': True,
-            'message': 'ALink service restarted successfully'
-        })
-        
-    except subprocess.CalledProcessError as e:
-        return jsonify({
-            'success': False,
-            'message': f'Error restarting ALink service: {str(e)}'
-        }), 500
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'message': f'Unexpected error: {str(e)}'
-        }), 500
+        if result.returncode != 0:
+            raise subprocess.CalledProcessError(result.returncode, result.args, result.stdout, result.stderr)
+        return 'ALink service restarted successfully'
+
+    job, _ = job_runner.submit('gs-restart-alink', 'Restart ALink service', restart, timeout=60)
+    return job_response(job)
+
+def job_response(job):
+    return jsonify({
+        'success': True,
+        'message': f'{job.name} queued',
+        'job_id': job.id,
+        'job': job.to_dict()
+    }), 202
+
+@app.route('/jobs')
+def jobs_list():
+    return jsonify({
+        'success': True,
+        'data': job_runner.list()
+    })
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = job_runner.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Job not found'}), 404
+    return jsonify({
+        'success': True,
+        'data': job.to_dict()
+    })
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    job = job_runner.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Job not found'}), 404
+    job.cancel()
+    return jsonify({
+        'success': True,
+        'data': job.to_dict()
+    })
+
+startup.mark('module')
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=80, debug=True)
+    logging.basicConfig(level=os.environ.get('WEBUI_LOG_LEVEL', 'INFO').upper(),
+                        format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    port = int(os.environ.get('WEBUI_PORT', 80))
+    if os.environ.get('WEBUI_DEBUG') == '1':
+        app.run(host='0.0.0.0', port=port, debug=True, threaded=True)
+    else:
+        threading.Thread(target=warm_up, args=(port,), name='warm-up', daemon=True).start()
+        try:
+            from waitress import serve
+        except ImportError:
+            logger.warning("waitress is not installed, falling back to the threaded development server")
+            app.run(host='0.0.0.0', port=port, threaded=True)
+        else:
+            serve(app, host='0.0.0.0', port=port, threads=SERVER_THREADS)
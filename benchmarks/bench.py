@@ -0,0 +1,463 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark for the ground station web UI.
+
+Runs app.py against local stand-ins, so no drone or camera is needed:
+
+- fake_wfb.py serves wfb-ng JSON stats on a free TCP port,
+- stubs/ssh and stubs/sshpass execute camera commands against a local
+  camera root holding wfb.conf and majestic.yaml,
+- a generated media tree holds thousands of recordings with valid
+  MP4/MKV headers.
+
+Each scenario is run by concurrent keep-alive clients and reported as
+latency percentiles and throughput. Results are written as JSON, and
+--compare flags scenarios that got slower than a previous result file.
+
+    python3 benchmarks/bench.py --output before.json
+    python3 benchmarks/bench.py --compare before.json
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPO = os.path.dirname(HERE)
+
+WFB_CONF = """### wfb.conf
+channel=161
+driver_txpower_override=1
+bandwidth=20
+stbc=0
+ldpc=0
+mcs_index=1
+stream=0
+link_id=7669206
+frame_type=data
+fec_k=8
+fec_n=12
+"""
+
+MAJESTIC_YAML = """system:
+  webPort: 80
+isp:
+  exposure: 7
+video0:
+  enabled: true
+  codec: h265
+  fps: 60
+  bitrate: 4096
+  size: 1920x1080
+  gopSize: 1
+  rcMode: cbr
+video1:
+  enabled: false
+records:
+  enabled: false
+"""
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def mp4_header(duration_ms, width, height):
+    """Smallest moov the media index parses: mvhd plus one video trak."""
+    def box(kind, payload):
+        return struct.pack('>I4s', len(payload) + 8, kind) + payload
+    mvhd = box(b'mvhd', bytes(4) + struct.pack('>IIII', 0, 0, 1000, duration_ms) + bytes(80))
+    tkhd = box(b'tkhd', bytes(76) + struct.pack('>II', width << 16, height << 16))
+    hdlr = box(b'hdlr', bytes(8) + b'vide' + bytes(12))
+    stsd = box(b'stsd', bytes(4) + struct.pack('>I', 1) + struct.pack('>I4s', 86, b'hvc1') + bytes(78))
+    moov = box(b'moov', mvhd + box(b'trak', tkhd + box(b'mdia', hdlr + box(b'minf', box(b'stbl', stsd)))))
+    return box(b'ftyp', b'isom' + bytes(4)) + moov
+
+
+def mkv_header(duration_ms, width, height):
+    def element(element_id, payload):
+        return element_id.to_bytes((element_id.bit_length() + 7) // 8, 'big') + (len(payload) | 1 << 56).to_bytes(8, 'big') + payload
+    info = element(0x1549A966, element(0x2AD7B1, (1000000).to_bytes(3, 'big')) + element(0x4489, struct.pack('>d', duration_ms)))
+    video = element(0xE0, element(0xB0, width.to_bytes(2, 'big')) + element(0xBA, height.to_bytes(2, 'big')))
+    tracks = element(0x1654AE6B, element(0xAE, element(0x83, b'\x01') + element(0x86, b'V_MPEGH/ISO/HEVC') + video))
+    segment = bytes.fromhex('18538067') + b'\x01' + b'\xff' * 7 + info + tracks
+    return element(0x1A45DFA3, b'\x42\x86\x81\x01') + segment
+
+
+def make_media_tree(folder, count, download_size, seed):
+    """
+    Create count recordings with realistic names, headers and mtimes.
+
+    Recordings are sparse files, so a large tree costs little disk space.
+    The first few are download targets of download_size bytes; the rest
+    are kept small so the app's background fingerprint pass over the tree
+    finishes quickly.
+
+    Returns:
+        list: Names of the download targets
+    """
+    rng = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+    now = time.time()
+    downloads = []
+    for i in range(count):
+        started = now - 86400 * 30 + i * (86400 * 30 / count)
+        mkv = rng.random() < 0.3
+        name = time.strftime('record_%Y%m%d_%H%M%S', time.localtime(started)) + f'_{i}' + ('.mkv' if mkv else '.mp4')
+        duration_ms = rng.randint(30, 1800) * 1000
+        width, height = rng.choice([(1280, 720), (1920, 1080)])
+        header = (mkv_header if mkv else mp4_header)(duration_ms, width, height)
+        size = download_size if i < 4 else rng.randint(64, 2048) * 1024
+        path = os.path.join(folder, name)
+        with open(path, 'wb') as f:
+            f.write(header)
+            f.truncate(size)
+        os.utime(path, (started, started))
+        if i < 4:
+            downloads.append(name)
+    return downloads
+
+
+def make_camera_root(folder):
+    os.makedirs(os.path.join(folder, 'etc'), exist_ok=True)
+    with open(os.path.join(folder, 'etc', 'wfb.conf'), 'w') as f:
+        f.write(WFB_CONF)
+    with open(os.path.join(folder, 'etc', 'majestic.yaml'), 'w') as f:
+        f.write(MAJESTIC_YAML)
+
+
+class Client:
+    """One keep-alive HTTP connection, reopened after errors."""
+
+    def __init__(self, port):
+        self.port = port
+        self.conn = None
+
+    def request(self, method, path, body=None, headers=None):
+        if self.conn is None:
+            self.conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+        try:
+            self.conn.request(method, path, body=body, headers=headers or {})
+            response = self.conn.getresponse()
+            size = 0
+            while True:
+                chunk = response.read(1024 * 1024)
+                if not chunk:
+                    break
+                size += len(chunk)
+            if response.will_close:
+                self.close()
+            return response.status, size
+        except (OSError, http.client.HTTPException):
+            self.close()
+            raise
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def run_scenario(port, make_request, requests, clients, warmup):
+    """
+    Run requests calls of make_request(client, i) over clients connections.
+
+    Returns:
+        dict: Latency percentiles in ms, throughput and error counts
+    """
+    clients = max(min(clients, requests), 1)
+    pool = [Client(port) for _ in range(clients)]
+    for i in range(warmup):
+        try:
+            make_request(pool[i % clients], i)
+        except (OSError, http.client.HTTPException):
+            pass
+
+    latencies = []
+    errors = {}
+    transferred = [0]
+    counter = iter(range(requests))
+    lock = threading.Lock()
+
+    def worker(client):
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            started = time.perf_counter()
+            try:
+                status, size = make_request(client, i)
+                error = None if status < 400 else f'http_{status}'
+            except (OSError, http.client.HTTPException) as e:
+                size, error = 0, type(e).__name__
+            elapsed = time.perf_counter() - started
+            with lock:
+                if error:
+                    errors[error] = errors.get(error, 0) + 1
+                else:
+                    latencies.append(elapsed)
+                    transferred[0] += size
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        list(executor.map(worker, pool))
+    wall = time.perf_counter() - started
+    for client in pool:
+        client.close()
+
+    latencies.sort()
+    ms = [value * 1000 for value in latencies]
+    return {
+        'requests': requests,
+        'clients': clients,
+        'ok': len(latencies),
+        'errors': errors,
+        'wall_s': round(wall, 3),
+        'rps': round(len(latencies) / wall, 1) if wall else None,
+        'mb_per_s': round(transferred[0] / wall / 1e6, 1) if wall else None,
+        'latency_ms': {
+            'min': round(ms[0], 2) if ms else None,
+            'p50': round(percentile(ms, 0.50), 2) if ms else None,
+            'p90': round(percentile(ms, 0.90), 2) if ms else None,
+            'p99': round(percentile(ms, 0.99), 2) if ms else None,
+            'max': round(ms[-1], 2) if ms else None,
+            'mean': round(sum(ms) / len(ms), 2) if ms else None
+        }
+    }
+
+
+def scenarios(downloads, pages, download_size):
+    """Return {name: (make_request, concurrency cap or None)}."""
+    def rssi_data(client, i):
+        return client.request('GET', '/rssi/data')
+
+    def camera_load_config(client, i):
+        return client.request('GET', '/camera/load-config')
+
+    def camera_update(client, i):
+        # Alternate values so every request really writes the camera config
+        body = json.dumps({'bitrate': str(4096 + (i % 2) * 1024), 'fec_n': str(12 + i % 2)})
+        return client.request('POST', '/camera/update', body, {'Content-Type': 'application/json'})
+
+    def files(client, i):
+        return client.request('GET', f'/files?page={i % pages + 1}')
+
+    def files_json(client, i):
+        return client.request('GET', f'/files?format=json&sort=size&page={i % pages + 1}')
+
+    def download(client, i):
+        return client.request('GET', f'/download/{downloads[i % len(downloads)]}')
+
+    def download_range(client, i):
+        start = (i * 7919 * 1024) % max(download_size - 1024 * 1024, 1)
+        return client.request('GET', f'/play/{downloads[i % len(downloads)]}',
+                              headers={'Range': f'bytes={start}-{start + 1024 * 1024 - 1}'})
+
+    return {
+        'rssi_data': (rssi_data, None),
+        'camera_load_config': (camera_load_config, None),
+        # Camera writes are serialised in practice; concurrent commits would conflict by design
+        'camera_update': (camera_update, 1),
+        'files': (files, None),
+        'files_json': (files_json, None),
+        'download': (download, 4),
+        'download_range': (download_range, None)
+    }
+
+
+def wait_until(port, path, timeout):
+    deadline = time.monotonic() + timeout
+    client = Client(port)
+    while time.monotonic() < deadline:
+        try:
+            status, _ = client.request('GET', path)
+            if status == 200:
+                return True
+        except (OSError, http.client.HTTPException):
+            pass
+        time.sleep(0.05)
+    return False
+
+
+def wait_for_background(port, timeout):
+    """Wait until thumbnails and fingerprints of the tree are done, so they don't skew timings."""
+    deadline = time.monotonic() + timeout
+    client = Client(port)
+    while time.monotonic() < deadline:
+        try:
+            client.request('GET', '/files')
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            conn.request('GET', '/files/checksums')
+            checksums = json.loads(conn.getresponse().read())['data']
+            conn.request('GET', '/thumbnails/status')
+            thumbnails = json.loads(conn.getresponse().read())['data']
+            conn.close()
+            if thumbnails['queue_depth'] == 0 and all(item['sha256'] for item in checksums['recordings']):
+                return True
+        except (OSError, http.client.HTTPException, ValueError, KeyError):
+            pass
+        time.sleep(1)
+    return False
+
+
+def git_version():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=REPO,
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(result, baseline, threshold):
+    """Print per-scenario changes against baseline and return the regressed scenario names."""
+    regressions = []
+    print(f"{'scenario':<22}{'p50 ms':>16}{'p90 ms':>16}{'rps':>16}", file=sys.stderr)
+    for name, current in result['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if not previous or not previous['latency_ms']['p50'] or not current['latency_ms']['p50']:
+            continue
+        cells = []
+        for key in ('p50', 'p90'):
+            before, after = previous['latency_ms'][key], current['latency_ms'][key]
+            cells.append(f'{before:.1f}>{after:.1f} {(after / before - 1) * 100:+.0f}%')
+        cells.append(f"{previous['rps']:.0f}>{current['rps']:.0f}")
+        regressed = current['latency_ms']['p50'] > previous['latency_ms']['p50'] * (1 + threshold)
+        if regressed:
+            regressions.append(name)
+        print(f"{name:<22}" + ''.join(f'{cell:>16}' for cell in cells) + ('  REGRESSED' if regressed else ''),
+              file=sys.stderr)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmark for the ground station web UI')
+    parser.add_argument('--clients', type=int, default=8, help='concurrent clients per scenario')
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario')
+    parser.add_argument('--warmup', type=int, default=10, help='untimed requests before each scenario')
+    parser.add_argument('--files', type=int, default=3000, help='recordings in the generated media tree')
+    parser.add_argument('--download-mb', type=int, default=64, help='size of the download targets')
+    parser.add_argument('--antennas', type=int, default=4)
+    parser.add_argument('--stats-rate', type=float, default=10, help='wfb-ng stats records per second')
+    parser.add_argument('--ssh-delay-ms', type=float, default=5, help='simulated camera round trip')
+    parser.add_argument('--scenario', action='append', help='run only these scenarios (repeatable)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--settle-timeout', type=float, default=300,
+                        help='seconds to wait for background thumbnail and hashing work before measuring')
+    parser.add_argument('--output', help='write the JSON result here instead of stdout')
+    parser.add_argument('--compare', help='previous JSON result to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='p50 slowdown that counts as a regression')
+    parser.add_argument('--keep', action='store_true', help='keep the temporary tree and app log')
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp(prefix='webui-bench-')
+    media = os.path.join(work, 'media')
+    camera_root = os.path.join(work, 'camera')
+    downloads = make_media_tree(media, args.files, args.download_mb * 1024 * 1024, args.seed)
+    make_camera_root(camera_root)
+
+    wfb_port = free_port()
+    app_port = free_port()
+    env = dict(
+        os.environ,
+        PATH=os.path.join(HERE, 'stubs') + os.pathsep + os.environ.get('PATH', ''),
+        WEBUI_PORT=str(app_port),
+        WEBUI_MEDIA_FOLDER=media,
+        WEBUI_THUMBNAIL_FOLDER=os.path.join(work, 'thumbnails'),
+        WEBUI_CAMERA_HOST='127.0.0.1',
+        WEBUI_SSH_CONTROL_DIR=os.path.join(work, 'ssh'),
+        WEBUI_WFB_STATS_HOST='127.0.0.1',
+        WEBUI_WFB_STATS_PORT=str(wfb_port),
+        BENCH_CAMERA_ROOT=camera_root,
+        BENCH_SSH_DELAY_MS=str(args.ssh_delay_ms)
+    )
+    env.pop('WEBUI_DEBUG', None)
+    processes = []
+    log = open(os.path.join(work, 'app.log'), 'w')
+    try:
+        processes.append(subprocess.Popen(
+            [sys.executable, os.path.join(HERE, 'fake_wfb.py'), '--port', str(wfb_port),
+             '--rate', str(args.stats_rate), '--antennas', str(args.antennas), '--seed', str(args.seed)]
+        ))
+        launched = time.perf_counter()
+        processes.append(subprocess.Popen([sys.executable, os.path.join(REPO, 'app.py')], cwd=REPO, env=env,
+                                          stdout=log, stderr=subprocess.STDOUT))
+        if not wait_until(app_port, '/', 30):
+            sys.exit(f'app did not start, see {log.name}')
+        startup_ms = (time.perf_counter() - launched) * 1000
+        if not wait_until(app_port, '/rssi/data', 30):
+            sys.exit('app never received stats from the fake wfb-ng server')
+        settle_started = time.perf_counter()
+        if not wait_for_background(app_port, args.settle_timeout):
+            print('background work did not settle, timings may be noisy', file=sys.stderr)
+        settle_ms = (time.perf_counter() - settle_started) * 1000
+
+        pages = max(args.files // 24, 1)
+        result = {
+            'version': git_version(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'parameters': {key: value for key, value in vars(args).items()
+                           if key not in ('output', 'compare', 'keep')},
+            'startup_ms': round(startup_ms, 1),
+            'settle_ms': round(settle_ms, 1),
+            'scenarios': {}
+        }
+        for name, (make_request, cap) in scenarios(downloads, pages, args.download_mb * 1024 * 1024).items():
+            if args.scenario and name not in args.scenario:
+                continue
+            clients = min(args.clients, cap) if cap else args.clients
+            print(f'running {name} ({args.requests} requests, {clients} clients)', file=sys.stderr)
+            result['scenarios'][name] = run_scenario(app_port, make_request, args.requests, clients, args.warmup)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        log.close()
+        if args.keep:
+            print(f'kept {work}', file=sys.stderr)
+        else:
+            shutil.rmtree(work, ignore_errors=True)
+
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(result, json.load(f), args.threshold)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
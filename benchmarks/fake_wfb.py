@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Stand-in for the wfb-ng JSON stats API (port 8103 on the ground station).
+
+Every client gets a settings record followed by one 'rx' record per
+interval, in the same shape wfb-ng emits: per-antenna RSSI/SNR in
+rx_ant_stats and [delta, total] packet counters. Values follow a slow
+random walk with occasional fades, so graphs and analytics see realistic
+movement rather than noise. The seed makes runs reproducible.
+"""
+import argparse
+import json
+import random
+import socket
+import threading
+import time
+
+
+def records(rate, antennas, seed):
+    rng = random.Random(seed)
+    rssi = [-50.0 - 3 * ant for ant in range(antennas)]
+    totals = {name: 0 for name in ('all', 'all_bytes', 'dec_ok', 'fec_rec', 'lost', 'dec_err', 'bad', 'out', 'out_bytes')}
+    interval = 1 / rate
+    packets_per_interval = max(int(1000 * interval), 1)
+    while True:
+        fade = rng.random() < 0.02
+        ant_stats = []
+        for ant in range(antennas):
+            rssi[ant] = min(max(rssi[ant] + rng.gauss(0, 1), -90), -20)
+            level = rssi[ant] - (20 if fade else 0)
+            snr = max(level + 75 + rng.gauss(0, 1), 0)
+            ant_stats.append({
+                'freq': 5805, 'mcs': 1, 'bw': 20, 'ant': ant,
+                'pkt_recv': packets_per_interval,
+                'rssi_min': int(level - 3), 'rssi_avg': int(level), 'rssi_max': int(level + 2),
+                'snr_min': int(snr - 2), 'snr_avg': int(snr), 'snr_max': int(snr + 2)
+            })
+        lost = rng.randint(5, 30) if fade else (1 if rng.random() < 0.05 else 0)
+        fec_rec = rng.randint(0, 8) + (20 if fade else 0)
+        delta = {
+            'all': packets_per_interval, 'all_bytes': packets_per_interval * 1400,
+            'dec_ok': packets_per_interval - lost, 'fec_rec': fec_rec, 'lost': lost,
+            'dec_err': 0, 'bad': 0,
+            'out': packets_per_interval - lost, 'out_bytes': (packets_per_interval - lost) * 1400
+        }
+        packets = {}
+        for name, value in delta.items():
+            totals[name] += value
+            packets[name] = [value, totals[name]]
+        yield {
+            'type': 'rx', 'timestamp': time.time(), 'id': 'video rx',
+            'tx_wlan': 0, 'packets': packets, 'rx_ant_stats': ant_stats, 'session': None
+        }
+
+
+def handle(conn, rate, antennas, seed):
+    try:
+        conn.sendall(json.dumps({'type': 'settings', 'profile': 'gs', 'is_cluster': False,
+                                 'settings': {'common': {'log_interval': int(1000 / rate)}}}).encode() + b'\n')
+        for record in records(rate, antennas, seed):
+            conn.sendall(json.dumps(record).encode() + b'\n')
+            time.sleep(1 / rate)
+    except OSError:
+        pass
+    finally:
+        conn.close()
+
+
+def serve(host, port, rate=10, antennas=2, seed=1, ready=None):
+    server = socket.socket()
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind((host, port))
+    server.listen()
+    if ready is not None:
+        ready.set()
+    while True:
+        conn, _ = server.accept()
+        threading.Thread(target=handle, args=(conn, rate, antennas, seed), daemon=True).start()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8103)
+    parser.add_argument('--rate', type=float, default=10, help='records per second')
+    parser.add_argument('--antennas', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    serve(args.host, args.port, args.rate, args.antennas, args.seed)
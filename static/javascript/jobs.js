@@ -0,0 +1,40 @@
+// Helpers for actions that run as background jobs on the server (see /jobs/<id>)
+
+const JOB_POLL_INTERVAL = 1000;
+
+// Post to an action route and wait for the queued job to finish.
+// Resolves with the finished job, rejects with an Error on failure.
+async function runJob(url) {
+    const response = await fetch(url, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        }
+    });
+    const result = await response.json();
+
+    if (!response.ok || !result.success) {
+        throw new Error(result.message || 'Failed to start action');
+    }
+    return waitForJob(result.job_id);
+}
+
+async function waitForJob(jobId) {
+    while (true) {
+        const response = await fetch(`/jobs/${jobId}`);
+        const result = await response.json();
+
+        if (!response.ok || !result.success) {
+            throw new Error(result.message || 'Lost track of the running action');
+        }
+
+        const job = result.data;
+        if (job.status === 'succeeded') {
+            return job;
+        }
+        if (job.status !== 'queued' && job.status !== 'running') {
+            throw new Error(job.message || `Action ${job.status}`);
+        }
+        await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL));
+    }
+}